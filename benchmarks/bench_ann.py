@@ -0,0 +1,72 @@
+# Query latency and recall of the IVF face index vs exhaustive matching.
+#
+# Synthetic galleries with ~200 encodings per person (what 15-second captures produce),
+# probes drawn from enrolled people plus 20% strangers. For each nprobe it reports the
+# per-face query time, how often the index returns the same result (name or unknown) as
+# the exhaustive FaceMatcher and, for enrolled people, the same nearest identity.
+#
+#   python benchmarks/bench_ann.py --sizes 10000 100000 1000000 --nprobe 4 8 16 32
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from face_matcher import FaceMatcher
+from face_index import FaceIndex
+
+TOLERANCE = 0.45
+
+
+def make_gallery(size, per_person, rng):
+    people = max(2, size // per_person)
+    # Roughly like dlib encodings: ~1.0 between people, ~0.3 from a person's mean
+    centers = rng.normal(scale=0.06, size=(people, 128)).astype(np.float32)
+    labels = np.r_[np.arange(people), rng.integers(0, people, size=max(size - people, 0))]
+    encodings = np.empty((size, 128), dtype=np.float32)
+    for start in range(0, size, 100_000):
+        part = labels[start:start + 100_000]
+        encodings[start:start + len(part)] = centers[part] + rng.normal(scale=0.025, size=(len(part), 128))
+    return encodings, [f"person_{i}" for i in labels], centers
+
+
+def make_probes(centers, count, rng):
+    known = centers[rng.integers(0, len(centers), size=count - count // 5)]
+    strangers = rng.normal(scale=0.06, size=(count // 5, 128))
+    probes = np.concatenate([known, strangers]) + rng.normal(scale=0.025, size=(count, 128))
+    return probes.astype(np.float32)
+
+
+def per_face_ms(matcher, probes):
+    start = time.perf_counter()
+    matches = [matcher.match(probe[None, :])[0] for probe in probes]
+    return (time.perf_counter() - start) * 1000 / len(probes), matches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the IVF face index against exhaustive matching")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32])
+    parser.add_argument("--per-person", type=int, default=200)
+    parser.add_argument("--probes", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'encodings':>10} {'mode':>12} {'ms/face':>8} {'same name':>10} {'same nearest':>13}")
+    for size in args.sizes:
+        encodings, names, centers = make_gallery(size, args.per_person, rng)
+        probes = make_probes(centers, args.probes, rng)
+
+        exact_ms, exact = per_face_ms(FaceMatcher(encodings, names, TOLERANCE), probes)
+        print(f"{size:>10} {'exhaustive':>12} {exact_ms:>8.2f} {'-':>10} {'-':>13}")
+
+        start = time.perf_counter()
+        index = FaceIndex.train(encodings)
+        print(f"{size:>10} {'build':>12} {'':>8} {len(index.centroids):>6} lists in {time.perf_counter() - start:.1f}s")
+        for nprobe in args.nprobe:
+            ms, approx = per_face_ms(FaceMatcher(encodings, names, TOLERANCE, index=index, nprobe=nprobe), probes)
+            same_name = np.mean([a.name == e.name for a, e in zip(approx, exact)])
+            enrolled = len(probes) - len(probes) // 5
+            same_nearest = np.mean([a.nearest == e.nearest for a, e in zip(approx[:enrolled], exact[:enrolled])])
+            print(f"{size:>10} {f'nprobe={nprobe}':>12} {ms:>8.2f} {same_name:>10.1%} {same_nearest:>13.1%}")
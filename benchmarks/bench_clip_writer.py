@@ -0,0 +1,128 @@
+# Unknown-clip cost: the old inline JPEG -> cv2.VideoWriter rebuild vs ClipWriter.
+#
+# Each mode writes a clip of --seconds x --fps frames and then notifies a stub HA with the
+# video name + unknown boolean, as detect_face.py does. Reported per mode (medians):
+#   blocked   how long the detection thread was held up
+#   notify    decision -> HA received both calls
+#   cpu       process CPU time spent on the clip (all threads)
+# "copy" moves a recording FFmpeg made with -c copy during capture; the remux itself runs
+# inside FFmpeg and costs next to nothing, so it is not included here.
+#
+#   python benchmarks/bench_clip_writer.py --runs 3
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from clip_writer import ClipWriter
+from ha_integration import HAClient
+from stub_ha import StubHA
+
+CALLS = [
+    ("input_text/set_value", {"entity_id": "input_text.latest_unknown_video", "value": "unknown_bench.mp4"}),
+    ("input_boolean/turn_on", {"entity_id": "input_boolean.unknown_face_detected"}),
+]
+
+
+def synthetic_frames(count, width, height):
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        x = int((width - 120) * i / max(1, count - 1))
+        cv2.rectangle(frame, (x, height // 3), (x + 120, height // 3 + 160), (200, 170, 150), -1)
+        frames.append(frame)
+    return frames
+
+
+def write_video(path, frames, fps):
+    height, width = frames[0].shape[:2]
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for frame in frames:
+        out.write(frame)
+    out.release()
+
+
+def run_legacy(stub, client, frames, fps, workdir):
+    # detect_face.py before ClipWriter: JPEGs on disk re-read and re-encoded inline,
+    # then a file-exists poll before the notification
+    jpg_dir = os.path.join(workdir, "jpg")
+    os.makedirs(jpg_dir, exist_ok=True)
+    for i, frame in enumerate(frames):
+        cv2.imwrite(os.path.join(jpg_dir, f"{i:04d}.jpg"), frame)
+    out_path = os.path.join(workdir, "legacy.mp4")
+
+    start, cpu = time.perf_counter(), time.process_time()
+    write_video(out_path, [cv2.imread(os.path.join(jpg_dir, f"{i:04d}.jpg")) for i in range(len(frames))], fps)
+    for _ in range(5):
+        if os.path.exists(out_path):
+            break
+        time.sleep(1)
+    client.send_chain(CALLS)
+    blocked = time.perf_counter() - start
+    stub.wait_for_call(30, count=len(CALLS))
+    return blocked, time.perf_counter() - start, time.process_time() - cpu
+
+
+def run_writer(stub, client, frames, fps, workdir, mode):
+    writer = ClipWriter()
+    out_path = os.path.join(workdir, f"{mode}.mp4")
+    if mode == "copy":
+        recording = os.path.join(workdir, "recording.mp4")
+        write_video(recording, frames, fps)
+
+    start, cpu = time.perf_counter(), time.process_time()
+    on_done = lambda path: client.send_chain(CALLS)
+    if mode == "copy":
+        writer.submit_recording(recording, out_path, on_done=on_done)
+    else:
+        writer.submit_frames(frames, out_path, fps, on_done=on_done)
+    blocked = time.perf_counter() - start
+    stub.wait_for_call(60, count=len(CALLS))
+    notified = time.perf_counter() - start
+    writer.flush()
+    return blocked, notified, time.process_time() - cpu
+
+
+def median_ms(values):
+    return f"{statistics.median(values) * 1000:.1f}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark unknown-clip writing and notification")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--fps", type=int, default=8)
+    parser.add_argument("--resolution", default="960x540")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.resolution.split("x"))
+    frames = synthetic_frames(int(args.seconds * args.fps), width, height)
+    stub = StubHA().start()
+    client = HAClient(stub.url, "bench")
+
+    print(f"{'mode':>7} {'blocked ms':>11} {'notify ms':>10} {'cpu ms':>8}")
+    for mode in ("legacy", "encode", "copy"):
+        blocked, notified, cpu = [], [], []
+        for _ in range(args.runs):
+            workdir = tempfile.mkdtemp(prefix="bench_clip_")
+            stub.reset()
+            if mode == "legacy":
+                b, n, c = run_legacy(stub, client, frames, args.fps, workdir)
+            else:
+                b, n, c = run_writer(stub, client, frames, args.fps, workdir, mode)
+            client.flush()
+            shutil.rmtree(workdir)
+            blocked.append(b)
+            notified.append(n)
+            cpu.append(c)
+        print(f"{mode:>7} {median_ms(blocked):>11} {median_ms(notified):>10} {median_ms(cpu):>8}")
+    stub.stop()
@@ -0,0 +1,121 @@
+# Trigger-to-HA-notification latency: per-invocation scripts vs face_daemon.py.
+#
+# Every run starts a stub HA server, points HA_BASE_URL at it and measures the
+# time from the trigger (process spawn / POST /detect) until the first HA
+# service call arrives.
+#
+#   python benchmarks/bench_daemon_latency.py --source rtsp://127.0.0.1:8554/test --runs 5
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import threading
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stub_ha import StubHA
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = ["detect_face.py", "detect_and_notify.py"]
+
+
+def summarize(latencies):
+    ok = [x for x in latencies if x is not None]
+    if not ok:
+        return {"runs": len(latencies), "failed": len(latencies)}
+    return {
+        "runs": len(latencies),
+        "failed": len(latencies) - len(ok),
+        "min_s": round(min(ok), 3),
+        "median_s": round(statistics.median(ok), 3),
+        "max_s": round(max(ok), 3),
+    }
+
+
+def bench_script(script, stub, env, runs, timeout):
+    latencies = []
+    for i in range(runs):
+        stub.reset()
+        start = time.time()
+        proc = subprocess.Popen([sys.executable, script], cwd=REPO_DIR, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        first = stub.wait_for_call(timeout)
+        proc.wait(timeout=timeout)
+        latencies.append(first - start if first else None)
+        print(f"  {script} run {i+1}: {latencies[-1] if first else 'no HA call'}")
+    return latencies
+
+
+def wait_until_healthy(url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=2) as r:
+                if r.status == 200:
+                    return True
+        except Exception:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def bench_daemon(stub, env, runs, timeout, port):
+    url = f"http://127.0.0.1:{port}"
+    proc = subprocess.Popen([sys.executable, "face_daemon.py", "--port", str(port)], cwd=REPO_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    latencies = []
+    try:
+        if not wait_until_healthy(url, timeout):
+            print("❌ Daemon did not become healthy.")
+            return [None] * runs
+        for i in range(runs):
+            stub.reset()
+            request = urllib.request.Request(f"{url}/detect", method="POST")
+            start = time.time()
+            worker = threading.Thread(target=lambda: urllib.request.urlopen(request, timeout=timeout).read())
+            worker.start()
+            first = stub.wait_for_call(timeout)
+            worker.join()
+            latencies.append(first - start if first else None)
+            print(f"  daemon run {i+1}: {latencies[-1] if first else 'no HA call'}")
+    finally:
+        proc.terminate()
+        proc.wait()
+    return latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare trigger-to-notification latency")
+    parser.add_argument("--source", default=os.getenv("RTSP_URL"), help="RTSP URL (or local stand-in) to analyze")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", metavar="PATH", help="Also write results as JSON")
+    args = parser.parse_args()
+
+    if not args.source:
+        print("❌ Pass --source or set RTSP_URL.")
+        sys.exit(1)
+
+    stub = StubHA().start()
+    env = dict(os.environ, HA_BASE_URL=stub.url, HA_TOKEN="bench", RTSP_URL=args.source)
+    results = {}
+
+    for script in SCRIPTS:
+        print(f"⏱️ {script}")
+        results[script] = summarize(bench_script(script, stub, env, args.runs, args.timeout))
+
+    print("⏱️ face_daemon.py")
+    results["face_daemon.py"] = summarize(bench_daemon(stub, env, args.runs, args.timeout, args.port))
+    stub.stop()
+
+    print("\n📊 Trigger → first HA call (seconds)")
+    for name, summary in results.items():
+        print(f"  {name:24} {summary}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,199 @@
+# Time-to-decision of the streaming decision engine against the old fixed windows.
+#
+# Each clip is analyzed once, frame by frame at video.fps (motion gate, locate, encode,
+# match), recording when every frame would arrive from a live camera and how long it took
+# to process. The decision policies are then replayed on that trace with a simulated clock,
+# so they all see the same frames and processing costs. The clock starts at the trigger
+# and the first frame arrives after --connect seconds, the time to open the camera:
+#
+#   single_frame  decide from the first frame (detect_and_notify.py before the engine)
+#   window_3s     capture 3 s, then analyze until a known face (detect_and_handle.py before)
+#   window_10s    quick scan while capturing 10 s; known early, anything else at the end
+#                 (detect_face.py before)
+#   engine        DecisionEngine with the `decision` options of config.json
+#
+#   python benchmarks/bench_decision.py clips/*.mp4 --encodings encodings/faces.bin
+#   python benchmarks/bench_decision.py clips/*.mp4 --encodings encodings/faces.bin --min-frames 2 --json out.json
+#   python benchmarks/bench_decision.py clips/*.mp4 --connect 6   # a camera slower to connect than max_seconds
+import os
+import sys
+import json
+import time
+import argparse
+from collections import Counter
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_pipeline import replay, percentiles, git_commit
+
+POLICIES = ["single_frame", "window_3s", "window_10s", "engine"]
+
+
+def trace_clip(path, config, matcher, seconds, connect=0.0):
+    """[(arrival_s, processing_s, matches or None if the gate skipped it)] for `seconds` of the clip.
+
+    Arrival times are counted from the trigger; the first frame arrives after `connect` seconds.
+    """
+    from frame_analysis import analyze_frame
+    from motion_gate import MotionGate
+
+    video = config["video"]
+    fps = video.get("fps", 8)
+    scale = config["recognition"].get("detect_scale", 1.0)
+    gate = MotionGate.from_config(config)
+    trace = []
+    for idx, frame in enumerate(replay(path, fps, video.get("resolution"), realtime=False)):
+        if idx >= seconds * fps:
+            break
+        start = time.perf_counter()
+        changed, regions = gate.check(frame)
+        matches = None
+        if changed:
+            _, encodings, _ = analyze_frame(frame, regions, scale)
+            matches = matcher.match(encodings)
+        trace.append((connect + idx / fps, time.perf_counter() - start, matches))
+    return trace
+
+
+def old_result(matches_seen):
+    """Known on any match, unknown on any face, as the scripts decided before the engine."""
+    faces = [m for matches in matches_seen for m in matches]
+    known = [m.name for m in faces if m.name]
+    if known:
+        return "known", Counter(known).most_common(1)[0][0]
+    return ("unknown" if faces else "no_face"), None
+
+
+def single_frame(trace):
+    arrival, cost, matches = trace[0]
+    return old_result([matches or []]) + (arrival + cost,)
+
+
+def fixed_window(trace, window):
+    # Everything is captured first, then analyzed in order until a known face turns up
+    end = trace[0][0] + window
+    clock = end
+    seen = []
+    for arrival, cost, matches in trace:
+        if arrival >= end:
+            break
+        clock += cost
+        if matches is not None:
+            seen.append(matches)
+            if any(m.name for m in matches):
+                break
+    return old_result(seen) + (clock,)
+
+
+def streaming(trace, on_frame, window=None):
+    """Frames processed one at a time as they arrive; on_frame(matches, now) -> done?"""
+    clock = 0.0
+    for arrival, cost, matches in trace:
+        if window is not None and arrival >= window:
+            break
+        clock = max(clock, arrival) + cost
+        if on_frame(matches, clock):
+            return clock
+    return max(clock, window or 0.0)
+
+
+def quick_scan(trace, window):
+    seen = []
+
+    def on_frame(matches, now):
+        if matches is not None:
+            seen.append(matches)
+        return matches is not None and any(m.name for m in matches)
+
+    clock = streaming(trace, on_frame, trace[0][0] + window)
+    return old_result(seen) + (clock,)
+
+
+def engine_policy(trace, engine):
+    # Built at the trigger, like the scripts do, before the camera has connected
+    engine.start(now=0.0)
+
+    def on_frame(matches, now):
+        if matches is None:
+            return engine.skip(now) is not None
+        return engine.update(matches, now) is not None
+
+    clock = streaming(trace, on_frame)
+    decision = engine.finish(clock)
+    return decision.result, decision.name, decision.seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare time-to-decision of the decision engine and fixed windows")
+    parser.add_argument("clips", nargs="+", help="Recorded video files to replay")
+    parser.add_argument("--config", default=os.path.join(REPO_DIR, "config.json"))
+    parser.add_argument("--encodings", help="faces.bin to match against (default: no known faces)")
+    parser.add_argument("--min-frames", type=int, help="Override recognition.min_frames")
+    parser.add_argument("--distance-margin", type=float, help="Override decision.distance_margin")
+    parser.add_argument("--connect", type=float, default=1.0, help="Seconds from the trigger to the first frame")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results here")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    decision_options = config.setdefault("decision", {})
+    if args.min_frames is not None:
+        config["recognition"]["min_frames"] = args.min_frames
+    if args.distance_margin is not None:
+        decision_options["distance_margin"] = args.distance_margin
+
+    from face_matcher import FaceMatcher, load_matcher
+    from decision_engine import DecisionEngine
+    import face_detectors
+
+    face_detectors.configure(config)
+
+    tolerance = config["recognition"].get("tolerance", 0.6)
+    matcher = load_matcher(args.encodings, config) if args.encodings else FaceMatcher(np.empty((0, 128)), [], tolerance)
+    engine = DecisionEngine.from_config(config)
+
+    runs = []
+    for path in args.clips:
+        trace = trace_clip(path, config, matcher, max(10.0, engine.max_seconds), args.connect)
+        if not trace:
+            print(f"⚠️ No frames in {path}, skipped.")
+            continue
+        results = {
+            "single_frame": single_frame(trace),
+            "window_3s": fixed_window(trace, 3.0),
+            "window_10s": quick_scan(trace, 10.0),
+            "engine": engine_policy(trace, engine),
+        }
+        runs.append({"clip": os.path.basename(path), "frames": len(trace),
+                     **{policy: {"result": result, "name": name, "seconds": round(seconds, 3)}
+                        for policy, (result, name, seconds) in results.items()}})
+
+    print(f"\n🧮 Time to decision over {len(runs)} clip(s), min_frames={engine.min_frames}, "
+          f"distance_margin={engine.distance_margin}, connect={args.connect:.1f} s")
+    print(f"{'clip':<24}" + "".join(f"{policy:>22}" for policy in POLICIES))
+    for run in runs:
+        cells = [f"{run[p]['result']}{'/' + run[p]['name'] if run[p]['name'] else ''} {run[p]['seconds']:.2f}s"
+                 for p in POLICIES]
+        print(f"{run['clip'][:23]:<24}" + "".join(f"{cell:>22}" for cell in cells))
+
+    summary = {}
+    for policy in POLICIES:
+        seconds = [run[policy]["seconds"] for run in runs]
+        stats = percentiles(seconds)
+        # Agreement with the 10 s window, which saw the most evidence before
+        agree = sum((run[policy]["result"], run[policy]["name"]) == (run["window_10s"]["result"], run["window_10s"]["name"])
+                    for run in runs)
+        summary[policy] = {**stats, "agrees_with_window_10s": agree}
+        if stats["count"]:
+            print(f"  {policy:<13} p50 {stats['p50_ms'] / 1000:6.2f} s   p90 {stats['p90_ms'] / 1000:6.2f} s   "
+                  f"max {stats['max_ms'] / 1000:6.2f} s   agrees with window_10s on {agree}/{len(runs)}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"commit": git_commit(), "decision": decision_options, "min_frames": engine.min_frames,
+                       "connect_s": args.connect,
+                       "summary": summary, "runs": runs}, f, indent=2)
+            f.write("\n")
+        print(f"💾 Wrote {args.json}")
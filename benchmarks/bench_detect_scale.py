@@ -0,0 +1,104 @@
+# Speed and accuracy of downscaled face detection on a recorded clip.
+#
+# Full-resolution detection (scale 1.0) is the reference. For every other scale the
+# benchmark reports locate/encode time per frame, detection recall against the
+# reference boxes (IoU >= 0.5) and, for matched faces, how far the full-resolution
+# encodings moved and whether the recognized name stayed the same.
+#
+#   python benchmarks/bench_detect_scale.py clip.mp4 --scales 1.0 0.75 0.5 0.35 --encodings faces.bin
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import face_recognition
+import face_store
+from face_matcher import FaceMatcher
+from frame_analysis import locate_faces
+
+
+def read_frames(path, every, limit):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    idx = 0
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if idx % every == 0:
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        idx += 1
+    cap.release()
+    return frames
+
+
+def iou(a, b):
+    top, right, bottom, left = max(a[0], b[0]), min(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area = lambda box: (box[2] - box[0]) * (box[1] - box[3])
+    return inter / float(area(a) + area(b) - inter) if inter else 0.0
+
+
+def run(frames, scale):
+    results = []
+    locate_time = encode_time = 0.0
+    for frame in frames:
+        start = time.perf_counter()
+        locations = locate_faces(frame, scale=scale)
+        located = time.perf_counter()
+        encodings = face_recognition.face_encodings(frame, known_face_locations=locations) if locations else []
+        encode_time += time.perf_counter() - located
+        locate_time += located - start
+        results.append((locations, encodings))
+    return results, locate_time, encode_time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark downscaled face detection")
+    parser.add_argument("clip", help="Recorded video file")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.75, 0.5, 0.35, 0.25])
+    parser.add_argument("--every", type=int, default=1, help="Use every Nth frame")
+    parser.add_argument("--max-frames", type=int, default=200)
+    parser.add_argument("--encodings", help="faces.bin to also compare recognized names")
+    parser.add_argument("--tolerance", type=float, default=0.45)
+    args = parser.parse_args()
+
+    frames = read_frames(args.clip, args.every, args.max_frames)
+    if not frames:
+        print(f"❌ No frames read from {args.clip}")
+        sys.exit(1)
+    height, width = frames[0].shape[:2]
+    print(f"🎞️ {len(frames)} frame(s) at {width}x{height}")
+
+    matcher = FaceMatcher(*face_store.load_encodings(args.encodings), args.tolerance) if args.encodings else None
+    reference, _, _ = run(frames, 1.0)
+    ref_faces = sum(len(locations) for locations, _ in reference)
+    ref_names = [matcher.names(encodings) if matcher else [] for _, encodings in reference]
+
+    print(f"{'scale':>6} {'locate ms/frame':>16} {'encode ms/frame':>16} {'faces':>6} {'recall':>7} "
+          f"{'enc drift':>10} {'same name':>10}")
+    for scale in args.scales:
+        results, locate_time, encode_time = run(frames, scale)
+        matched = 0
+        drift = []
+        same = []
+        for (ref_locs, ref_encs), (locs, encs), names_ref in zip(reference, results, ref_names):
+            names = matcher.names(encs) if matcher else []
+            used = set()
+            for i, ref_box in enumerate(ref_locs):
+                best = max(((iou(ref_box, box), j) for j, box in enumerate(locs) if j not in used), default=(0, None))
+                if best[0] >= 0.5:
+                    j = best[1]
+                    used.add(j)
+                    matched += 1
+                    drift.append(np.linalg.norm(ref_encs[i] - encs[j]))
+                    if matcher:
+                        same.append(names_ref[i] == names[j])
+        found = sum(len(locs) for locs, _ in results)
+        recall = matched / ref_faces if ref_faces else float("nan")
+        print(f"{scale:>6.2f} {locate_time / len(frames) * 1000:>16.1f} {encode_time / len(frames) * 1000:>16.1f} "
+              f"{found:>6} {recall:>7.1%} {np.mean(drift) if drift else float('nan'):>10.3f} "
+              f"{(np.mean(same) if same else float('nan')):>10.1%}")
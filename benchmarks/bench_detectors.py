@@ -0,0 +1,136 @@
+# Speed and recall of the face detector backends on local test images, CPU only.
+#
+# Every image is resized to --size (the camera resolution by default) so batching
+# backends can batch. Recall is measured against hand-labelled boxes when --labels is
+# given (IoU >= 0.5), otherwise as the share of images with at least one face, which
+# suits a folder where every picture shows someone (e.g. known_faces/). Backends whose
+# model files are missing are skipped; "haar+ssd" is the ssd backend with a Haar prefilter.
+#
+#   python benchmarks/bench_detectors.py ~/face_project/known_faces
+#   python benchmarks/bench_detectors.py test_images/ --labels boxes.json --backends hog ssd yunet haar+ssd
+#
+# labels.json maps an image path relative to the folder to [[top, right, bottom, left], ...]
+# in the image's original pixels.
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from face_detectors import create_detector
+from face_tracker import box_iou
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def load_images(folder, size, limit):
+    """[(relative path, RGB image resized to `size`, (x scale, y scale))]"""
+    items = []
+    for root, _, files in sorted(os.walk(folder)):
+        for file_name in sorted(files):
+            if not file_name.lower().endswith(IMAGE_EXTENSIONS) or len(items) >= limit:
+                continue
+            path = os.path.join(root, file_name)
+            image = cv2.imread(path)
+            if image is None:
+                continue
+            height, width = image.shape[:2]
+            resized = cv2.cvtColor(cv2.resize(image, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB)
+            items.append((os.path.relpath(path, folder), resized, (size[0] / width, size[1] / height)))
+    return items
+
+
+def scaled_labels(labels, items):
+    out = []
+    for rel, _, (sx, sy) in items:
+        out.append([(t * sy, r * sx, b * sy, l * sx) for t, r, b, l in labels.get(rel, [])])
+    return out
+
+
+def run(detector, images, batch):
+    """(boxes per image, seconds per image)"""
+    start = time.perf_counter()
+    if batch:
+        found = []
+        for i in range(0, len(images), batch):
+            found.extend(detector.detect_batch(images[i:i + batch]))
+        times = [(time.perf_counter() - start) / len(images)] * len(images)
+        return found, times
+    found = []
+    times = []
+    for image in images:
+        image_start = time.perf_counter()
+        found.append(detector.detect(image))
+        times.append(time.perf_counter() - image_start)
+    return found, times
+
+
+def recall(found, truth):
+    """(matched labelled faces, labelled faces, false positives)"""
+    matched = total = false_positives = 0
+    for boxes, labelled in zip(found, truth):
+        used = set()
+        for label in labelled:
+            total += 1
+            best = max(((box_iou(label, box), j) for j, box in enumerate(boxes) if j not in used), default=(0, None))
+            if best[0] >= 0.5:
+                used.add(best[1])
+                matched += 1
+        false_positives += len(boxes) - len(used)
+    return matched, total, false_positives
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare face detector backends on test images (CPU)")
+    parser.add_argument("folder", help="Folder of test images (searched recursively)")
+    parser.add_argument("--backends", nargs="+", default=["hog", "cnn", "ssd", "yunet", "haar", "haar+hog"])
+    parser.add_argument("--labels", help="JSON of labelled face boxes per image")
+    parser.add_argument("--config", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                         "config.json"))
+    parser.add_argument("--size", default=None, help="Resize images to WxH (default: video.resolution)")
+    parser.add_argument("--batch", type=int, default=8, help="Batch size for backends that batch (0 = one at a time)")
+    parser.add_argument("--max-images", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=2, help="Timed runs per backend after one warm-up")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    size = tuple(int(v) for v in (args.size or config["video"].get("resolution") or "960x540").lower().split("x"))
+    items = load_images(args.folder, size, args.max_images)
+    if not items:
+        print(f"❌ No images found in {args.folder}")
+        sys.exit(1)
+    images = [image for _, image, _ in items]
+    truth = None
+    if args.labels:
+        with open(args.labels) as f:
+            truth = scaled_labels(json.load(f), items)
+    print(f"🖼️ {len(images)} image(s) at {size[0]}x{size[1]}, {os.cpu_count()} CPU(s)")
+
+    print(f"{'backend':<10} {'ms/image':>9} {'p90 ms':>8} {'img/s':>7} {'faces':>6} "
+          + (f"{'recall':>7} {'false +':>8}" if truth else f"{'images with a face':>19}"))
+    for spec in args.backends:
+        prefilter, _, backend = spec.rpartition("+")
+        try:
+            detector = create_detector(config, backend, prefilter or False)
+            run(detector, images[:1], 0)  # loads the model
+        except Exception as e:
+            print(f"{spec:<10} ⚠️ skipped: {e}")
+            continue
+        batch = args.batch if detector.batched else 0
+        times = []
+        for _ in range(args.runs):
+            found, run_times = run(detector, images, batch)
+            times.extend(run_times)
+        ms = np.asarray(times) * 1000
+        faces = sum(len(boxes) for boxes in found)
+        line = (f"{spec:<10} {ms.mean():>9.1f} {np.percentile(ms, 90):>8.1f} {1000 / ms.mean():>7.1f} {faces:>6} ")
+        if truth:
+            matched, total, false_positives = recall(found, truth)
+            line += f"{matched / total if total else float('nan'):>7.1%} {false_positives:>8}"
+        else:
+            line += f"{sum(1 for boxes in found if boxes) / len(found):>19.1%}"
+        print(line + (f"  (batches of {batch})" if batch else ""))
@@ -0,0 +1,92 @@
+# Face encoding throughput by batch size.
+#
+# Faces are located once (with the configured detector backend) in frames of a clip or in
+# a folder of images. The same faces are then encoded frame by frame with
+# face_recognition.face_encodings, as before, and through BatchEncoder at each batch size,
+# in a single process. Reports faces/sec, the speed-up and the largest difference from
+# the frame-by-frame encodings, which should be ~0.
+#
+#   python benchmarks/bench_encode_batch.py clip.mp4 --batch-sizes 1 4 8 16 32 64
+#   python benchmarks/bench_encode_batch.py ~/face_project/known_faces --max-faces 300
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import face_recognition
+from frame_analysis import BatchEncoder, locate_faces
+from bench_detectors import IMAGE_EXTENSIONS
+
+
+def read_images(source, every):
+    """Yield RGB frames of a video, or the images of a folder."""
+    if os.path.isdir(source):
+        for root, _, files in sorted(os.walk(source)):
+            for file_name in sorted(files):
+                if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                    image = cv2.imread(os.path.join(root, file_name))
+                    if image is not None:
+                        yield cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        return
+    cap = cv2.VideoCapture(source)
+    idx = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if idx % every == 0:
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        idx += 1
+    cap.release()
+
+
+def best_of(runs, fn):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batched face encoding")
+    parser.add_argument("source", help="Recorded video file or folder of images")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument("--every", type=int, default=1, help="Use every Nth video frame")
+    parser.add_argument("--max-faces", type=int, default=256)
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per setting (best is reported)")
+    args = parser.parse_args()
+
+    items = []
+    faces = 0
+    for frame in read_images(args.source, args.every):
+        locations = locate_faces(frame)
+        if locations:
+            items.append((frame, locations))
+            faces += len(locations)
+        if faces >= args.max_faces:
+            break
+    if not faces:
+        print(f"❌ No faces found in {args.source}")
+        sys.exit(1)
+    print(f"🙂 {faces} face(s) in {len(items)} frame(s)")
+
+    # Warm up dlib's models before timing
+    face_recognition.face_encodings(items[0][0], known_face_locations=items[0][1])
+
+    seconds, reference = best_of(args.runs, lambda: [face_recognition.face_encodings(frame, known_face_locations=locations)
+                                                      for frame, locations in items])
+    baseline = faces / seconds
+    print(f"{'encoding':<16} {'faces/s':>9} {'speed-up':>9} {'max diff':>9}")
+    print(f"{'per frame':<16} {baseline:>9.1f} {1.0:>8.2f}x {0.0:>9.1e}")
+    for batch_size in args.batch_sizes:
+        encoder = BatchEncoder(batch_size)
+        seconds, encoded = best_of(args.runs, lambda: [encodings for _, encodings in encoder.encode(
+            (i, frame, locations) for i, (frame, locations) in enumerate(items))])
+        diff = max(float(np.abs(np.asarray(a) - np.asarray(b)).max())
+                   for encs, refs in zip(encoded, reference) for a, b in zip(encs, refs))
+        print(f"{'batch ' + str(batch_size):<16} {faces / seconds:>9.1f} {faces / seconds / baseline:>8.2f}x {diff:>9.1e}")
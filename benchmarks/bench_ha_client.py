@@ -0,0 +1,87 @@
+# HA notification latency: the old per-call requests.post with blocking retries vs HAClient.
+#
+# For each stub HA scenario (healthy, slow, failing) it sends what detect_face.py sends for
+# an unknown face (video name + unknown boolean) and reports how long the detection thread
+# was blocked and how long until HA had received every update.
+#
+#   python benchmarks/bench_ha_client.py --runs 5
+import os
+import sys
+import time
+import argparse
+import statistics
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ha_integration import HAClient
+from stub_ha import StubHA
+
+SCENARIOS = [
+    ("healthy", 0.0, 0),
+    ("slow", 0.5, 0),
+    ("failing", 0.0, 2),
+]
+
+CALLS = [
+    ("input_text/set_value", {"entity_id": "input_text.latest_unknown_video", "value": "unknown_bench.mp4"}),
+    ("input_boolean/turn_on", {"entity_id": "input_boolean.unknown_face_detected"}),
+]
+
+
+def legacy_post(base_url, service, payload):
+    # ha_integration.post_to_ha before HAClient: new connection per call, sleep(2) between attempts
+    url = f"{base_url}/api/services/{service}"
+    headers = {"Authorization": "Bearer bench", "Content-Type": "application/json"}
+    for attempt in range(3):
+        try:
+            r = requests.post(url, headers=headers, json=payload, timeout=5)
+            if r.status_code == 200:
+                return True
+        except Exception:
+            pass
+        time.sleep(2)
+    return False
+
+
+def run_legacy(stub):
+    start = time.time()
+    for service, payload in CALLS:
+        legacy_post(stub.url, service, payload)
+    blocked = time.time() - start
+    delivered = stub.wait_for_call(30, count=len(CALLS))
+    return blocked, (delivered - start) if delivered else None
+
+
+def run_client(stub, client):
+    start = time.time()
+    client.send_chain(CALLS)
+    blocked = time.time() - start
+    delivered = stub.wait_for_call(30, count=len(CALLS))
+    return blocked, (delivered - start) if delivered else None
+
+
+def median_ms(values):
+    values = [v for v in values if v is not None]
+    return f"{statistics.median(values) * 1000:.1f}" if values else "n/a"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark HA notification latency")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'scenario':>9} {'client':>8} {'blocked ms':>11} {'delivered ms':>13}")
+    for scenario, delay, failures in SCENARIOS:
+        stub = StubHA(delay=delay, failures=failures).start()
+        client = HAClient(stub.url, "bench")
+        for label, fn in (("legacy", lambda: run_legacy(stub)), ("HAClient", lambda: run_client(stub, client))):
+            blocked, delivered = [], []
+            for _ in range(args.runs):
+                stub.reset(failures=failures)
+                b, d = fn()
+                blocked.append(b)
+                delivered.append(d)
+            client.flush()
+            print(f"{scenario:>9} {label:>8} {median_ms(blocked):>11} {median_ms(delivered):>13}")
+        stub.stop()
@@ -0,0 +1,68 @@
+# Micro-benchmark: per-face compare_faces loop vs FaceMatcher batch matching.
+#
+# Uses synthetic 128-d encodings so it runs without a camera or dlib. The baseline
+# reproduces face_recognition.compare_faces (np.linalg.norm over the known list,
+# rebuilt into an array on every call) followed by the "first match wins" scan.
+#
+#   python benchmarks/bench_matcher.py --sizes 100 10000 100000 --probes 80
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from face_matcher import FaceMatcher
+
+TOLERANCE = 0.45
+
+
+def make_gallery(size, people, rng):
+    centers = rng.normal(scale=0.1, size=(people, 128))
+    # Every person gets at least one encoding
+    labels = np.r_[np.arange(people), rng.integers(0, people, size=max(size - people, 0))]
+    encodings = centers[labels] + rng.normal(scale=0.02, size=(size, 128))
+    return list(encodings), [f"person_{i}" for i in labels], centers
+
+
+def baseline(known_encodings, known_names, probes):
+    names = []
+    for enc in probes:
+        distances = np.linalg.norm(np.array(known_encodings) - enc, axis=1)
+        matches = list(distances <= TOLERANCE)
+        names.append(known_names[matches.index(True)] if True in matches else None)
+    return names
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark face matching")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--probes", type=int, default=80, help="Faces per batch (e.g. one per frame of a run)")
+    parser.add_argument("--people", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'encodings':>10} {'compare_faces ms':>17} {'build ms':>9} {'matcher ms':>11} {'speedup':>8} {'agree':>6}")
+    for size in args.sizes:
+        encodings, names, centers = make_gallery(size, args.people, rng)
+        probe_ids = rng.integers(0, args.people, size=args.probes)
+        probes = centers[probe_ids] + rng.normal(scale=0.02, size=(args.probes, 128))
+
+        base_time, base_names = timed(lambda: baseline(encodings, names, probes), args.repeat)
+        build_time, matcher = timed(lambda: FaceMatcher(encodings, names, TOLERANCE), 1)
+        match_time, matches = timed(lambda: matcher.match(probes), args.repeat)
+
+        expected = [f"person_{i}" for i in probe_ids]
+        agree = sum(m.name == e for m, e in zip(matches, expected)) / len(expected)
+        print(f"{size:>10} {base_time * 1000:>17.2f} {build_time * 1000:>9.2f} {match_time * 1000:>11.2f} "
+              f"{base_time / match_time:>7.1f}x {agree:>6.0%}")
@@ -0,0 +1,116 @@
+# Load test for several cameras sharing one RecognitionPool.
+#
+# Starts N looping file-backed CameraManager streams (synthetic clips unless --source is
+# given) and triggers every camera at once, round after round. One camera is "busy" and
+# submits --busy-factor times more frames per trigger. Each round is run with the fair
+# per-camera scheduler and with one shared FIFO queue, and reports per camera the median
+# trigger -> last frame analyzed latency, plus the total frames/sec.
+#
+#   python benchmarks/bench_multi_camera.py --cameras 4 --workers 4
+#   python benchmarks/bench_multi_camera.py --detector synthetic    # no dlib needed
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from camera_manager import CameraManager
+from recognition_pool import RecognitionPool
+
+
+def synthetic_faces(rgb):
+    # Stand-in workload for machines without dlib: gradient image pyramid, like HOG's first stage
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    for scale in (1.0, 0.8, 0.64, 0.5, 0.4):
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        gx = cv2.Sobel(small, cv2.CV_32F, 1, 0)
+        gy = cv2.Sobel(small, cv2.CV_32F, 0, 1)
+        cv2.GaussianBlur(cv2.magnitude(gx, gy), (9, 9), 0)
+    return []
+
+
+def hog_faces(rgb):
+    from frame_analysis import analyze_frame
+    return analyze_frame(rgb)
+
+
+def synthetic_source(path, seed, seconds=4, fps=25, width=960, height=540):
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for i in range(int(seconds * fps)):
+        frame = background.copy()
+        x = int((width - 120) * i / (seconds * fps))
+        cv2.rectangle(frame, (x, 180), (x + 120, 340), (180, 160, 140), -1)
+        out.write(frame)
+    out.release()
+    return path
+
+
+def trigger(pool, key, name, frames, work, latencies):
+    start = time.perf_counter()
+    futures = [pool.submit(key, work, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)) for frame in frames]
+    for future in futures:
+        future.result()
+    latencies[name].append(time.perf_counter() - start)
+
+
+def run(cameras, pool, work, fair, rounds, frames_per_trigger, busy_factor):
+    latencies = {name: [] for name, _ in cameras}
+    total = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        threads = []
+        for i, (name, camera) in enumerate(cameras):
+            count = frames_per_trigger * (busy_factor if i == 0 else 1)
+            frames = camera.buffer.snapshot()[-count:]
+            total += len(frames)
+            key = name if fair else "fifo"
+            threads.append(threading.Thread(target=trigger, args=(pool, key, name, frames, work, latencies)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return latencies, total / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the shared recognition pool with N cameras")
+    parser.add_argument("--cameras", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--source", help="Video file looped by every camera (default: synthetic clips)")
+    parser.add_argument("--fps", type=int, default=8)
+    parser.add_argument("--frames", type=int, default=8, help="Frames per trigger")
+    parser.add_argument("--busy-factor", type=int, default=4, help="Frame multiplier for the first camera")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--detector", choices=["hog", "synthetic"], default="hog")
+    args = parser.parse_args()
+
+    work = hog_faces if args.detector == "hog" else synthetic_faces
+    pool = RecognitionPool(args.workers)
+    workdir = tempfile.mkdtemp(prefix="bench_multi_camera_")
+    buffer_sec = args.frames * args.busy_factor / args.fps + 1
+    cameras = []
+    for i in range(args.cameras):
+        source = args.source or synthetic_source(os.path.join(workdir, f"cam{i}.mp4"), i)
+        name = f"cam{i}" + (" (busy)" if i == 0 else "")
+        cameras.append((name, CameraManager(source, args.fps, buffer_sec, name=name)))
+
+    # Fill every ring buffer before triggering
+    time.sleep(buffer_sec)
+
+    for fair in (True, False):
+        latencies, fps = run(cameras, pool, work, fair, args.rounds, args.frames, args.busy_factor)
+        print(f"\n{'fair scheduler' if fair else 'shared FIFO'}: {fps:.1f} frames/sec total")
+        for name, values in latencies.items():
+            print(f"  {name:>10}: {statistics.median(values) * 1000:8.1f} ms")
+
+    # Capture threads still inside FFmpeg at interpreter exit abort the process
+    for _, camera in cameras:
+        camera.stop()
+    pool.shutdown()
@@ -0,0 +1,254 @@
+# Replay harness for the capture -> detect -> encode -> match -> notify pipeline.
+#
+# Recorded clips stand in for the camera and a stub HA server for Home Assistant, so
+# runs are repeatable without RTSP or HA. Each clip is decoded at video.fps (optionally
+# paced in real time), motion-gated, located, encoded and matched frame by frame and fed
+# to the DecisionEngine, like detect_face.py's quick scan. A known decision notifies HA
+# straight away, then the faces tracked over the rest of the capture are labelled; an
+# unknown one captures video.postroll_sec more and writes the clip through ClipWriter
+# before HA is told; no face stops the capture, as in the scripts.
+#
+# Results are one JSON document (stdout, or --json PATH) with per-stage latency
+# percentiles, frames/sec, peak RSS and trigger -> HA call time per run, tagged with the
+# git commit so results can be compared across releases.
+#
+#   python benchmarks/bench_pipeline.py clips/known.mp4 clips/unknown.mp4 --runs 3 --json results.json
+#   python benchmarks/bench_pipeline.py clip.mp4 --realtime --encodings encodings/faces.bin
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from contextlib import redirect_stdout
+from collections import defaultdict
+import numpy as np
+import cv2
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stub_ha import StubHA
+
+STAGES = ["decode", "gate", "locate", "encode", "match", "label"]
+CAPTURE_SEC = 10  # detect_face.py's capture window
+
+
+def percentiles(values):
+    values = np.asarray(values, dtype=np.float64) * 1000
+    if not len(values):
+        return {"count": 0}
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {"count": len(values), "mean_ms": round(float(values.mean()), 3), "p50_ms": round(float(p50), 3),
+            "p90_ms": round(float(p90), 3), "p99_ms": round(float(p99), 3), "max_ms": round(float(values.max()), 3)}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def replay(path, fps, resolution, realtime):
+    """Yield RGB frames of `path` sampled at `fps`, optionally as fast as a live camera would."""
+    cap = cv2.VideoCapture(path)
+    source_fps = cap.get(cv2.CAP_PROP_FPS) or fps
+    step = max(source_fps / fps, 1.0)
+    size = tuple(int(v) for v in resolution.lower().split("x")) if resolution else None
+    start = time.perf_counter()
+    idx = 0
+    next_pick = 0.0
+    count = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if idx >= next_pick:
+            next_pick += step
+            if size and (frame.shape[1], frame.shape[0]) != size:
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            if realtime:
+                time.sleep(max(0.0, start + count / fps - time.perf_counter()))
+            count += 1
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        idx += 1
+    cap.release()
+
+
+def run_clip(path, config, matcher, stub, clips, out_dir, realtime, samples):
+    from frame_analysis import analyze_frame, encode_faces
+    from motion_gate import MotionGate
+    from face_tracker import FaceTracker
+    from decision_engine import DecisionEngine
+    from ha_integration import send_to_home_assistant, get_client
+
+    video = config["video"]
+    recognition = config["recognition"]
+    fps = video.get("fps", 8)
+    scale = recognition.get("detect_scale", 1.0)
+    gate = MotionGate.from_config(config)
+    tracker = FaceTracker(max_samples=recognition.get("track_samples", 3), min_frames=recognition.get("min_frames", 3))
+    stub.reset()
+
+    trigger = time.time()
+    engine = DecisionEngine.from_config(config)
+    frames = []
+    decided_at = None
+    stop_after = None  # frame count at which capture stops after an unknown decision
+    wait_start = time.perf_counter()
+    for idx, frame in enumerate(replay(path, fps, video.get("resolution"), realtime)):
+        samples["decode"].append(time.perf_counter() - wait_start)
+        if idx >= CAPTURE_SEC * fps or (stop_after is not None and len(frames) >= stop_after):
+            break
+        frames.append(frame)
+        start = time.perf_counter()
+        changed, regions = gate.check(frame)
+        samples["gate"].append(time.perf_counter() - start)
+        if not changed:
+            tracker.carry(idx)
+            engine.skip()
+        elif engine.decision is None:
+            locations, encodings, timings = analyze_frame(frame, regions, scale)
+            samples["locate"].append(timings["locate"])
+            if encodings:
+                samples["encode"].append(timings["encode"])
+            start = time.perf_counter()
+            matches = matcher.match(encodings)
+            samples["match"].append(time.perf_counter() - start)
+            tracker.update(idx, frame, locations, encodings, [m.name for m in matches])
+            engine.update(matches)
+        else:
+            # After a known decision faces are only located and tracked, for the label
+            locations, _, timings = analyze_frame(frame, regions, scale, encode=False)
+            samples["locate"].append(timings["locate"])
+            tracker.update(idx, frame, locations)
+        if engine.decision is not None and decided_at is None:
+            decided_at = time.time()
+            if engine.decision.result == "known":
+                send_to_home_assistant(config, "known")
+            elif engine.decision.result == "unknown":
+                stop_after = len(frames) + int(video.get("postroll_sec", 1) * fps)
+            else:
+                break
+        wait_start = time.perf_counter()
+    captured_at = time.time()
+
+    if decided_at is None:
+        # The capture ended before the engine was confident either way
+        engine.finish()
+        decided_at = time.time()
+        if engine.decision.result == "known":
+            send_to_home_assistant(config, "known")
+    decision = engine.decision.result
+
+    if decision == "known":
+        # A few samples per track are encoded, as the scripts do, to label everyone seen
+        start = time.perf_counter()
+        by_frame = defaultdict(list)
+        for track, frame_idx, box in tracker.samples_to_encode():
+            by_frame[frame_idx].append((track, box))
+        for frame_idx, tracks in by_frame.items():
+            _, encodings, _ = encode_faces(frames[frame_idx], [box for _, box in tracks])
+            for (track, _), encoding, name in zip(tracks, encodings, matcher.names(encodings)):
+                tracker.add_sample(track, encoding, name)
+        known_names, unknown_people = tracker.people()
+        samples["label"].append(time.perf_counter() - start)
+        label = " and ".join(sorted(known_names) + ([f"{unknown_people} unknown"] if unknown_people else []))
+        send_to_home_assistant(config, "setText", name=label)
+    elif decision == "unknown":
+        out_path = os.path.join(out_dir, f"unknown_{os.getpid()}_{len(os.listdir(out_dir))}.mp4")
+        clips.submit_frames(frames, out_path, fps, video.get("codec", "mp4v"), rgb=True,
+                            on_done=lambda p: send_to_home_assistant(config, "unknown", video_path=p))
+    else:
+        send_to_home_assistant(config, "no_face")
+
+    notified = stub.wait_for_call(timeout=60)
+    # Let the rest of this run's HA calls land before the next run resets the stub
+    clips.flush()
+    get_client(config).flush(timeout=60)
+    return {
+        "clip": os.path.basename(path),
+        "frames": len(frames),
+        "decision": decision,
+        "decision_reason": engine.decision.reason,
+        "capture_s": round(captured_at - trigger, 3),
+        "trigger_to_decision_s": round(decided_at - trigger, 3),
+        "trigger_to_notify_s": round(notified - trigger, 3) if notified else None,
+        "fps": round(len(frames) / max(captured_at - trigger, 1e-9), 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded clips through the recognition pipeline")
+    parser.add_argument("clips", nargs="+", help="Recorded video files to replay")
+    parser.add_argument("--runs", type=int, default=1, help="Replays of every clip")
+    parser.add_argument("--realtime", action="store_true", help="Pace frames at video.fps like a live camera")
+    parser.add_argument("--config", default=os.path.join(REPO_DIR, "config.json"))
+    parser.add_argument("--encodings", help="faces.bin to match against (default: no known faces)")
+    parser.add_argument("--ha-delay", type=float, default=0.0, help="Seconds the stub HA takes to answer")
+    parser.add_argument("--json", metavar="PATH", help="Write the results here instead of stdout")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+
+    # ha_integration reads the HA URL at import time
+    stub = StubHA(delay=args.ha_delay).start()
+    os.environ["HA_BASE_URL"] = stub.url
+    os.environ["HA_TOKEN"] = "bench"
+    from face_matcher import FaceMatcher, load_matcher
+    from clip_writer import ClipWriter
+    import face_detectors
+
+    face_detectors.configure(config)
+
+    tolerance = config["recognition"].get("tolerance", 0.6)
+    matcher = load_matcher(args.encodings, config) if args.encodings else FaceMatcher(np.empty((0, 128)), [], tolerance)
+    clips = ClipWriter()
+    out_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+
+    samples = defaultdict(list)
+    runs = []
+    start = time.perf_counter()
+    # The pipeline's status lines go to stderr so stdout stays valid JSON
+    with redirect_stdout(sys.stderr):
+        for _ in range(args.runs):
+            for path in args.clips:
+                runs.append(run_clip(path, config, matcher, stub, clips, out_dir, args.realtime, samples))
+                print(f"▶️ {runs[-1]}")
+    elapsed = time.perf_counter() - start
+    stub.stop()
+
+    notify = [r["trigger_to_notify_s"] for r in runs if r["trigger_to_notify_s"] is not None]
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "settings": {"realtime": args.realtime, "runs": args.runs, "known_encodings": len(matcher),
+                     "fps": config["video"].get("fps", 8), "resolution": config["video"].get("resolution"),
+                     "detect_scale": config["recognition"].get("detect_scale", 1.0)},
+        "stages": {stage: percentiles(samples[stage]) for stage in STAGES},
+        "frames": sum(r["frames"] for r in runs),
+        "frames_per_sec": round(sum(r["frames"] for r in runs) / max(elapsed, 1e-9), 1),
+        "peak_rss_mb": peak_rss_mb(),
+        "trigger_to_notify": percentiles(notify),
+        "runs": runs,
+    }
+    text = json.dumps(results, indent=2)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(text + "\n")
+        print(f"💾 Wrote {args.json}", file=sys.stderr)
+    else:
+        print(text)
@@ -0,0 +1,109 @@
+# Accuracy, latency and size of prototype matching vs the full gallery.
+#
+# Holds out 20% of each person's encodings as validation probes (plus as many strangers
+# as a quarter of them), compacts the rest with face_prototypes.compact and reports, for
+# the full gallery, prototypes only and prototypes-first with fallback: gallery rows and
+# bytes, per-face match time, accuracy (right name for enrolled probes, unknown for
+# strangers) and how often the fallback to the full gallery was taken.
+#
+# Without --store the gallery is synthetic: bursts of near-duplicate encodings around a
+# few poses per person, which is what 15-second captures produce.
+#
+#   python benchmarks/bench_prototypes.py --people 200 --per-person 300 --max-per-person 5 10 20
+#   python benchmarks/bench_prototypes.py --store /home/$USER/face_project/encodings/faces.bin
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import face_store
+from face_matcher import FaceMatcher, PrototypeMatcher
+from face_prototypes import compact
+
+
+def synthetic_gallery(people, per_person, poses, rng):
+    centers = rng.normal(scale=0.06, size=(people, 128)).astype(np.float32)
+    encodings, names = [], []
+    for person, center in enumerate(centers):
+        pose_offsets = rng.normal(scale=0.03, size=(poses, 128))
+        pose = rng.integers(0, poses, size=per_person)
+        encodings.append(center + pose_offsets[pose] + rng.normal(scale=0.016, size=(per_person, 128)))
+        names += [f"person_{person}"] * per_person
+    return np.concatenate(encodings).astype(np.float32), names
+
+
+def split(encodings, names, holdout, rng):
+    """(train rows, validation rows), holding out `holdout` of each person's rows."""
+    names = np.asarray(names)
+    train, validation = [], []
+    for name in np.unique(names):
+        rows = rng.permutation(np.flatnonzero(names == name))
+        cut = int(len(rows) * holdout)
+        if len(rows) > 1 and cut == 0:
+            cut = 1
+        validation.extend(rows[:cut])
+        train.extend(rows[cut:])
+    return np.sort(train), np.sort(validation)
+
+
+def evaluate(matcher, probes, expected):
+    start = time.perf_counter()
+    matches = [matcher.match(probe[None, :])[0] for probe in probes]
+    ms = (time.perf_counter() - start) * 1000 / len(probes)
+    return ms, np.mean([m.name == e for m, e in zip(matches, expected)])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark prototype matching against the full gallery")
+    parser.add_argument("--store", help="faces.bin to evaluate (default: a synthetic gallery)")
+    parser.add_argument("--people", type=int, default=200)
+    parser.add_argument("--per-person", type=int, default=300)
+    parser.add_argument("--poses", type=int, default=6)
+    parser.add_argument("--max-per-person", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--fallback-margin", type=float, default=0.05)
+    parser.add_argument("--tolerance", type=float, default=0.45)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--max-probes", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.store:
+        encodings, names, _ = face_store.load_store(args.store)
+        encodings = np.asarray(encodings, dtype=np.float32)
+    else:
+        encodings, names = synthetic_gallery(args.people, args.per_person, args.poses, rng)
+
+    train, validation = split(encodings, names, args.holdout, rng)
+    validation = rng.permutation(validation)[:args.max_probes]
+    train_encodings, train_names = encodings[train], [names[i] for i in train]
+    strangers = rng.normal(scale=0.06, size=(max(1, len(validation) // 4), 128)).astype(np.float32)
+    probes = np.concatenate([encodings[validation], strangers])
+    expected = [names[i] for i in validation] + [None] * len(strangers)
+    print(f"🧪 {len(train)} gallery rows, {len(set(train_names))} people, "
+          f"{len(validation)} held-out probes + {len(strangers)} strangers")
+
+    full = FaceMatcher(train_encodings, train_names, args.tolerance)
+    ms, accuracy = evaluate(full, probes, expected)
+    print(f"\n{'mode':>22} {'rows':>8} {'MB':>7} {'ms/face':>8} {'accuracy':>9} {'fallback':>9}")
+    print(f"{'full gallery':>22} {len(full):>8} {full.matrix.nbytes / 1e6:>7.2f} {ms:>8.3f} {accuracy:>9.1%} {'-':>9}")
+
+    sources = [None] * len(train_names)
+    for max_prototypes in args.max_per_person:
+        start = time.perf_counter()
+        proto_encodings, proto_names, _ = compact(train_encodings, train_names, sources, max_prototypes)
+        build = time.perf_counter() - start
+        prototypes = FaceMatcher(proto_encodings, proto_names, args.tolerance)
+        size = prototypes.matrix.nbytes / 1e6
+
+        ms, accuracy = evaluate(PrototypeMatcher(prototypes), probes, expected)
+        label = f"prototypes k={max_prototypes}"
+        print(f"{label:>22} {len(prototypes):>8} {size:>7.2f} {ms:>8.3f} {accuracy:>9.1%} {'-':>9}")
+
+        matcher = PrototypeMatcher(prototypes, full, args.fallback_margin)
+        ms, accuracy = evaluate(matcher, probes, expected)
+        label = f"  + fallback k={max_prototypes}"
+        print(f"{label:>22} {len(prototypes):>8} {size:>7.2f} {ms:>8.3f} {accuracy:>9.1%} "
+              f"{matcher.fallbacks / len(probes):>9.1%}")
+        print(f"{'':>22} compacted in {build:.2f}s, {1 - len(prototypes) / len(full):.0%} fewer rows")
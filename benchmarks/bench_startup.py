@@ -0,0 +1,109 @@
+# Cold-start time of the detector scripts' module-level imports.
+#
+# Every script is one-shot (or a fresh daemon after a restart), so whatever it imports at
+# the top is paid on each Home Assistant trigger before the camera is even opened. This
+# runs each script's top-level import statements in a fresh interpreter under
+# `python -X importtime` and reports the median wall time and the slowest modules.
+# With --baseline the same is measured on a git ref checked out in a temporary worktree,
+# e.g. to compare against the tree before the heavy imports were made lazy.
+#
+#   python benchmarks/bench_startup.py
+#   python benchmarks/bench_startup.py --baseline HEAD~1 --runs 7
+#   python benchmarks/bench_startup.py --scripts detect_face.py face_daemon.py --top 10
+import os
+import re
+import ast
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = ["detect_face.py", "detect_and_notify.py", "detect_and_handle.py", "face_daemon.py"]
+IMPORTTIME = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def top_level_imports(path):
+    """The script's module-level import statements as source, run in place of the script."""
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def measure(tree_dir, script, runs):
+    source = top_level_imports(os.path.join(tree_dir, script))
+    walls = []
+    modules = {}
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", source], cwd=tree_dir,
+                                capture_output=True, text=True)
+        walls.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()
+            return {"error": error[-1] if error else f"exit code {result.returncode}"}
+        # Keep only the top-level imports (no indentation) with their cumulative time
+        for self_us, cumulative_us, indent, name in IMPORTTIME.findall(result.stderr):
+            if len(indent) == 1:
+                modules.setdefault(name, []).append(int(cumulative_us) / 1e6)
+    return {
+        "wall_s": statistics.median(walls),
+        "modules": sorted(((name, statistics.median(times)) for name, times in modules.items()),
+                          key=lambda item: item[1], reverse=True),
+    }
+
+
+def checkout(ref):
+    tree_dir = tempfile.mkdtemp(prefix="bench_startup_")
+    subprocess.run(["git", "worktree", "add", "--detach", tree_dir, ref], cwd=REPO_DIR, check=True,
+                   capture_output=True)
+    # Untracked files the scripts read at import time
+    for name in ("config.json", ".env"):
+        if os.path.exists(os.path.join(REPO_DIR, name)) and not os.path.exists(os.path.join(tree_dir, name)):
+            shutil.copy(os.path.join(REPO_DIR, name), tree_dir)
+    return tree_dir
+
+
+def remove(tree_dir):
+    subprocess.run(["git", "worktree", "remove", "--force", tree_dir], cwd=REPO_DIR, capture_output=True)
+    shutil.rmtree(tree_dir, ignore_errors=True)
+
+
+def print_result(label, result, top):
+    if "error" in result:
+        print(f"  {label:<10} ⚠️ {result['error']}")
+        return
+    slowest = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in result["modules"][:top])
+    print(f"  {label:<10} {result['wall_s'] * 1000:8.0f} ms   {slowest}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the import-time cold start of the detector scripts")
+    parser.add_argument("--scripts", nargs="+", default=SCRIPTS)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per script (median is reported)")
+    parser.add_argument("--baseline", metavar="REF", help="Also measure this git ref, e.g. HEAD~1")
+    parser.add_argument("--top", type=int, default=5, help="Slowest top-level modules to list")
+    args = parser.parse_args()
+
+    baseline_dir = checkout(args.baseline) if args.baseline else None
+    try:
+        print(f"🚀 Startup imports, median of {args.runs} runs (python -X importtime)")
+        for script in args.scripts:
+            print(f"\n{script}")
+            current = measure(REPO_DIR, script, args.runs)
+            if baseline_dir:
+                if os.path.exists(os.path.join(baseline_dir, script)):
+                    before = measure(baseline_dir, script, args.runs)
+                    print_result(args.baseline, before, args.top)
+                else:
+                    before = {"error": "not in this ref"}
+                    print_result(args.baseline, before, args.top)
+            print_result("current", current, args.top)
+            if baseline_dir and "error" not in current and "error" not in before:
+                print(f"  {'speedup':<10} {before['wall_s'] / current['wall_s']:8.1f}x")
+    finally:
+        if baseline_dir:
+            remove(baseline_dir)
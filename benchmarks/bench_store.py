@@ -0,0 +1,83 @@
+# Startup cost of the encodings DB: legacy faces.pkl vs the memory-mapped faces.bin.
+#
+# Each load runs in a fresh interpreter (numpy already imported) and reports wall time
+# and RSS growth, both for the load itself and for load + building a FaceMatcher.
+#
+#   python benchmarks/bench_store.py --sizes 1000 100000
+import os
+import sys
+import json
+import pickle
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+import face_store
+
+PROBE = """
+import sys, json, time, pickle
+sys.path.insert(0, {repo!r})
+import numpy as np
+import face_store
+from face_matcher import FaceMatcher
+
+def rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS"):
+                return int(line.split()[1])
+
+before = rss_kb()
+start = time.perf_counter()
+if {fmt!r} == "pickle":
+    with open({path!r}, "rb") as f:
+        data = pickle.load(f)
+    encodings, names = data["encodings"], data["names"]
+else:
+    encodings, names = face_store.load_encodings({path!r})
+loaded = time.perf_counter()
+load_rss = rss_kb()
+FaceMatcher(encodings, names)
+ready = time.perf_counter()
+print(json.dumps({{
+    "load_ms": (loaded - start) * 1000,
+    "load_rss_kb": load_rss - before,
+    "ready_ms": (ready - start) * 1000,
+    "ready_rss_kb": rss_kb() - before,
+}}))
+"""
+
+
+def run_probe(fmt, path):
+    out = subprocess.run([sys.executable, "-c", PROBE.format(repo=REPO_DIR, fmt=fmt, path=path)],
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark encodings DB load time and memory")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    parser.add_argument("--people", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'encodings':>10} {'format':>7} {'size MB':>8} {'load ms':>8} {'load RSS MB':>12} "
+              f"{'+matcher ms':>12} {'+matcher RSS MB':>16}")
+        for size in args.sizes:
+            # Same shape as manage_faces.py wrote: a list of float64 arrays and a list of names
+            encodings = list(rng.normal(scale=0.1, size=(size, 128)))
+            names = [f"person_{i % args.people}" for i in range(size)]
+            pkl_path = os.path.join(tmp, f"faces_{size}.pkl")
+            bin_path = os.path.join(tmp, f"faces_{size}.bin")
+            with open(pkl_path, "wb") as f:
+                pickle.dump({"encodings": encodings, "names": names}, f)
+            face_store.save_encodings(bin_path, encodings, names)
+
+            for fmt, path in (("pickle", pkl_path), ("store", bin_path)):
+                r = run_probe(fmt, path)
+                print(f"{size:>10} {fmt:>7} {os.path.getsize(path) / 1e6:>8.2f} {r['load_ms']:>8.1f} "
+                      f"{r['load_rss_kb'] / 1024:>12.1f} {r['ready_ms']:>12.1f} {r['ready_rss_kb'] / 1024:>16.1f}")
@@ -0,0 +1,93 @@
+# Minimal stand-in for the Home Assistant REST API.
+# Accepts POST /api/services/<domain>/<service> and records when each call arrived.
+# It can answer slowly (delay) and fail the first N requests with HTTP 500 (failures)
+# to see how clients behave against a struggling HA.
+#
+#   python benchmarks/stub_ha.py --port 8123 --delay 0.5 --failures 2
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHA:
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0, failures=0):
+        self.calls = []
+        self.delay = delay
+        self.failures = failures
+        self.requests = 0
+        self.cond = threading.Condition()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                time.sleep(stub.delay)
+                with stub.cond:
+                    stub.requests += 1
+                    failed = stub.requests <= stub.failures
+                    if not failed:
+                        stub.calls.append((time.time(), self.path, payload))
+                        stub.cond.notify_all()
+                if failed:
+                    self.send_response(500)
+                    self.end_headers()
+                    self.wfile.write(b"stub failure")
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(b"[]")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset(self, failures=None):
+        with self.cond:
+            self.calls = []
+            self.requests = 0
+            if failures is not None:
+                self.failures = failures
+
+    def wait_for_call(self, timeout=60, count=1):
+        """Block until `count` calls have succeeded; return the last one's timestamp or None."""
+        deadline = time.time() + timeout
+        with self.cond:
+            while len(self.calls) < count and time.time() < deadline:
+                self.cond.wait(timeout=deadline - time.time())
+            return self.calls[count - 1][0] if len(self.calls) >= count else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Home Assistant REST API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8123)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before answering")
+    parser.add_argument("--failures", type=int, default=0, help="Answer the first N requests with HTTP 500")
+    args = parser.parse_args()
+
+    stub = StubHA(args.host, args.port, args.delay, args.failures).start()
+    print(f"🏠 Stub HA listening on {stub.url}")
+    try:
+        while True:
+            with stub.cond:
+                count = len(stub.calls)
+                stub.cond.wait()
+                for ts, path, payload in stub.calls[count:]:
+                    print(f"📩 {path} {payload}")
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,203 @@
+# One long-lived camera session shared by everything that needs frames.
+# A background thread keeps the decoder drained (grab() every packet, decode only the
+# frames kept at the configured FPS), so the newest frame is never older than one frame
+# interval, and reconnects with exponential backoff when the stream drops or stalls.
+# Frames go into a FrameRingBuffer, so recent history is available for clips.
+import os
+import time
+import threading
+import cv2
+from frame_buffer import FrameRingBuffer
+from face_core import resolve_value
+
+CAMERA_KEYS = ("name", "rtsp_url", "home_assistant", "unknown_face_output")
+
+
+def load_cameras(config):
+    """Return [(name, rtsp_url, camera_config)] for every configured camera.
+
+    Each entry of config["cameras"] may set its own rtsp_url, unknown_face_output and
+    home_assistant entities, plus any "camera" option; camera_config is the full config
+    with those overrides applied, so it can be passed anywhere `config` is expected.
+    Without a "cameras" list there is one camera, "default", reading RTSP_URL.
+    """
+    username = os.getenv("USERNAME")
+    entries = config.get("cameras") or [{"name": "default", "rtsp_url": "ENV_RTSP_URL"}]
+    cameras = []
+    for entry in entries:
+        merged = dict(config)
+        merged["camera"] = {**config.get("camera", {}),
+                            **{k: v for k, v in entry.items() if k not in CAMERA_KEYS}}
+        merged["home_assistant"] = {**config.get("home_assistant", {}), **entry.get("home_assistant", {})}
+        merged["paths"] = dict(config.get("paths", {}))
+        if "unknown_face_output" in entry:
+            merged["paths"]["unknown_face_output"] = entry["unknown_face_output"]
+        cameras.append((entry["name"], resolve_value(entry.get("rtsp_url", "ENV_RTSP_URL"), username), merged))
+    return cameras
+
+
+class CameraManager:
+    """Keeps `url` open and buffered; a local video file is looped as a stand-in camera."""
+
+    def __init__(self, url, fps, buffer_sec, resolution=None, timeout_sec=5, backoff=1.0, max_backoff=30.0,
+                 loop=None, name="camera"):
+        self.name = name
+        self.url = url
+        self.interval = 1.0 / fps
+        self.timeout_sec = timeout_sec
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.loop = os.path.isfile(url) if loop is None else loop
+        self.buffer = FrameRingBuffer(buffer_sec, fps, resolution)
+        self.cond = threading.Condition()
+        self.running = True
+        self.connected = False
+        self.reconnects = 0
+        self.failures = 0  # consecutive failed connections, drives the backoff
+        self.grabbed = 0
+        self.kept = 0
+        self.dropped = 0
+        self.started = time.time()
+        self.thread = threading.Thread(target=self._reader, daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def from_config(cls, config, url, buffer_sec, name="camera"):
+        video = config.get("video", {})
+        camera = config.get("camera", {})
+        return cls(url, video.get("fps", 8), buffer_sec, video.get("resolution"), camera.get("timeout_sec", 5),
+                   camera.get("reconnect_backoff", 1.0), camera.get("max_backoff", 30.0), name=name)
+
+    def _open(self):
+        timeout_ms = int(self.timeout_sec * 1000)
+        params = []
+        if hasattr(cv2, "CAP_PROP_OPEN_TIMEOUT_MSEC"):
+            # Without these a dead camera blocks open()/grab() for FFmpeg's own 30 s default
+            params = [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms, cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms]
+        cap = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG, params)
+        # Keep OpenCV's own queue minimal so grab() returns live packets
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+
+    def _wait_backoff(self):
+        delay = min(self.max_backoff, self.backoff * 2 ** self.failures)
+        self.failures += 1
+        deadline = time.time() + delay
+        while self.running and time.time() < deadline:
+            time.sleep(min(0.2, deadline - time.time()))
+
+    def _reader(self):
+        while self.running:
+            cap = self._open()
+            if not cap.isOpened():
+                print(f"❌ [{self.name}] Failed to open RTSP stream, retrying...")
+                self._wait_backoff()
+                continue
+            print(f"📡 [{self.name}] RTSP stream opened.")
+            self.connected = True
+            # A looped file is paced at its own frame rate, like a live camera
+            source_interval = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 25) if self.loop else 0.0
+            last_kept = 0.0
+            while self.running:
+                if not cap.grab():
+                    if self.loop and self.grabbed and cap.set(cv2.CAP_PROP_POS_FRAMES, 0):
+                        continue
+                    print(f"⚠️ [{self.name}] Lost RTSP stream, reconnecting...")
+                    break
+                self.grabbed += 1
+                now = time.time()
+                if source_interval:
+                    time.sleep(source_interval)
+                if now - last_kept < self.interval:
+                    continue
+                ret, frame = cap.retrieve()
+                if not ret or frame is None:
+                    self.dropped += 1
+                    continue
+                last_kept = now
+                self.kept += 1
+                self.failures = 0
+                self.buffer.push(frame, now)
+                with self.cond:
+                    self.cond.notify_all()
+            cap.release()
+            self.connected = False
+            if self.running:
+                self.reconnects += 1
+                self._wait_backoff()
+
+    def latest(self, max_age=None, timeout=None):
+        """Newest frame, waiting up to `timeout` for one no older than `max_age` seconds.
+
+        Defaults to camera.timeout_sec for both; returns None if no fresh frame arrives.
+        """
+        max_age = self.timeout_sec if max_age is None else max_age
+        deadline = time.time() + (self.timeout_sec if timeout is None else timeout)
+        with self.cond:
+            while True:
+                frame, ts = self.buffer.latest()
+                if frame is not None and time.time() - ts <= max_age:
+                    return frame
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(timeout=remaining)
+
+    def collect(self, seconds):
+        """Return the frames that arrive within the next `seconds` seconds."""
+        start = time.time()
+        time.sleep(seconds)
+        return self.buffer.snapshot(since=start)
+
+    def frames(self, seconds, timeout=None):
+        """Yield every new frame as it arrives, for up to `seconds` after the first one.
+
+        Stops early if no frame arrives within `timeout` (camera.timeout_sec by default).
+        """
+        deadline = None
+        timeout = self.timeout_sec if timeout is None else timeout
+        last = time.time()
+        while deadline is None or time.time() < deadline:
+            with self.cond:
+                frame, ts = self.buffer.latest()
+                while frame is None or ts <= last:
+                    remaining = min(deadline or float("inf"), last + timeout) - time.time()
+                    if remaining <= 0:
+                        return
+                    self.cond.wait(timeout=remaining)
+                    frame, ts = self.buffer.latest()
+            last = ts
+            if deadline is None:
+                deadline = time.time() + seconds
+            yield frame
+
+    def frame_age(self):
+        _, last = self.buffer.latest()
+        return None if last is None else time.time() - last
+
+    def healthy(self):
+        age = self.frame_age()
+        return age is not None and age < self.timeout_sec
+
+    def metrics(self):
+        elapsed = max(time.time() - self.started, 1e-6)
+        age = self.frame_age()
+        return {
+            "connected": self.connected,
+            "fps": round(self.kept / elapsed, 2),
+            "source_fps": round(self.grabbed / elapsed, 2),
+            "frames": self.kept,
+            "dropped": self.dropped,
+            "reconnects": self.reconnects,
+            "last_frame_age": None if age is None else round(age, 3),
+            "buffer_mb": round(self.buffer.nbytes / 1e6, 1),
+        }
+
+    def stop(self, timeout=None):
+        """Stop capturing and wait for the reader thread to release the stream.
+
+        Left running, the thread can still be inside FFmpeg when the interpreter exits,
+        which aborts the process. A read is bounded by camera.timeout_sec.
+        """
+        self.running = False
+        self.thread.join(self.timeout_sec + 1 if timeout is None else timeout)
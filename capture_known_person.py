@@ -1,14 +1,22 @@
 #in terminal run: python capture_known_person.py Name
 #this script store the entered Name as a folder in /known_faces
 #run python add_known_face.py or use mange_faces.py
+#
+# Frames are analyzed while FFmpeg is still capturing. Each face is scored on sharpness,
+# size and pose, near-duplicates (by encoding distance) keep only the better shot, and the
+# top `capture.top_k` aligned face crops are saved instead of every full frame.
 import os
 import sys
 import cv2
 import time
+import json
+import numpy as np
 import face_recognition
+import face_detectors
+from frame_analysis import locate_faces
+from frame_stream import FrameStream
 from dotenv import load_dotenv
 from datetime import datetime
-import subprocess
 
 
 #test purposes
@@ -19,6 +27,22 @@ load_dotenv()
 RTSP_URL = os.getenv("RTSP_URL")
 USERNAME = os.getenv("USERNAME")
 
+# === Load configuration ===
+with open("config.json", "r") as f:
+    config = json.load(f)
+face_detectors.configure(config)
+
+DETECT_SCALE = config["recognition"].get("detect_scale", 1.0)
+CAPTURE = config.get("capture", {})
+CAPTURE_SEC = CAPTURE.get("seconds", 15)
+CAPTURE_FPS = CAPTURE.get("fps", 5)
+TOP_K = CAPTURE.get("top_k", 20)
+MIN_FACE_PX = CAPTURE.get("min_face_px", 80)
+MIN_SHARPNESS = CAPTURE.get("min_sharpness", 60)
+DEDUPE_DISTANCE = CAPTURE.get("dedupe_distance", 0.15)
+CROP_MARGIN = CAPTURE.get("crop_margin", 0.4)
+CROP_SIZE = CAPTURE.get("crop_size", 300)
+
 # === Input Arguments ===
 if len(sys.argv) < 2:
     print("❌ Usage: python capture_known_person.py <PersonName>")
@@ -28,47 +52,104 @@ person_name = sys.argv[1]
 output_dir = f"/home/{USERNAME}/face_project/known_faces/{person_name}"
 os.makedirs(output_dir, exist_ok=True)
 
-# === File paths ===
-video_path = "/tmp/capture_known.mp4"
 
-# === Step 1: Use ffmpeg to capture 15 seconds of native RTSP video ===
-print("🎥 Capturing 15 seconds of raw stream using ffmpeg...")
-ffmpeg_cmd = [
-    "ffmpeg", "-y",
-    "-rtsp_transport", "tcp",
-    "-i", RTSP_URL,
-    "-t", "15",
-    "-c", "copy",  # no re-encoding
-    video_path
-]
+# === Face scoring ===
+def sharpness(rgb, location):
+    """Variance of the Laplacian of the face, resized to a fixed width so size does not count."""
+    top, right, bottom, left = location
+    face = cv2.cvtColor(rgb[top:bottom, left:right], cv2.COLOR_RGB2GRAY)
+    face = cv2.resize(face, (128, 128), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(face, cv2.CV_64F).var())
+
+
+def eye_centres(landmarks):
+    return np.mean(landmarks["left_eye"], axis=0), np.mean(landmarks["right_eye"], axis=0)
+
+
+def frontalness(landmarks):
+    """1.0 for a frontal face, falling towards 0 as the nose moves off the eyes' midpoint."""
+    left_eye, right_eye = eye_centres(landmarks)
+    eye_dist = np.linalg.norm(right_eye - left_eye)
+    if eye_dist < 1:
+        return 0.0
+    nose = np.mean(landmarks["nose_tip"], axis=0)
+    offset = abs(nose[0] - (left_eye[0] + right_eye[0]) / 2) / eye_dist
+    return max(0.0, 1.0 - 2.0 * offset)
 
-try:
-    subprocess.run(ffmpeg_cmd, check=True)
-except subprocess.CalledProcessError:
-    print("❌ ffmpeg failed to capture stream.")
-    sys.exit(1)
 
-# === Step 2: Analyze video frame-by-frame ===
-print("🧠 Extracting frames with faces...")
-cap = cv2.VideoCapture(video_path)
-saved = 0
-frame_id = 0
+def aligned_crop(rgb, location, landmarks):
+    """Square crop around the face, rotated so the eyes are level, as BGR for cv2.imwrite."""
+    top, right, bottom, left = location
+    left_eye, right_eye = eye_centres(landmarks)
+    angle = np.degrees(np.arctan2(right_eye[1] - left_eye[1], right_eye[0] - left_eye[0]))
+    centre = ((left + right) / 2, (top + bottom) / 2)
+    side = max(right - left, bottom - top) * (1 + 2 * CROP_MARGIN)
+    scale = CROP_SIZE / side
+    matrix = cv2.getRotationMatrix2D(centre, angle, scale)
+    # Move the face centre to the centre of the output crop
+    matrix[:, 2] += (CROP_SIZE / 2 - centre[0], CROP_SIZE / 2 - centre[1])
+    crop = cv2.warpAffine(rgb, matrix, (CROP_SIZE, CROP_SIZE), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_REPLICATE)
+    return cv2.cvtColor(crop, cv2.COLOR_RGB2BGR)
 
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
 
-    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    locations = face_recognition.face_locations(rgb)
+def keep_candidate(kept, candidate):
+    """Add `candidate` unless a near-duplicate scored higher; replaces worse near-duplicates."""
+    if kept:
+        encodings = np.array([c["encoding"] for c in kept])
+        near = np.linalg.norm(encodings - candidate["encoding"], axis=1) < DEDUPE_DISTANCE
+        if any(c["score"] >= candidate["score"] for c, is_near in zip(kept, near) if is_near):
+            return
+        kept[:] = [c for c, is_near in zip(kept, near) if not is_near]
+    kept.append(candidate)
 
-    if locations:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        out_path = os.path.join(output_dir, f"{timestamp}.jpg")
-        cv2.imwrite(out_path, frame)
-        saved += 1
 
-    frame_id += 1
+# === Step 1: Stream the capture and analyze frames as they arrive ===
+print(f"🎥 Capturing {CAPTURE_SEC} seconds at {CAPTURE_FPS} fps and analyzing frames as they arrive...")
+stream = FrameStream(RTSP_URL, CAPTURE_FPS, duration=CAPTURE_SEC, buffers=16)
+stats = {"frames": 0, "faces": 0, "small": 0, "blurry": 0, "candidates": 0}
+kept = []
+start = time.time()
+
+try:
+    for rgb in stream:
+        stats["frames"] += 1
+        locations = locate_faces(rgb, scale=DETECT_SCALE)
+        if not locations:
+            continue
+        stats["faces"] += 1
+
+        # The person being enrolled is the largest face in view
+        location = max(locations, key=lambda l: (l[2] - l[0]) * (l[1] - l[3]))
+        size = min(location[2] - location[0], location[1] - location[3])
+        if size < MIN_FACE_PX:
+            stats["small"] += 1
+            continue
+        sharp = sharpness(rgb, location)
+        if sharp < MIN_SHARPNESS:
+            stats["blurry"] += 1
+            continue
+
+        landmarks = face_recognition.face_landmarks(rgb, [location], model="small")[0]
+        score = (frontalness(landmarks) * min(1.0, sharp / (2 * MIN_SHARPNESS))
+                 * min(1.0, size / (2 * MIN_FACE_PX)))
+        encoding = face_recognition.face_encodings(rgb, known_face_locations=[location])[0]
+        stats["candidates"] += 1
+        keep_candidate(kept, {"score": score, "encoding": encoding, "crop": aligned_crop(rgb, location, landmarks)})
+finally:
+    stream.close()
+
+if stream.failed:
+    print("❌ ffmpeg failed to capture stream.")
+    sys.exit(1)
+
+# === Step 2: Save the best distinct crops ===
+kept.sort(key=lambda c: c["score"], reverse=True)
+for rank, candidate in enumerate(kept[:TOP_K]):
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    cv2.imwrite(os.path.join(output_dir, f"{timestamp}_{rank:02d}.jpg"), candidate["crop"])
 
-cap.release()
-print(f"✅ Done. Saved {saved} frames with faces to: {output_dir}")
+print(f"🧮 {stats['frames']} frames, {stats['faces']} with a face: {stats['small']} too small, "
+      f"{stats['blurry']} blurry, {stats['candidates'] - len(kept)} near-duplicate(s), {len(kept)} distinct "
+      f"in {time.time() - start:.1f}s")
+print(f"✅ Done. Saved {min(len(kept), TOP_K)} face crops to: {output_dir}")
@@ -0,0 +1,99 @@
+# Unknown-face clips written off the detection path.
+# One background thread finishes each clip into a hidden temporary file next to its final
+# path and renames it into place, so HA (and Samba readers) never see a half-written clip.
+# Recordings FFmpeg already made with stream copy (-c copy) are only moved; frames held
+# in memory are encoded with cv2.VideoWriter as a fallback.
+import os
+import time
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from metrics import metrics
+from face_core import lazy_import
+
+# Only needed when a clip has to be encoded from frames
+cv2 = lazy_import("cv2")
+
+
+def temp_path(out_path):
+    folder, name = os.path.split(out_path)
+    return os.path.join(folder, f".{name}.part{os.path.splitext(name)[1]}")
+
+
+class ClipWriter:
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clip")
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.jobs = []  # (path, mode, wall seconds, cpu seconds)
+
+    def _run(self, mode, write, out_path, on_done):
+        start, cpu = time.perf_counter(), time.thread_time()
+        tmp = temp_path(out_path)
+        try:
+            write(tmp)
+            os.replace(tmp, out_path)
+        except Exception as e:
+            print(f"❌ Failed to write clip {out_path}: {e}")
+            metrics.count("clips", mode=mode, outcome="failed")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return None
+        self.jobs.append((out_path, mode, time.perf_counter() - start, time.thread_time() - cpu))
+        metrics.observe("clip", self.jobs[-1][2])
+        metrics.count("clips", mode=mode, outcome="ok")
+        print(f"💾 Saved unknown face clip to: {out_path}")
+        if on_done:
+            on_done(out_path)
+        return out_path
+
+    def _submit(self, *args):
+        future = self.executor.submit(self._run, *args)
+        with self.lock:
+            self.pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self.lock:
+            self.pending.discard(future)
+
+    def submit_recording(self, source, out_path, on_done=None):
+        """Move a finished stream-copy recording to `out_path`; on_done(out_path) runs after."""
+        def write(tmp):
+            try:
+                os.replace(source, tmp)
+            except OSError:  # different filesystem, e.g. a mounted share
+                shutil.copyfile(source, tmp)
+                os.remove(source)
+        return self._submit("copy", write, out_path, on_done)
+
+    def submit_frames(self, frames, out_path, fps, codec="mp4v", rgb=False, on_done=None):
+        """Encode in-memory frames (BGR, or RGB with rgb=True) to `out_path` in the background.
+
+        `frames` may also be a callable returning them, evaluated on the writer thread,
+        e.g. to wait for post-roll frames without holding up the caller.
+        """
+        def write(tmp):
+            nonlocal frames
+            if callable(frames):
+                frames = frames()
+            height, width = frames[0].shape[:2]
+            out = cv2.VideoWriter(tmp, cv2.VideoWriter_fourcc(*codec), fps, (width, height))
+            if not out.isOpened():
+                raise IOError("cv2.VideoWriter could not open the output file")
+            for frame in frames:
+                out.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR) if rgb else frame)
+            out.release()
+        return self._submit("encode", write, out_path, on_done)
+
+    def flush(self, timeout=None):
+        """Wait for outstanding clips, e.g. before a one-shot script exits."""
+        with self.lock:
+            pending = list(self.pending)
+        for future in pending:
+            future.result(timeout=timeout)
+
+    def report(self):
+        for path, mode, wall, cpu in self.jobs:
+            print(f"🎬 Clip {os.path.basename(path)}: {mode} in {wall * 1000:.0f} ms, {cpu * 1000:.0f} ms CPU")
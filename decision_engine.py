@@ -0,0 +1,121 @@
+# Streaming known / unknown / no-face decision.
+# Frames are fed in as they arrive and the engine stops as soon as one identity has been
+# matched with confidence (distance below the tolerance by `distance_margin`, and closer
+# than the runner-up identity by as much) in `min_frames` frames. Unknown and no-face are
+# declared once enough frames showed only unmatched faces, or no face at all, or when the
+# evidence budget (`max_frames` frames or `max_seconds` since the first frame) runs out.
+# The budget starts with the first frame, so a slow camera connect does not eat into it.
+import time
+from collections import Counter, namedtuple
+from metrics import metrics
+
+# result is "known", "unknown" or "no_face"; seconds are counted from start(), i.e. the
+# trigger, and so include the time to connect to the camera
+Decision = namedtuple("Decision", ["result", "name", "frames", "seconds", "reason"])
+
+
+class DecisionEngine:
+    def __init__(self, tolerance=0.6, enabled=True, min_frames=3, distance_margin=0.05, unknown_frames=4,
+                 no_face_frames=16, max_frames=40, max_seconds=5.0):
+        self.tolerance = tolerance
+        self.enabled = enabled
+        self.min_frames = min_frames
+        self.distance_margin = distance_margin
+        self.unknown_frames = unknown_frames
+        self.no_face_frames = no_face_frames
+        self.max_frames = max_frames
+        self.max_seconds = max_seconds
+        self.start()
+
+    @classmethod
+    def from_config(cls, config):
+        """Agreement is required across recognition.min_frames frames, like the tracker's."""
+        recognition = config["recognition"]
+        options = dict(config.get("decision", {}))
+        if options.pop("min_votes", None) is not None:
+            print("⚠️ decision.min_votes is no longer used, set recognition.min_frames instead.")
+        return cls(recognition.get("tolerance", 0.6), min_frames=recognition.get("min_frames", 3), **options)
+
+    def start(self, now=None):
+        self.started = time.perf_counter() if now is None else now
+        self.first_frame = None  # when the evidence budget started
+        self.votes = Counter()  # name -> frames where it matched with confidence
+        self.weak_votes = Counter()  # name -> frames where it matched, but close to a threshold
+        self.frames = 0
+        self.face_frames = 0
+        self.unmatched_frames = 0  # frames with faces but no confident match
+        self.decision = None
+
+    def confident(self, match):
+        return (match.name is not None and self.tolerance - match.distance >= self.distance_margin
+                and match.margin >= self.distance_margin)
+
+    def update(self, matches, now=None):
+        """Add one analyzed frame's matches (empty if it had no face); returns the decision, if any."""
+        if self.decision is not None:
+            return self.decision
+        self._count_frame(now)
+        if matches:
+            self.face_frames += 1
+            strong = {m.name for m in matches if self.confident(m)}
+            self.votes.update(strong)
+            self.weak_votes.update({m.name for m in matches if m.name is not None} - strong)
+            if not strong:
+                self.unmatched_frames += 1
+        if self.enabled:
+            self._check(now)
+        return self.decision
+
+    def skip(self, now=None):
+        """A frame that was not analyzed (e.g. unchanged); it still counts against the budget."""
+        if self.decision is None:
+            self._count_frame(now)
+            if self.enabled:
+                self._check(now)
+        return self.decision
+
+    def _count_frame(self, now):
+        if self.first_frame is None:
+            self.first_frame = self._now(now)
+        self.frames += 1
+
+    def _check(self, now):
+        if self.votes:
+            name, votes = self.votes.most_common(1)[0]
+            if votes >= self.min_frames:
+                return self._decide("known", name, "votes", now)
+        if self.unmatched_frames >= self.unknown_frames and not self.votes and not self.weak_votes:
+            return self._decide("unknown", None, "unmatched frames", now)
+        if not self.face_frames and self.frames >= self.no_face_frames:
+            return self._decide("no_face", None, "no face frames", now)
+        if self.frames >= self.max_frames or self._now(now) - self.first_frame >= self.max_seconds:
+            return self.finish(now, "budget")
+
+    def finish(self, now=None, reason="end of stream"):
+        """Decide from the evidence so far, e.g. when the capture ended before the engine did."""
+        if self.decision is not None:
+            return self.decision
+        # Out of budget any match within the tolerance counts, as it did before the engine
+        combined = self.votes + self.weak_votes
+        if combined:
+            return self._decide("known", combined.most_common(1)[0][0], reason, now)
+        if self.face_frames:
+            return self._decide("unknown", None, reason, now)
+        return self._decide("no_face", None, reason, now)
+
+    def _now(self, now):
+        return time.perf_counter() if now is None else now
+
+    def _decide(self, result, name, reason, now):
+        self.decision = Decision(result, name, self.frames, self._now(now) - self.started, reason)
+        metrics.observe("time_to_decision", self.decision.seconds)
+        metrics.count("decisions", result=result)
+        return self.decision
+
+    def report(self):
+        d = self.decision
+        if d is None:
+            print(f"🧮 Decision: none yet after {self.frames} frame(s)")
+            return
+        who = f" ({d.name})" if d.name else ""
+        print(f"🧮 Decision: {d.result}{who} after {d.frames} frame(s), {d.seconds * 1000:.0f} ms ({d.reason})")
@@ -1,38 +1,38 @@
 # detect_and_handle.py
 import time
-import cv2
-import numpy as np
-import face_recognition
-import json
-import requests
 import os
-import pickle
-from datetime import datetime
-from ha_integration import notify_no_person, notify_known_person, notify_unknown_person
-from dotenv import load_dotenv
+import cv2
+import face_core
+import face_detectors
+from face_core import startup
+from ha_integration import send_to_home_assistant
+from frame_analysis import analyze_frame
+from motion_gate import MotionGate
+from decision_engine import DecisionEngine
+from clip_writer import ClipWriter
+from metrics import metrics, configure as configure_metrics, profile_until_exit
+
+# dlib's models and requests load in the background while the stream opens
+face_core.preload("face_recognition", "requests")
 
 # === Load .env ===
-load_dotenv()
-
-RTSP_URL = os.getenv("RTSP_URL")
-USERNAME = os.getenv("USERNAME")
+USERNAME, RTSP_URL = face_core.load_env()
 
 # === Load config ===
-with open("config.json") as f:
-    config = json.load(f)
+config = face_core.load_config()
+face_detectors.configure(config)
+
+DETECT_SCALE = config["recognition"].get("detect_scale", 1.0)
+POSTROLL_SEC = config["video"].get("postroll_sec", 1)
+CODEC = config["video"].get("codec", "mp4v")
+TMP_VIDEO_PATH = os.path.join(face_core.config_path(config, "unknown_face_output", USERNAME), "unknown_latest.mp4")
 
-TOLERANCE = config["recognition"].get("tolerance", 0.5)
-ENCODINGS_PATH = f"/home/{USERNAME}/face_project/encodings/faces.pkl"
-TMP_VIDEO_PATH = f"/home/{USERNAME}/ha_tmp_share/unknown_latest.mp4"
+METRICS = configure_metrics(config, USERNAME)
+profile_until_exit(METRICS, "detect_and_handle")
 
 # === Load Known Encodings ===
-if not os.path.exists(ENCODINGS_PATH):
-    known_encodings, known_names = [], []
-else:
-    with open(ENCODINGS_PATH, "rb") as f:
-        data = pickle.load(f)
-        known_encodings = data.get("encodings", [])
-        known_names = data.get("names", [])
+with metrics.stage("load_encodings"):
+    matcher = face_core.load_matcher(config)
 
 # === Open Stream ===
 print("📡 Connecting to RTSP stream...")
@@ -40,62 +40,76 @@ cap = cv2.VideoCapture(RTSP_URL)
 
 if not cap.isOpened():
     print("❌ Failed to open RTSP stream.")
-    notify_no_person("Camera connection failed")
+    send_to_home_assistant(config, "no_face")
     cap.release()
     exit(1)
 
-print("🎥 Stream opened. Capturing 3 seconds of frames...")
+# === Detect faces as frames arrive, until the decision engine is confident ===
+print("🎥 Stream opened. Analyzing frames as they arrive...")
+engine = DecisionEngine.from_config(config)
+gate = MotionGate.from_config(config)
 frames = []
-start = time.time()
 
-while time.time() - start < 3:
-    ret, frame = cap.read()
-    if ret:
+while engine.decision is None:
+    with metrics.stage("decode"):
+        ret, frame = cap.read()
+    if not ret:
+        break
+    frames.append(frame)
+    metrics.count("frames")
+    with metrics.stage("gate"):
+        changed, regions = gate.check(frame)
+    if not changed:
+        engine.skip()  # same scene as the last analyzed frame
+        continue
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    _, encodings, timings = analyze_frame(rgb, regions, DETECT_SCALE)
+    metrics.observe("locate", timings["locate"])
+    metrics.observe("encode", timings["encode"])
+    if len(frames) == 1:
+        startup.report("first frame analyzed")
+    metrics.count("faces", len(encodings))
+    with metrics.stage("match"):
+        matches = matcher.match(encodings)
+    metrics.count("matches", sum(1 for m in matches if m.name))
+    engine.update(matches)
+
+if engine.decision and engine.decision.result == "unknown":
+    # A little more video for the clip
+    postroll_end = time.time() + POSTROLL_SEC
+    while time.time() < postroll_end:
+        ret, frame = cap.read()
+        if not ret:
+            break
         frames.append(frame)
 
+# Every frame of the stream is kept, so the clip plays at the stream's own rate
+fps = cap.get(cv2.CAP_PROP_FPS) or config["video"].get("fps", 8)
 cap.release()
 
 if not frames:
     print("❌ No frames captured.")
-    notify_no_person("No frames captured")
+    send_to_home_assistant(config, "no_face")
     exit(0)
 
-# === Try to Detect Faces ===
-found_face = False
-found_known = False
-matched_name = None
-
-for frame in frames:
-    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    encodings = face_recognition.face_encodings(rgb)
-
-    if not encodings:
-        continue
-
-    found_face = True
-    for enc in encodings:
-        matches = face_recognition.compare_faces(known_encodings, enc, tolerance=TOLERANCE)
-        if True in matches:
-            found_known = True
-            matched_name = known_names[matches.index(True)]
-            break
-    if found_known:
-        break
+decision = engine.finish()
+gate.report()
+engine.report()
 
 # === Notify HA ===
-if not found_face:
+if decision.result == "no_face":
     print("📭 No human detected.")
-    notify_no_person("Motion detected but no human found")
-elif found_known:
-    print(f"✅ Known face detected: {matched_name}")
-    notify_known_person(matched_name)
+    send_to_home_assistant(config, "no_face")
+elif decision.result == "known":
+    print(f"✅ Known face detected: {decision.name}")
+    send_to_home_assistant(config, "known")
+    send_to_home_assistant(config, "setText", name=decision.name)
 else:
-    print("❓ Unknown face detected. Saving 3s video...")
-    h, w = frames[0].shape[:2]
-    out = cv2.VideoWriter(TMP_VIDEO_PATH, cv2.VideoWriter_fourcc(*"mp4v"), 10, (w, h))
-    for f in frames:
-        out.write(f)
-    out.release()
-    notify_unknown_person(TMP_VIDEO_PATH)
+    print(f"❓ Unknown face detected. Saving {len(frames) / fps:.1f}s video...")
+    clips = ClipWriter()
+    clips.submit_frames(frames, TMP_VIDEO_PATH, fps, CODEC,
+                        on_done=lambda path: send_to_home_assistant(config, "unknown", video_path=path))
+    clips.flush()
+    clips.report()
 
 print("✅ Detection flow complete.")
@@ -1,90 +1,113 @@
 import cv2
-import face_recognition
-import json
 import time
 import os
-import pickle
 from datetime import datetime
+import face_core
+import face_detectors
+from face_core import startup
 from ha_integration import send_to_home_assistant
-from dotenv import load_dotenv
+from camera_manager import CameraManager
+from frame_analysis import analyze_frame
+from motion_gate import MotionGate
+from clip_writer import ClipWriter
+from decision_engine import DecisionEngine
+from metrics import metrics, configure as configure_metrics, profile_until_exit
+
+# dlib's models and requests load in the background while the camera connects
+face_core.preload("face_recognition", "requests")
 
 # === Load .env variables ===
-load_dotenv()
-RTSP_URL = os.getenv("RTSP_URL")
-USERNAME = os.getenv("USERNAME")
+USERNAME, RTSP_URL = face_core.load_env()
 
 # === Load config ===
-with open("config.json") as f:
-    config = json.load(f)
+config = face_core.load_config()
+face_detectors.configure(config)
+
+UNKNOWN_OUTPUT_PATH = face_core.config_path(config, "unknown_face_output", USERNAME)
+FPS = config["video"].get("fps", 8)
+CODEC = config["video"].get("codec", "mp4v")
+PREROLL_SEC = config["video"].get("preroll_sec", 3)  # seconds kept in memory before the decision
+POSTROLL_SEC = config["video"].get("postroll_sec", 1)  # seconds recorded after the decision
+DETECT_SCALE = config["recognition"].get("detect_scale", 1.0)
 
-ENCODINGS_PATH = f"/home/{USERNAME}/face_project/encodings/faces.pkl"
-UNKNOWN_OUTPUT_PATH = f"/home/{USERNAME}/ha_tmp_share"
-TOLERANCE = config["recognition"].get("tolerance", 0.5)
-CAPTURE_DURATION = 3  # seconds to record for unknown
+METRICS = configure_metrics(config, USERNAME)
+profile_until_exit(METRICS, "detect_and_notify")
 
 # === Load known faces ===
-if os.path.exists(ENCODINGS_PATH):
-    with open(ENCODINGS_PATH, "rb") as f:
-        data = pickle.load(f)
-        known_encodings = data.get("encodings", [])
-        known_names = data.get("names", [])
-else:
-    known_encodings, known_names = [], []
+with metrics.stage("load_encodings"):
+    matcher = face_core.load_matcher(config)
+if not len(matcher):
     print("⚠️ No encodings found. Proceeding with empty DB.")
 
 # === Triggered by Home Assistant ===
 # print("🚨 Triggered by HA. Waiting 10s to stabilize camera...")
 # time.sleep(10)
 
-cap = cv2.VideoCapture(RTSP_URL)
-if not cap.isOpened():
-    print("❌ Could not open RTSP stream.")
-    send_to_home_assistant(config, "no_face")
-    exit(1)
+# The capture thread keeps the stream open and fills a bounded ring buffer, so an
+# unknown clip is cut from frames already in memory instead of reopening RTSP
+camera = CameraManager.from_config(config, RTSP_URL, PREROLL_SEC + POSTROLL_SEC)
 
-print("📷 Reading frame...")
-ret, frame = cap.read()
-cap.release()
+# Frames are analyzed as they arrive until the decision engine is confident, instead of
+# deciding from a single frame
+engine = DecisionEngine.from_config(config)
+gate = MotionGate.from_config(config)
+print("📷 Reading frames...")
+frames_read = 0
+for frame in camera.frames(engine.max_seconds):
+    frames_read += 1
+    metrics.count("frames")
+    changed, regions = gate.check(frame)
+    if not changed:
+        if engine.skip():  # same scene as the last analyzed frame
+            break
+        continue
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    _, encodings, timings = analyze_frame(rgb, regions, DETECT_SCALE)
+    metrics.observe("locate", timings["locate"])
+    metrics.observe("encode", timings["encode"])
+    if frames_read == 1:
+        startup.report("first frame analyzed")
+    metrics.count("faces", len(encodings))
+    with metrics.stage("match"):
+        matches = matcher.match(encodings)
+    metrics.count("matches", sum(1 for m in matches if m.name))
+    if engine.update(matches):
+        break
 
-if not ret or frame is None:
+if not frames_read:
     print("❌ Failed to read a frame.")
+    camera.stop()
     send_to_home_assistant(config, "no_face")
     exit(1)
 
-# Convert to RGB
-rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-encodings = face_recognition.face_encodings(rgb)
+decision = engine.finish()
+gate.report()
+engine.report()
 
-if not encodings:
+if decision.result == "no_face":
     print("🙈 No faces detected.")
+    camera.stop()
     send_to_home_assistant(config, "no_face")
     exit(0)
 
-# Assume one face max
-encoding = encodings[0]
-matches = face_recognition.compare_faces(known_encodings, encoding, tolerance=TOLERANCE)
-
-if True in matches:
-    matched_name = known_names[matches.index(True)]
-    print(f"✅ Known face: {matched_name}")
+if decision.result == "known":
+    print(f"✅ Known face: {decision.name}")
     send_to_home_assistant(config, "known")
 else:
-    print("❓ Unknown face detected. Recording 3 seconds from RTSP...")
-    cap = cv2.VideoCapture(RTSP_URL)
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+    print(f"❓ Unknown face detected. Saving {PREROLL_SEC}s pre-roll + {POSTROLL_SEC}s post-roll...")
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     out_path = os.path.join(UNKNOWN_OUTPUT_PATH, f"unknown_{timestamp}.mp4")
-    out = cv2.VideoWriter(out_path, fourcc, 10.0, (int(cap.get(3)), int(cap.get(4))))
 
-    start = time.time()
-    while time.time() - start < CAPTURE_DURATION:
-        ret, frame = cap.read()
-        if ret:
-            out.write(frame)
+    def clip_frames():
+        time.sleep(POSTROLL_SEC)
+        return camera.buffer.snapshot()
 
-    cap.release()
-    out.release()
-    print(f"💾 Saved unknown face video to {out_path}")
-    send_to_home_assistant(config, "unknown", video_path=out_path)
+    clips = ClipWriter()
+    clips.submit_frames(clip_frames, out_path, FPS, CODEC,
+                        on_done=lambda path: send_to_home_assistant(config, "unknown", video_path=path))
+    clips.flush()
+    clips.report()
 
+camera.stop()
+camera.buffer.report()
 print("✅ Done. Shutting down stream.")
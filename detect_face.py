@@ -1,148 +1,226 @@
 import os
-import cv2
-import json
 import time
-import pickle
-import numpy as np
-import subprocess
 from datetime import datetime
-from PIL import Image
-from dotenv import load_dotenv
+import face_core
+import face_detectors
+from face_core import lazy_import, startup
 from ha_integration import send_to_home_assistant
-import face_recognition
-import threading
-from sklearn.cluster import DBSCAN
+from frame_stream import FrameStream
+import atexit
+from frame_analysis import FrameCache, StageTimer, analyze_frame, analyze_frames, encode_frames
+from motion_gate import MotionGate
+from face_tracker import FaceTracker
+from clip_writer import ClipWriter
+from decision_engine import DecisionEngine
+from collections import defaultdict
+from metrics import metrics, configure as configure_metrics, profile_until_exit
 
 #test purposes
 #time.sleep(7) 
 
+cv2 = lazy_import("cv2")
+# dlib's models and requests load in the background while FFmpeg connects to the camera
+face_core.preload("face_recognition", "cv2", "requests")
+
 # === Load environment variables ===
-load_dotenv()
-RTSP_URL = os.getenv("RTSP_URL")
-USERNAME = os.getenv("USERNAME")
+USERNAME, RTSP_URL = face_core.load_env()
 
 # === Load configuration ===
-with open("config.json", "r") as f:
-    config = json.load(f)
+config = face_core.load_config()
+face_detectors.configure(config)
 
-ENCODINGS_PATH = os.path.expandvars(config["paths"]["encodings"].replace("ENV_HOME", f"/home/{USERNAME}"))
-UNKNOWN_OUTPUT = os.path.expandvars(config["paths"]["unknown_face_output"].replace("ENV_HOME", f"/home/{USERNAME}"))
-TOLERANCE = config["recognition"]["tolerance"]
+UNKNOWN_OUTPUT = face_core.config_path(config, "unknown_face_output", USERNAME)
 FPS = config["video"].get("fps", 8)
 CODEC = config["video"].get("codec", "mp4v")
 RESOLUTION = config["video"].get("resolution", None)
+WORKERS = config["recognition"].get("workers") or os.cpu_count()
+DETECT_SCALE = config["recognition"].get("detect_scale", 1.0)
+MIN_FRAMES = config["recognition"].get("min_frames", 3)
+TRACK_SAMPLES = config["recognition"].get("track_samples", 3)
+ENCODE_BATCH = config["recognition"].get("encode_batch", 32)
+POSTROLL_SEC = config["video"].get("postroll_sec", 1)  # kept capturing after an unknown decision
 DURATION = 10  # seconds
+# FFmpeg also stream-copies the capture here, so an unknown clip needs no re-encoding
+RECORD_PATH = f"/tmp/detect_face_{os.getpid()}.mp4" if config["video"].get("stream_copy", True) else None
+
+METRICS = configure_metrics(config, USERNAME)
+profile_until_exit(METRICS, "detect_face")
+
+timer = StageTimer()
+cache = FrameCache()
+gate = MotionGate.from_config(config)
+engine = DecisionEngine.from_config(config)
+atexit.register(timer.report)
+atexit.register(cache.report)
+atexit.register(gate.report)
+clips = ClipWriter()
+atexit.register(clips.report)
+
+
+def drop_recording():
+    # Left behind whenever no unknown clip was needed
+    if RECORD_PATH and os.path.exists(RECORD_PATH):
+        os.remove(RECORD_PATH)
+
+
+atexit.register(drop_recording)
 
 # === Load known encodings ===
-if not os.path.exists(ENCODINGS_PATH):
-    print("❌ No encodings file found. Please run add_known_face.py first.")
+matcher = face_core.load_matcher(config)
+if not len(matcher):
+    print("❌ No encodings file found. Please run manage_faces.py --add-all first.")
     exit(1)
 
-with open(ENCODINGS_PATH, "rb") as f:
-    data = pickle.load(f)
-known_encodings = data["encodings"]
-known_names = data["names"]
-
-print(f"🧠 Loaded {len(known_encodings)} known face encodings.")
+print(f"🧠 Loaded {len(matcher)} known face encodings.")
 
-# === Capture frames using FFmpeg ===
+# === Stream frames from FFmpeg and quick scan as they arrive ===
 print("🎥 Capturing stream using FFmpeg...")
-tmp_dir = "/tmp/ffmpeg_frames"
-os.makedirs(tmp_dir, exist_ok=True)
-for f in os.listdir(tmp_dir):
-    os.remove(os.path.join(tmp_dir, f))
-
-ffmpeg_cmd = [
-    "ffmpeg", "-hide_banner", "-loglevel", "error",
-    "-rtsp_transport", "tcp",
-    "-i", RTSP_URL,
-    "-t", str(DURATION),
-    "-r", str(FPS),
-    "-qscale:v", "2",
-    "-f", "image2",
-]
-if RESOLUTION:
-    ffmpeg_cmd += ["-s", RESOLUTION]
-ffmpeg_cmd += [os.path.join(tmp_dir, "frame_%03d.jpg")]
-
 try:
-    subprocess.run(ffmpeg_cmd, check=True)
-except subprocess.CalledProcessError:
-    print("❌ FFmpeg failed to capture stream.")
+    stream = FrameStream(RTSP_URL, FPS, duration=DURATION, resolution=RESOLUTION, record_path=RECORD_PATH)
+except Exception as e:
+    print(f"❌ FFmpeg failed to start: {e}")
     send_to_home_assistant(config, "no_face")
     exit(1)
 
-frame_paths = sorted([os.path.join(tmp_dir, f) for f in os.listdir(tmp_dir) if f.endswith(".jpg")])
-if not frame_paths:
-    print("❌ No frames captured.")
-    send_to_home_assistant(config, "no_face")
-    exit(0)
-
-# === First Pass: Quick Scan for any known face ===
 print("🔍 Quick scanning for known faces...")
+frames = []
+regions = {}  # frame index -> motion regions, only for frames that passed the gate
 detected_names = set()
-mid_frame_path = frame_paths[len(frame_paths) // 2]
+stop_after = None  # frame count at which capture stops after an unknown decision
 
-for idx, frame_path in enumerate(frame_paths):
+wait_start = time.perf_counter()
+for idx, frame in enumerate(stream):
+    # Time spent blocked on FFmpeg decoding the next frame
+    timer.add("decode", time.perf_counter() - wait_start)
+    frames.append(frame)
+    metrics.count("frames")
+    if stop_after is not None and len(frames) >= stop_after:
+        break
+    with timer.stage("gate"):
+        changed, regions[idx] = gate.check(frame)
+    if not changed or engine.decision:
+        if not changed:
+            del regions[idx]
+            engine.skip()
+        wait_start = time.perf_counter()
+        continue  # keep capturing for the detailed scan and clip
     try:
-        img = face_recognition.load_image_file(frame_path)
-        encs = face_recognition.face_encodings(img)
+        locations, encs, timings = analyze_frame(frame, regions[idx], DETECT_SCALE)
+        if idx == 0:
+            startup.report("first frame analyzed")
+        timer.add("locate", timings["locate"])
+        timer.add("encode", timings["encode"])
 #        print(f"📸 Frame {idx}: {len(encs)} face(s) found")
-        for encoding in encs:
-            matches = face_recognition.compare_faces(known_encodings, encoding, tolerance=TOLERANCE)
-            for i, match in enumerate(matches):
-                if match:
-                    detected_names.add(known_names[i])
-        if detected_names:
+        with timer.stage("match"):
+            matches = matcher.match(encs)
+        names = [m.name for m in matches]
+        metrics.count("faces", len(encs))
+        metrics.count("matches", sum(1 for name in names if name))
+        cache.put(idx, locations, encs, names)
+        engine.update(matches)
+    except Exception as e:
+        print(f"⚠️ Failed analyzing frame {idx}: {e}")
+    if engine.decision:
+        engine.report()
+        if engine.decision.result == "known":
+            detected_names.add(engine.decision.name)
             print(f"✅ Early known face(s) found: {detected_names}")
+            # Notify while the rest of the clip is still being captured
+            print(f"📩 Updating input_boolean.known_face_detected (fast path)...")
+            send_to_home_assistant(config, "known")
+        elif engine.decision.result == "unknown":
+            # A little more video for the clip, then stop capturing
+            stop_after = len(frames) + int(POSTROLL_SEC * FPS)
+        else:
             break
-    except Exception as e:
-        print(f"⚠️ Failed reading {frame_path}: {e}")
+    wait_start = time.perf_counter()
+# Stop FFmpeg cleanly, so the stream-copy recording is finalized even after an early decision
+stream.stop()
 
-# === Respond immediately if known face is found ===
-if detected_names:
-    print(f"📩 Updating input_boolean.known_face_detected (fast path)...")
-    send_to_home_assistant(config, "known")
+if stream.failed:
+    print("❌ FFmpeg failed to capture stream.")
+    send_to_home_assistant(config, "no_face")
+    exit(1)
+
+if not frames:
+    print("❌ No frames captured.")
+    send_to_home_assistant(config, "no_face")
+    exit(0)
+
+mid_frame = frames[len(frames) // 2]
+if not engine.decision:
+    # The capture ended before the engine was confident either way
+    engine.finish()
+    engine.report()
+    if engine.decision.result == "known":
+        detected_names.add(engine.decision.name)
+        send_to_home_assistant(config, "known")
 
+# === Known face already reported, work out who was there ===
+if detected_names:
     def analyze_all():
         print("🔎 Detailed scan for input_text.last_known_person...")
-        all_encodings = []
-        name_labels = []
-
-        for path in frame_paths:
-            try:
-                img = face_recognition.load_image_file(path)
-                encs = face_recognition.face_encodings(img)
-                for encoding in encs:
-                    matches = face_recognition.compare_faces(known_encodings, encoding, tolerance=TOLERANCE)
-                    matched_names = [known_names[i] for i, match in enumerate(matches) if match]
-                    if matched_names:
-                        all_encodings.append(encoding)
-                        name_labels.append(matched_names[0])
-                    else:
-                        all_encodings.append(encoding)
-                        name_labels.append(None)
-            except Exception as e:
-                print(f"⚠️ Error in detailed analysis frame: {e}")
-
-        if not all_encodings:
+        # Locate faces in changed frames the quick scan never reached, spread over a
+        # bounded process pool (dlib holds the GIL, so threads would not help).
+        # Nothing is encoded yet: that happens per track below.
+        missing = [idx for idx in regions if idx not in cache]
+        located = {}
+        with timer.stage("detailed_scan"):
+            for pos, locations, _, timings in analyze_frames((frames[i] for i in missing), WORKERS,
+                                                             regions=(regions[i] for i in missing),
+                                                             scale=DETECT_SCALE, encode=False):
+                idx = missing[pos]
+                if "error" in timings:
+                    print(f"⚠️ Error in detailed analysis frame {idx}: {timings['error']}")
+                    continue
+                timer.add("locate", timings["locate"])
+                located[idx] = locations
+
+        # Follow faces across frames; frames skipped as unchanged extend the current tracks
+        tracker = FaceTracker(max_samples=TRACK_SAMPLES, min_frames=MIN_FRAMES)
+        with timer.stage("track"):
+            for idx in range(len(frames)):
+                cached = cache.get(idx)
+                if cached is not None:
+                    tracker.update(idx, frames[idx], cached.locations, cached.encodings, cached.names)
+                elif idx in located:
+                    tracker.update(idx, frames[idx], located[idx])
+                elif idx not in regions:
+                    tracker.carry(idx)
+
+        # Encode only the best few samples of each track, grouped per frame
+        by_frame = defaultdict(list)
+        for track, frame_idx, box in tracker.samples_to_encode():
+            by_frame[frame_idx].append((track, box))
+        order = sorted(by_frame)
+        sampled = []
+        # Chips from many frames share one embedding batch, spread evenly over the workers
+        samples = sum(len(by_frame[i]) for i in order)
+        batch_size = max(1, min(ENCODE_BATCH, -(-samples // WORKERS)))
+        with timer.stage("sample_encode"):
+            for pos, _, encs, timings in encode_frames(((frames[i], [box for _, box in by_frame[i]]) for i in order),
+                                                       WORKERS, batch_size=batch_size):
+                if "error" in timings:
+                    print(f"⚠️ Error encoding samples of frame {order[pos]}: {timings['error']}")
+                    continue
+                timer.add("encode", timings["encode"])
+                sampled.extend(zip((track for track, _ in by_frame[order[pos]]), encs))
+
+        with timer.stage("match"):
+            sample_names = matcher.names([enc for _, enc in sampled])
+        for (track, encoding), name in zip(sampled, sample_names):
+            tracker.add_sample(track, encoding, name)
+
+        located_faces = sum(len(locations) for locations in located.values())
+        print(f"🧭 {len(tracker.tracks)} track(s) over {len(frames)} frames: encoded {len(sampled)} "
+              f"sample(s) instead of {located_faces} located face(s)")
+
+        with timer.stage("cluster"):
+            known_clusters, unknown_clusters = tracker.people()
+        if not known_clusters and not unknown_clusters:
             send_to_home_assistant(config, "no_face")
             return
 
-        # Cluster to remove duplicate faces of same person across frames
-        clustering = DBSCAN(eps=0.6, min_samples=1, metric="euclidean").fit(all_encodings)
-        unique_labels = set(clustering.labels_)
-        known_clusters = set()
-        unknown_clusters = 0
-
-        for cluster_id in unique_labels:
-            indices = [i for i, label in enumerate(clustering.labels_) if label == cluster_id]
-            names_in_cluster = [name_labels[i] for i in indices if name_labels[i] is not None]
-            if names_in_cluster:
-                known_clusters.update(names_in_cluster)
-            else:
-                unknown_clusters += 1
-
         # Compose label
         sorted_names = sorted(known_clusters)
         if len(sorted_names) == 1:
@@ -163,46 +241,34 @@ if detected_names:
         print(f"📝 Sending label to HA: {label}")
         send_to_home_assistant(config, "setText", name=label)
 
-    t = threading.Thread(target=analyze_all)
-    t.start()
-    t.join()
+    analyze_all()
     exit(0)
 
 # === If no known face, check if any face at all ===
-img = face_recognition.load_image_file(mid_frame_path)
-encs = face_recognition.face_encodings(img)
-if not encs:
-    cv2.imwrite("/tmp/debug_frame.jpg", cv2.imread(mid_frame_path))
+if engine.decision.result == "no_face":
+    cv2.imwrite("/tmp/debug_frame.jpg", cv2.cvtColor(mid_frame, cv2.COLOR_RGB2BGR))
     print("🖼️ Saved debug frame: /tmp/debug_frame.jpg")
     print("❌ No faces found in frames.")
     send_to_home_assistant(config, "no_face")
     exit(0)
 
 # === All are unknown, save video ===
+# The clip is finished on a background thread and renamed into place; HA gets the
+# file name only after that, since its automation sends the video straight away.
 print("❓ Unknown face(s) detected. Saving video snippet...")
+decided = time.perf_counter()
 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 filename = f"unknown_{timestamp}.mp4"
 out_path = os.path.join(UNKNOWN_OUTPUT, filename)
 
-frame = cv2.imread(frame_paths[0])
-height, width = frame.shape[:2]
-fourcc = cv2.VideoWriter_fourcc(*CODEC)
-out = cv2.VideoWriter(out_path, fourcc, FPS, (width, height))
-for p in frame_paths:
-    f = cv2.imread(p)
-    if f is not None:
-        out.write(f)
-out.release()
-
-print(f"💾 Saved unknown face clip to: {out_path}")
-
-for i in range(5):
-    if os.path.exists(out_path):
-        print("✅ Confirmed video file exists.")
-        break
-    print(f"⏳ Waiting for file to appear ({i+1}/5)...")
-    time.sleep(1)
-else:
-    print(f"❌ File did not appear: {out_path}")
 
-send_to_home_assistant(config, "unknown", video_path=out_path)
+def notify_unknown(path):
+    timer.add("decision_to_notify", time.perf_counter() - decided)
+    send_to_home_assistant(config, "unknown", video_path=path)
+
+
+if stream.recorded:
+    clips.submit_recording(RECORD_PATH, out_path, on_done=notify_unknown)
+else:
+    clips.submit_frames(frames, out_path, FPS, CODEC, rgb=True, on_done=notify_unknown)
+clips.flush()
@@ -0,0 +1,169 @@
+# Start-up plumbing shared by the detector scripts.
+# One place for .env and config.json loading, ENV_HOME path expansion and loading the
+# encodings store, each parsed once per process. Heavy libraries (face_recognition/dlib,
+# cv2, requests) are imported lazily, or preloaded on a background thread while the
+# script is busy opening the camera, and a start-up report shows where the time went.
+import os
+import sys
+import json
+import time
+import importlib
+import threading
+
+STARTED = time.perf_counter()
+
+
+class StartupReport:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.steps = []  # (name, seconds, where)
+
+    def add(self, name, seconds, where="main"):
+        with self.lock:
+            self.steps.append((name, seconds, where))
+
+    def report(self, label="ready"):
+        """Print the time since this module was imported and the slowest start-up steps."""
+        elapsed = time.perf_counter() - STARTED
+        with self.lock:
+            steps = sorted(self.steps, key=lambda step: step[1], reverse=True)
+        details = ", ".join(f"{name} {seconds * 1000:.0f} ms" + (" (background)" if where != "main" else "")
+                            for name, seconds, where in steps[:6])
+        print(f"🚀 Startup: {label} after {elapsed * 1000:.0f} ms" + (f" ({details})" if details else ""))
+        try:
+            from metrics import metrics
+            metrics.observe("startup", elapsed)
+        except ImportError:
+            pass
+        return elapsed
+
+
+startup = StartupReport()
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    already = self._name in sys.modules
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    if not already:
+                        where = "main" if threading.current_thread() is threading.main_thread() else "background"
+                        startup.add(f"import {self._name}", time.perf_counter() - start, where)
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+_lazy_modules = {}
+
+
+def lazy_import(name):
+    if name not in _lazy_modules:
+        _lazy_modules[name] = LazyModule(name)
+    return _lazy_modules[name]
+
+
+def load_now(*names):
+    for name in names:
+        lazy_import(name)._load()
+
+
+def preload(*names):
+    """Import modules on a daemon thread, e.g. dlib's models while FFmpeg connects to RTSP."""
+    def run():
+        for name in names:
+            try:
+                lazy_import(name)._load()
+            except ImportError as e:
+                print(f"⚠️ Could not preload {name}: {e}")
+    thread = threading.Thread(target=run, name="preload", daemon=True)
+    thread.start()
+    return thread
+
+
+# === .env and config.json, parsed once per process ===
+_env = None
+_configs = {}
+
+
+def load_env():
+    """(USERNAME, RTSP_URL) from the environment after reading .env."""
+    global _env
+    if _env is None:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env = (os.getenv("USERNAME"), os.getenv("RTSP_URL"))
+    return _env
+
+
+def load_config(path="config.json"):
+    """Parsed config.json, re-read only when the file changes."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _configs:
+        start = time.perf_counter()
+        with open(path) as f:
+            _configs[key] = json.load(f)
+        startup.add("config", time.perf_counter() - start)
+    return _configs[key]
+
+
+def resolve_value(value, username):
+    """Expand the ENV_HOME / ENV_<VAR> placeholders used in config.json."""
+    if not isinstance(value, str):
+        return value
+    if value.startswith("ENV_HOME"):
+        return os.path.expandvars(value.replace("ENV_HOME", f"/home/{username}"))
+    if value.startswith("ENV_"):
+        return os.getenv(value[4:])
+    return value
+
+
+def config_path(config, key, username=None):
+    """A resolved entry of config["paths"], e.g. config_path(config, "encodings")."""
+    return resolve_value(config["paths"][key], username or load_env()[0])
+
+
+# === Encodings ===
+_matchers = {}
+
+
+def load_matcher(config, path=None):
+    """Matcher over the encodings store, reused until faces.bin changes on disk."""
+    import face_store
+    from face_index import index_path
+    from face_prototypes import prototypes_path
+    from face_matcher import load_matcher as load_store_matcher
+
+    path = face_store.store_path(path or config_path(config, "encodings"))
+    # The index and prototypes are rebuilt on their own (--reindex, --compact)
+    key = [path]
+    for file_path in (path, index_path(path), prototypes_path(path)):
+        try:
+            stat = os.stat(file_path)
+            key.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            key.append(None)
+    key = tuple(key)
+    if key not in _matchers:
+        start = time.perf_counter()
+        _matchers.clear()
+        _matchers[key] = load_store_matcher(path, config)
+        startup.add("encodings", time.perf_counter() - start)
+    return _matchers[key]
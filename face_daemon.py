@@ -0,0 +1,375 @@
+# Resident detection service.
+# Keeps face_recognition/dlib, the encodings DB and a warm RTSP connection per camera
+# loaded so a Home Assistant trigger only pays for the analysis itself. All cameras
+# share one fixed-size recognition process pool.
+#
+#   python face_daemon.py                      # HTTP on daemon.host:daemon.port
+#   python face_daemon.py --socket /tmp/face.sock
+#
+#   curl -X POST http://127.0.0.1:8765/detect
+#   curl -X POST http://127.0.0.1:8765/detect/garage   # a camera from config["cameras"]
+#   curl --unix-socket /tmp/face.sock -X POST http://localhost/detect
+#   curl -X POST "http://127.0.0.1:8765/detect?profile=cprofile"   # or profile=sample
+#   curl http://127.0.0.1:8765/metrics                 # Prometheus text; /metrics.json for HA
+import os
+import cv2
+import json
+import time
+import argparse
+import threading
+import socketserver
+from collections import defaultdict, deque
+from datetime import datetime
+from urllib.parse import parse_qs, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import face_core
+import face_detectors
+from face_core import resolve_value, startup
+from ha_integration import send_to_home_assistant
+from frame_analysis import analyze_frame, encode_faces
+from face_tracker import FaceTracker
+from motion_gate import MotionGate
+from decision_engine import DecisionEngine
+from camera_manager import CameraManager, load_cameras
+from recognition_pool import RecognitionPool
+from clip_writer import ClipWriter
+from metrics import metrics, configure as configure_metrics, profiled, rss_bytes
+
+# === Load environment variables ===
+USERNAME, _ = face_core.load_env()
+
+# === Load configuration ===
+config = face_core.load_config()
+# Before the recognition pool forks, so its workers use the same backend
+face_detectors.configure(config)
+
+DETECT_SCALE = config["recognition"].get("detect_scale", 1.0)
+MIN_FRAMES = config["recognition"].get("min_frames", 3)
+TRACK_SAMPLES = config["recognition"].get("track_samples", 3)
+FPS = config["video"].get("fps", 8)
+CODEC = config["video"].get("codec", "mp4v")
+DAEMON = config.get("daemon", {})
+CAPTURE_SEC = DAEMON.get("capture_sec", 3)
+FRAMES_IN_FLIGHT = DAEMON.get("frames_in_flight", 4)
+WORKERS = config["recognition"].get("workers") or os.cpu_count()
+PREROLL_SEC = config["video"].get("preroll_sec", 3)
+POSTROLL_SEC = config["video"].get("postroll_sec", 1)
+BUFFER_SEC = config["video"].get("buffer_sec", 10)
+METRICS = configure_metrics(config, USERNAME, "face_daemon", summary=False)
+
+
+def load_matcher():
+    # Cached: /reload only re-reads faces.bin when it changed on disk
+    matcher = face_core.load_matcher(config)
+    if not len(matcher):
+        print("⚠️ No encodings found. Proceeding with empty DB.")
+    return matcher
+
+
+def compose_label(names, unknown_clusters):
+    sorted_names = sorted(names)
+    if len(sorted_names) == 1:
+        label = sorted_names[0]
+    elif len(sorted_names) == 2:
+        label = f"{sorted_names[0]} and {sorted_names[1]}"
+    elif len(sorted_names) > 2:
+        label = ", ".join(sorted_names[:-1]) + f" and {sorted_names[-1]}"
+    else:
+        label = ""
+
+    if unknown_clusters:
+        if label:
+            label += f" and {unknown_clusters} unknown person{'s' if unknown_clusters > 1 else ''}"
+        else:
+            label = f"{unknown_clusters} unknown person{'s' if unknown_clusters > 1 else ''}"
+    return label
+
+
+class Detector:
+    """Detection for one camera; frames are analyzed on the shared RecognitionPool."""
+
+    def __init__(self, name, camera, camera_config, pool, matcher, clip_prefix="unknown"):
+        self.name = name
+        self.clip_prefix = clip_prefix
+        self.camera = camera
+        self.config = camera_config
+        self.pool = pool
+        self.matcher = matcher
+        self.unknown_output = resolve_value(camera_config["paths"]["unknown_face_output"], USERNAME)
+        self.clips = ClipWriter()
+        self.lock = threading.Lock()
+
+    def detect(self):
+        config = self.config
+        matcher = self.matcher
+        triggered = time.time()
+        engine = DecisionEngine.from_config(config)
+        gate = MotionGate.from_config(config)
+        tracker = FaceTracker(max_samples=TRACK_SAMPLES, min_frames=MIN_FRAMES)
+        frames = []
+        first_frame = None
+        notified_known = False
+        # (frame index, rgb, encoded, future) in frame order; no future for unchanged frames
+        window = deque()
+
+        def consume():
+            idx, rgb, encoded, future = window.popleft()
+            if future is None:
+                tracker.carry(idx)
+                engine.skip()
+                return
+            try:
+                locations, encodings, timings = future.result()
+            except Exception as e:
+                print(f"⚠️ [{self.name}] Failed analyzing frame {idx}: {e}")
+                return
+            metrics.observe("locate", timings["locate"])
+            if not encoded:
+                tracker.update(idx, rgb, locations)
+                return
+            metrics.observe("encode", timings["encode"])
+            with metrics.stage("match"):
+                matches = matcher.match(encodings)
+            names = [m.name for m in matches]
+            tracker.update(idx, rgb, locations, encodings, names)
+            metrics.count("faces", len(encodings), camera=self.name)
+            metrics.count("matches", sum(1 for name in names if name), camera=self.name)
+            engine.update(matches)
+
+        def notify_known():
+            # As soon as the engine decides; the rest of the capture only works out the label
+            nonlocal notified_known
+            if not notified_known and engine.decision and engine.decision.result == "known":
+                print(f"✅ [{self.name}] Known face found: {engine.decision.name}")
+                send_to_home_assistant(config, "known")
+                notified_known = True
+
+        def done():
+            # Unknown and no-face are final; after a known face keep tracking for the label
+            # until daemon.capture_sec after the first frame
+            if engine.decision is None:
+                return False
+            return engine.decision.result != "known" or time.time() - first_frame >= CAPTURE_SEC
+
+        # Frames are analyzed as they arrive until the decision engine is confident
+        for idx, frame in enumerate(self.camera.frames(max(engine.max_seconds, CAPTURE_SEC))):
+            if first_frame is None:
+                first_frame = time.time()
+            frames.append(frame)
+            changed, regions = gate.check(frame)
+            if not changed:
+                window.append((idx, None, False, None))
+            else:
+                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                # Until the decision every face is encoded; after a known decision faces
+                # are only located and tracked, and a few samples per track are encoded
+                encode = engine.decision is None
+                future = self.pool.submit(self.name, analyze_frame, rgb, regions, DETECT_SCALE, encode)
+                window.append((idx, rgb, encode, future))
+            # Keep a few frames queued so this camera has work ready whenever the pool serves it
+            while len(window) > FRAMES_IN_FLIGHT:
+                consume()
+            notify_known()
+            if done():
+                break
+        while window:
+            consume()
+        metrics.count("frames", len(frames), camera=self.name)
+        if not frames:
+            print(f"❌ [{self.name}] No frames captured.")
+            send_to_home_assistant(config, "no_face")
+            return {"result": "no_face", "frames": 0}
+
+        decision = engine.finish()
+        notify_known()
+        engine.report()
+        gate.report()
+        if decision.result == "no_face":
+            print(f"❌ [{self.name}] No faces found in frames.")
+            send_to_home_assistant(config, "no_face")
+            return {"result": "no_face", "frames": len(frames)}
+
+        if decision.result == "known":
+            by_frame = defaultdict(list)
+            for track, frame_idx, box in tracker.samples_to_encode():
+                by_frame[frame_idx].append((track, box))
+            jobs = []
+            for frame_idx, samples in by_frame.items():
+                rgb = cv2.cvtColor(frames[frame_idx], cv2.COLOR_BGR2RGB)
+                jobs.append((samples, self.pool.submit(self.name, encode_faces, rgb, [box for _, box in samples])))
+            for samples, future in jobs:
+                try:
+                    _, encodings, timings = future.result()
+                except Exception as e:
+                    print(f"⚠️ [{self.name}] Failed encoding samples: {e}")
+                    continue
+                metrics.observe("sample_encode", timings["encode"])
+                with metrics.stage("match"):
+                    names = matcher.names(encodings)
+                for (track, _), encoding, name in zip(samples, encodings, names):
+                    tracker.add_sample(track, encoding, name)
+
+            with metrics.stage("cluster"):
+                known_clusters, unknown_clusters = tracker.people()
+            label = compose_label(known_clusters, unknown_clusters)
+            print(f"📝 [{self.name}] Sending label to HA: {label}")
+            send_to_home_assistant(config, "setText", name=label)
+            return {"result": "known", "label": label, "frames": len(frames)}
+
+        print(f"❓ [{self.name}] Unknown face(s) detected. Saving video snippet...")
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        out_path = os.path.join(self.unknown_output, f"{self.clip_prefix}_{timestamp}.mp4")
+
+        def clip_frames():
+            # Pre-roll from before the trigger and post-roll after the decision come from
+            # the ring buffer; fall back to the analyzed frames if it already wrapped
+            time.sleep(POSTROLL_SEC)
+            return self.camera.buffer.snapshot(since=triggered - PREROLL_SEC) or frames
+
+        # Written in the background; HA gets the file name once it is in place
+        self.clips.submit_frames(clip_frames, out_path, FPS, CODEC,
+                                 on_done=lambda path: send_to_home_assistant(config, "unknown", video_path=path))
+        return {"result": "unknown", "video": out_path, "frames": len(frames)}
+
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    detectors = {}  # camera name -> Detector, in config order
+    pool = None
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _reply_text(self, status, text, content_type="text/plain; version=0.0.4"):
+        data = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._reply_text(200, metrics.prometheus())
+        elif self.path == "/metrics.json":
+            self._reply(200, metrics.snapshot())
+        elif self.path == "/health":
+            cameras = {name: {"healthy": d.camera.healthy(), **d.camera.metrics()}
+                       for name, d in self.detectors.items()}
+            healthy = all(camera["healthy"] for camera in cameras.values())
+            self._reply(200 if healthy else 503, {
+                "cameras": cameras,
+                "pool": self.pool.stats(),
+                "known_encodings": len(next(iter(self.detectors.values())).matcher),
+            })
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path == "/detect" or url.path.startswith("/detect/"):
+            # POST /detect uses the first configured camera, POST /detect/<name> a specific one
+            name = url.path[len("/detect/"):] or next(iter(self.detectors))
+            detector = self.detectors.get(name)
+            if detector is None:
+                self._reply(404, {"error": f"unknown camera {name}"})
+                return
+            if not detector.lock.acquire(blocking=False):
+                self._reply(409, {"error": "detection already running"})
+                return
+            # ?profile=cprofile|sample profiles just this run (the pool's worker processes excluded)
+            profile = parse_qs(url.query).get("profile", [METRICS.get("profile")])[0]
+            try:
+                start = time.time()
+                print(f"🚨 [{name}] Detection triggered.")
+                with profiled(profile, METRICS.get("profile_dir", "/tmp"), f"detect_{name}",
+                              METRICS.get("sample_interval_ms", 5)):
+                    result = detector.detect()
+                elapsed = time.time() - start
+                metrics.observe("detection", elapsed)
+                metrics.count("detections", camera=name, result=result["result"])
+                result["camera"] = name
+                result["elapsed_ms"] = round(elapsed * 1000, 1)
+                metrics.event("detection", **result, rss_mb=round(rss_bytes() / 1e6, 1))
+                self._reply(200, result)
+            finally:
+                detector.lock.release()
+        elif url.path == "/reload":
+            matcher = load_matcher()
+            for detector in self.detectors.values():
+                detector.matcher = matcher
+            print(f"🔄 Reloaded {len(matcher)} known face encodings.")
+            self._reply(200, {"known_encodings": len(matcher)})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def address_string(self):
+        # Unix-socket clients have no (host, port) address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resident face detection service")
+    parser.add_argument("--host", default=DAEMON.get("host", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=DAEMON.get("port", 8765))
+    parser.add_argument("--socket", default=DAEMON.get("socket"), help="Listen on a Unix socket instead of TCP")
+    args = parser.parse_args()
+
+    # One capture session per camera, one recognition pool for all of them.
+    # dlib is loaded before the pool forks, so the workers inherit its models
+    face_core.load_now("face_recognition", "requests")
+    pool = RecognitionPool(WORKERS)
+    matcher = load_matcher()
+    print(f"🧠 Loaded {len(matcher)} known face encodings.")
+    DaemonHandler.pool = pool
+    cameras = load_cameras(config)
+    for name, url, camera_config in cameras:
+        camera = CameraManager.from_config(camera_config, url, BUFFER_SEC, name=name)
+        # Clip names only need the camera when several cameras may share an output folder
+        prefix = "unknown" if len(cameras) == 1 else f"unknown_{name}"
+        DaemonHandler.detectors[name] = Detector(name, camera, camera_config, pool, matcher, prefix)
+    print(f"📷 Cameras: {', '.join(DaemonHandler.detectors)} sharing {pool.workers} recognition worker(s)")
+    startup.report()
+
+    def daemon_gauges():
+        gauges = [("known_encodings", {}, len(next(iter(DaemonHandler.detectors.values())).matcher))]
+        for name, detector in DaemonHandler.detectors.items():
+            for key, value in detector.camera.metrics().items():
+                if isinstance(value, (bool, int, float)):
+                    gauges.append((f"camera_{key}", {"camera": name}, float(value)))
+        for name, stats in pool.stats().items():
+            for key, value in stats.items():
+                gauges.append((f"pool_{key}", {"camera": name}, value))
+        return gauges
+
+    metrics.add_gauges(daemon_gauges)
+    metrics.event("startup", cameras=list(DaemonHandler.detectors), workers=pool.workers,
+                  known_encodings=len(matcher))
+
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = ThreadingUnixHTTPServer(args.socket, DaemonHandler)
+        print(f"🚀 Face daemon listening on unix:{args.socket}")
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), DaemonHandler)
+        print(f"🚀 Face daemon listening on http://{args.host}:{args.port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("👋 Shutting down.")
+    finally:
+        for detector in DaemonHandler.detectors.values():
+            detector.camera.stop()
+            detector.clips.flush()
+        pool.shutdown()
+        server.server_close()
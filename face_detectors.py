@@ -0,0 +1,249 @@
+# Face detector backends behind one interface, selected by detector.backend in config.json.
+# Every backend takes RGB images and returns (top, right, bottom, left) boxes, like
+# face_recognition.face_locations, so encoding and tracking do not care which one ran.
+#
+#   hog    dlib HOG, face_recognition's default; no model file, frontal faces only
+#   cnn    dlib CNN (mmod); copes with pose and blur, slow without CUDA; batched
+#   ssd    OpenCV DNN ResNet-10 SSD; fast on CPU, better with side profiles; batched
+#   yunet  OpenCV FaceDetectorYN; the fastest on CPU, tiny model
+#   haar   OpenCV Haar cascade; very cheap but misses a lot, mostly useful as detector.prefilter
+#
+# With a prefilter the main backend only runs on images where the prefilter found a face.
+import os
+from face_core import lazy_import, resolve_value, load_env, load_config
+
+cv2 = lazy_import("cv2")
+face_recognition = lazy_import("face_recognition")
+
+BACKENDS = ("hog", "cnn", "ssd", "yunet", "haar")
+# Default model files, looked up in detector.models_dir (see the README for downloads)
+MODEL_FILES = {
+    "ssd_model": "res10_300x300_ssd_iter_140000.caffemodel",
+    "ssd_config": "deploy.prototxt",
+    "yunet_model": "face_detection_yunet_2023mar.onnx",
+    "haar_cascade": "haarcascade_frontalface_default.xml",
+}
+
+
+def clip_box(top, right, bottom, left, height, width):
+    return max(0, int(top)), min(width, int(right)), min(height, int(bottom)), max(0, int(left))
+
+
+class Detector:
+    name = None
+    batched = False
+
+    def detect(self, image):
+        return self.detect_batch([image])[0]
+
+    def detect_batch(self, images):
+        return [self.detect(image) for image in images]
+
+
+class HogDetector(Detector):
+    name = "hog"
+
+    def __init__(self, upsample=1):
+        self.upsample = upsample
+
+    def detect(self, image):
+        return face_recognition.face_locations(image, number_of_times_to_upsample=self.upsample, model="hog")
+
+
+class CnnDetector(Detector):
+    name = "cnn"
+    batched = True
+
+    def __init__(self, upsample=1, batch_size=8):
+        self.upsample = upsample
+        self.batch_size = batch_size
+
+    def detect(self, image):
+        return face_recognition.face_locations(image, number_of_times_to_upsample=self.upsample, model="cnn")
+
+    def detect_batch(self, images):
+        # dlib only batches images of the same size
+        results = [None] * len(images)
+        by_shape = {}
+        for i, image in enumerate(images):
+            by_shape.setdefault(image.shape, []).append(i)
+        for indices in by_shape.values():
+            if len(indices) == 1:
+                results[indices[0]] = self.detect(images[indices[0]])
+                continue
+            found = face_recognition.batch_face_locations([images[i] for i in indices], self.upsample,
+                                                          batch_size=self.batch_size)
+            for i, locations in zip(indices, found):
+                results[i] = locations
+        return results
+
+
+class SsdDetector(Detector):
+    """The ResNet-10 SSD from OpenCV's face_detector sample (Caffe, 300x300 input)."""
+
+    name = "ssd"
+    batched = True
+
+    def __init__(self, model, config, confidence=0.6, input_size=300, batch_size=8):
+        self.model = model
+        self.config = config
+        self.confidence = confidence
+        self.input_size = input_size
+        self.batch_size = batch_size
+        self.net = None
+
+    def detect_batch(self, images):
+        if self.net is None:
+            self.net = cv2.dnn.readNet(self.model, self.config)
+        results = []
+        for start in range(0, len(images), self.batch_size):
+            chunk = images[start:start + self.batch_size]
+            # Trained on BGR with these channel means
+            blob = cv2.dnn.blobFromImages(chunk, 1.0, (self.input_size, self.input_size), (104.0, 177.0, 123.0),
+                                          swapRB=True, crop=False)
+            self.net.setInput(blob)
+            # (1, 1, N, 7) rows of [image, class, confidence, x1, y1, x2, y2], coordinates 0..1
+            detections = self.net.forward().reshape(-1, 7)
+            boxes = [[] for _ in chunk]
+            for image_id, _, confidence, x1, y1, x2, y2 in detections:
+                if confidence < self.confidence or not 0 <= int(image_id) < len(chunk):
+                    continue
+                height, width = chunk[int(image_id)].shape[:2]
+                box = clip_box(y1 * height, x2 * width, y2 * height, x1 * width, height, width)
+                if box[2] > box[0] and box[1] > box[3]:
+                    boxes[int(image_id)].append(box)
+            results.extend(boxes)
+        return results
+
+
+class YunetDetector(Detector):
+    name = "yunet"
+
+    def __init__(self, model, confidence=0.6, nms_threshold=0.3, top_k=50):
+        self.model = model
+        self.confidence = confidence
+        self.nms_threshold = nms_threshold
+        self.top_k = top_k
+        self.net = None
+
+    def detect(self, image):
+        height, width = image.shape[:2]
+        if self.net is None:
+            self.net = cv2.FaceDetectorYN.create(self.model, "", (width, height), self.confidence,
+                                                 self.nms_threshold, self.top_k)
+        self.net.setInputSize((width, height))
+        _, faces = self.net.detect(cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+        if faces is None:
+            return []
+        # Rows of [x, y, w, h, 5 landmark points, score]
+        return [clip_box(y, x + w, y + h, x, height, width) for x, y, w, h in faces[:, :4]]
+
+
+class HaarDetector(Detector):
+    name = "haar"
+
+    def __init__(self, cascade, scale_factor=1.1, min_neighbors=5, min_size=40):
+        if not hasattr(cv2, "CascadeClassifier"):
+            raise RuntimeError("this OpenCV build has no Haar cascades (cv2.CascadeClassifier)")
+        self.classifier = cv2.CascadeClassifier(cascade)
+        if self.classifier.empty():
+            raise RuntimeError(f"could not load Haar cascade {cascade}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def detect(self, image):
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if image.ndim == 3 else image
+        faces = self.classifier.detectMultiScale(gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                                                 minSize=(self.min_size, self.min_size))
+        return [(int(y), int(x + w), int(y + h), int(x)) for x, y, w, h in faces]
+
+
+class PrefilteredDetector(Detector):
+    """Runs `detector` only on the images where the cheap `prefilter` found a face."""
+
+    def __init__(self, prefilter, detector):
+        self.prefilter = prefilter
+        self.detector = detector
+        self.name = f"{prefilter.name}+{detector.name}"
+        self.batched = detector.batched
+        self.skipped = 0
+
+    def detect_batch(self, images):
+        candidates = [i for i, found in enumerate(self.prefilter.detect_batch(images)) if found]
+        self.skipped += len(images) - len(candidates)
+        results = [[] for _ in images]
+        if candidates:
+            for i, locations in zip(candidates, self.detector.detect_batch([images[i] for i in candidates])):
+                results[i] = locations
+        return results
+
+
+def model_path(options, key):
+    name = options.get(key) or MODEL_FILES[key]
+    if os.path.isabs(name):
+        return name
+    models_dir = resolve_value(options.get("models_dir", "ENV_HOME/face_project/models"), load_env()[0])
+    path = os.path.join(models_dir or "", name)
+    # opencv-python ships the Haar cascades itself
+    if key == "haar_cascade" and not os.path.exists(path) and hasattr(cv2, "data"):
+        return os.path.join(cv2.data.haarcascades, name)
+    return path
+
+
+def create_backend(backend, options):
+    upsample = options.get("upsample", 1)
+    batch_size = options.get("batch_size", 8)
+    confidence = options.get("confidence", 0.6)
+    if backend == "hog":
+        return HogDetector(upsample)
+    if backend == "cnn":
+        return CnnDetector(upsample, batch_size)
+    if backend in ("ssd", "yunet"):
+        model = model_path(options, f"{backend}_model")
+        if not os.path.exists(model):
+            raise FileNotFoundError(f"{backend} model not found: {model}")
+        if backend == "yunet":
+            return YunetDetector(model, confidence)
+        return SsdDetector(model, model_path(options, "ssd_config"), confidence, batch_size=batch_size)
+    if backend == "haar":
+        return HaarDetector(model_path(options, "haar_cascade"), min_size=options.get("haar_min_size", 40))
+    raise ValueError(f"unknown detector backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+
+
+def create_detector(config, backend=None, prefilter=None):
+    """Detector for config["detector"]; `backend`/`prefilter` override the configured ones."""
+    options = config.get("detector", {})
+    backend = backend or options.get("backend", "hog")
+    prefilter = options.get("prefilter") if prefilter is None else prefilter
+    detector = create_backend(backend, options)
+    if prefilter and prefilter != backend:
+        detector = PrefilteredDetector(create_backend(prefilter, options), detector)
+    return detector
+
+
+_detector = None
+
+
+def create_or_fallback(config):
+    """create_detector(config), or dlib HOG if the configured backend cannot be loaded."""
+    try:
+        return create_detector(config)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"⚠️ Detector backend unavailable ({e}), falling back to dlib HOG.")
+        return HogDetector(config.get("detector", {}).get("upsample", 1))
+
+
+def configure(config):
+    """Use config["detector"] for this process (and pool workers forked after this)."""
+    global _detector
+    _detector = create_or_fallback(config)
+    return _detector
+
+
+def get_detector():
+    """The configured detector; without configure(), created from ./config.json on first use."""
+    global _detector
+    if _detector is None:
+        _detector = create_or_fallback(load_config() if os.path.exists("config.json") else {})
+    return _detector
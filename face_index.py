@@ -0,0 +1,129 @@
+# Approximate nearest-neighbour (IVF) index over the encodings store, for large galleries.
+# k-means centroids split the encodings into lists; a query scans only the rows of the
+# `nprobe` lists whose centroids are closest and FaceMatcher re-ranks those candidates
+# with exact distances. The index lives next to the store (faces.index.npz) and records
+# the store's generation, so an index left behind by an older store is never used.
+#
+# k-d and ball trees do not prune in 128 dimensions, so a coarse quantizer it is.
+import os
+import tempfile
+import numpy as np
+import face_store
+
+# Upper bound on encoding x centroid distances computed at once (~16 MB of float32)
+CHUNK_ELEMENTS = 4_000_000
+
+
+def index_path(path):
+    return os.path.splitext(face_store.store_path(path))[0] + ".index.npz"
+
+
+def nearest_centroid(encodings, centroids):
+    encodings = np.asarray(encodings, dtype=np.float32)
+    sq_norms = np.einsum("ij,ij->i", centroids, centroids)
+    out = np.empty(len(encodings), dtype=np.int32)
+    step = max(1, CHUNK_ELEMENTS // max(len(centroids), 1))
+    for start in range(0, len(encodings), step):
+        chunk = encodings[start:start + step]
+        # |x - c|^2 up to the per-row constant |x|^2
+        out[start:start + step] = (sq_norms[None, :] - 2.0 * (chunk @ centroids.T)).argmin(axis=1)
+    return out
+
+
+def kmeans(data, k, iterations=8, rng=None):
+    """Plain Lloyd's k-means; returns (k, dim) float32 centroids."""
+    data = np.asarray(data, dtype=np.float32)
+    rng = rng or np.random.default_rng(0)
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = nearest_centroid(data, centroids)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, data)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+class FaceIndex:
+    def __init__(self, centroids, assignments, generation=None, trained_count=None):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.assignments = np.asarray(assignments, dtype=np.int32)
+        self.generation = generation
+        self.trained_count = trained_count or len(self.assignments)
+
+    def __len__(self):
+        return len(self.assignments)
+
+    @classmethod
+    def train(cls, encodings, nlist=None, iterations=8, sample=50_000, seed=0, generation=None):
+        """k-means on a sample of `encodings`, then assign every row to its list."""
+        encodings = np.asarray(encodings, dtype=np.float32)
+        nlist = min(nlist or int(4 * np.sqrt(len(encodings))), len(encodings)) or 1
+        rng = np.random.default_rng(seed)
+        picked = rng.choice(len(encodings), min(sample, len(encodings)), replace=False)
+        centroids = kmeans(encodings[np.sort(picked)], nlist, iterations, rng)
+        return cls(centroids, nearest_centroid(encodings, centroids), generation, len(encodings))
+
+    def updated(self, encodings, keep, generation, retrain_factor=2.0):
+        """Index for a store rewritten as encodings[keep] + new rows, reusing kept assignments.
+
+        Only the new rows are assigned; the centroids are retrained once the gallery
+        has grown or shrunk by `retrain_factor` since they were trained.
+        """
+        count = len(encodings)
+        if count > self.trained_count * retrain_factor or count * retrain_factor < self.trained_count:
+            return FaceIndex.train(encodings, generation=generation)
+        assignments = np.concatenate([self.assignments[keep], nearest_centroid(encodings[len(keep):], self.centroids)])
+        return FaceIndex(self.centroids, assignments, generation, self.trained_count)
+
+    def save(self, path):
+        path = index_path(path)
+        fd, tmp_path = tempfile.mkstemp(prefix=".faces-index-", suffix=".npz", dir=os.path.dirname(path) or ".")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, centroids=self.centroids, assignments=self.assignments,
+                         generation=np.array(self.generation or ""), trained_count=np.array(self.trained_count))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(index_path(path)) as data:
+            return cls(data["centroids"], data["assignments"], str(data["generation"]), int(data["trained_count"]))
+
+
+def load_index(path, metadata, count):
+    """The index for the store at `path`, or None if there is none or it is stale."""
+    if not os.path.exists(index_path(path)):
+        return None
+    index = FaceIndex.load(path)
+    if index.generation != metadata.get("generation") or len(index) != count:
+        print("⚠️ Face index is out of date, matching exhaustively. Run manage_faces.py --add-all to rebuild it.")
+        return None
+    return index
+
+
+def update_index(path, encodings, keep, previous_generation, generation, min_encodings=20_000):
+    """Bring the index in line with a store just rewritten as encodings[keep] + new rows."""
+    if len(encodings) < min_encodings:
+        # Exhaustive matching is fast enough; drop an index that would now be stale
+        if os.path.exists(index_path(path)):
+            os.remove(index_path(path))
+        return None
+    previous = None
+    if os.path.exists(index_path(path)):
+        previous = FaceIndex.load(path)
+        if previous.generation != previous_generation:
+            previous = None
+    if previous is None:
+        index = FaceIndex.train(encodings, generation=generation)
+        print(f"🗂️ Built face index: {len(index.centroids)} lists over {len(index)} encodings")
+    else:
+        index = previous.updated(encodings, keep, generation)
+        print(f"🗂️ Updated face index: {len(encodings) - len(keep)} new encoding(s) assigned")
+    index.save(path)
+    return index
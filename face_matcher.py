@@ -0,0 +1,176 @@
+# Vectorized matching of face encodings against the known DB.
+# The DB is held as one contiguous float32 (N, 128) matrix sorted by identity, so a whole
+# batch of probe encodings is matched with a single matrix product. With a FaceIndex only
+# the rows in the probe's nearest IVF lists are compared, with exact distances.
+# PrototypeMatcher searches the compacted per-person prototypes first and only goes back
+# to the full gallery for borderline probes.
+from collections import namedtuple
+import numpy as np
+import face_store
+import face_index
+import face_prototypes
+
+# name is None when the nearest identity is further away than the tolerance.
+# margin is how much closer the best identity is than the runner-up (inf if there is none).
+Match = namedtuple("Match", ["name", "distance", "margin", "nearest"])
+
+ENCODING_DIM = 128
+
+# Upper bound on probe x encoding distances computed at once (~16 MB of float32)
+CHUNK_ELEMENTS = 4_000_000
+
+
+class FaceMatcher:
+    def __init__(self, encodings, names, tolerance=0.6, index=None, nprobe=8):
+        self.tolerance = tolerance
+        names = np.asarray(list(names), dtype=str)
+        matrix = np.asarray(encodings, dtype=np.float32).reshape(len(names), ENCODING_DIM)
+
+        # Group encodings by identity so per-identity minima are one reduceat call
+        self.identities, labels = np.unique(names, return_inverse=True)
+        order = np.argsort(labels, kind="stable")
+        self.matrix = np.ascontiguousarray(matrix[order])
+        self.labels = labels[order]
+        self.sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+        self.starts = np.flatnonzero(np.diff(self.labels, prepend=-1))
+
+        self.index = index
+        self.nprobe = nprobe
+        if index is not None:
+            # Rows of each IVF list, as positions in the identity-sorted matrix
+            lists = index.assignments[order]
+            self.list_rows = np.argsort(lists, kind="stable")
+            self.list_starts = np.searchsorted(lists[self.list_rows], np.arange(len(index.centroids) + 1))
+            self.centroid_sq_norms = np.einsum("ij,ij->i", index.centroids, index.centroids)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def distances(self, probes):
+        """Euclidean distances, shape (P, N), between probes and every known encoding."""
+        probes = np.asarray(probes, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        sq = np.einsum("ij,ij->i", probes, probes)[:, None] + self.sq_norms[None, :] - 2.0 * (probes @ self.matrix.T)
+        np.maximum(sq, 0, out=sq)
+        return np.sqrt(sq, out=sq)
+
+    def identity_distances(self, probes):
+        """Distance from each probe to the closest encoding of each identity, shape (P, K)."""
+        return np.minimum.reduceat(self.distances(probes), self.starts, axis=1)
+
+    def match(self, probes):
+        probes = np.asarray(probes, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        if not len(probes):
+            return []
+        if not len(self.matrix):
+            return [Match(None, float("inf"), float("inf"), None)] * len(probes)
+
+        if self.index is not None:
+            return [self._match_indexed(probe) for probe in probes]
+
+        results = []
+        step = max(1, CHUNK_ELEMENTS // len(self.matrix))
+        for start in range(0, len(probes), step):
+            per_identity = self.identity_distances(probes[start:start + step])
+            if per_identity.shape[1] > 1:
+                two = np.partition(per_identity, 1, axis=1)[:, :2]
+                best, runner_up = two[:, 0], two[:, 1]
+            else:
+                best = per_identity[:, 0]
+                runner_up = np.full_like(best, np.inf)
+            best_idx = per_identity.argmin(axis=1)
+            for idx, dist, second in zip(best_idx, best, runner_up):
+                nearest = str(self.identities[idx])
+                name = nearest if dist <= self.tolerance else None
+                results.append(Match(name, float(dist), float(second - dist), nearest))
+        return results
+
+    def _match_indexed(self, probe):
+        centroid_dist = self.centroid_sq_norms - 2.0 * (self.index.centroids @ probe)
+        nprobe = min(self.nprobe, len(centroid_dist))
+        lists = np.argpartition(centroid_dist, nprobe - 1)[:nprobe]
+        rows = np.concatenate([self.list_rows[self.list_starts[l]:self.list_starts[l + 1]] for l in lists])
+        if not len(rows):
+            return Match(None, float("inf"), float("inf"), None)
+
+        # Exact re-ranking of the candidates, then the closest two identities among them;
+        # an identity with no row in the probed lists counts as infinitely far
+        diff = self.matrix[rows] - probe
+        dist = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+        per_identity = np.full(len(self.identities), np.inf, dtype=np.float32)
+        np.minimum.at(per_identity, self.labels[rows], dist)
+        best_idx = int(per_identity.argmin())
+        best = float(per_identity[best_idx])
+        per_identity[best_idx] = np.inf
+        nearest = str(self.identities[best_idx])
+        name = nearest if best <= self.tolerance else None
+        return Match(name, best, float(per_identity.min()) - best, nearest)
+
+    def names(self, probes):
+        """Matched names (None for unknown faces), one per probe."""
+        return [m.name for m in self.match(probes)]
+
+
+class PrototypeMatcher:
+    """Match against per-person prototypes, re-checking borderline probes on the full gallery.
+
+    A probe is borderline when its prototype distance is within `fallback_margin` of the
+    tolerance, or when it matched but its two closest identities are within
+    `fallback_margin` of each other.
+    Without a `full` matcher the prototype result is final.
+    """
+
+    def __init__(self, prototypes, full=None, fallback_margin=0.05):
+        self.prototypes = prototypes
+        self.full = full
+        self.fallback_margin = fallback_margin
+        self.tolerance = prototypes.tolerance
+        self.identities = prototypes.identities
+        self.fallbacks = 0
+
+    def __len__(self):
+        return len(self.prototypes)
+
+    def match(self, probes):
+        probes = np.asarray(probes, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        results = self.prototypes.match(probes)
+        if self.full is None:
+            return results
+        borderline = [i for i, m in enumerate(results)
+                      if abs(m.distance - self.tolerance) <= self.fallback_margin
+                      or (m.name is not None and m.margin <= self.fallback_margin)]
+        if borderline:
+            self.fallbacks += len(borderline)
+            for i, m in zip(borderline, self.full.match(probes[borderline])):
+                results[i] = m
+        return results
+
+    def names(self, probes):
+        return [m.name for m in self.match(probes)]
+
+
+def load_matcher(path, config):
+    """Matcher over the store at `path`.
+
+    Uses the compacted prototypes when recognition.prototypes is enabled and they are up
+    to date, and the IVF index when the gallery is large enough.
+    """
+    encodings, names, metadata = face_store.load_store(path)
+    tolerance = config["recognition"].get("tolerance", 0.6)
+
+    proto_options = config["recognition"].get("prototypes", {})
+    prototypes = None
+    if proto_options.get("enabled", False):
+        prototypes = face_prototypes.load_prototypes(path, metadata)
+    margin = proto_options.get("fallback_margin", 0.05)
+    if prototypes is not None and margin is None:
+        # Prototypes only: the full gallery is not even kept in memory
+        return PrototypeMatcher(FaceMatcher(*prototypes, tolerance))
+
+    options = config["recognition"].get("index", {})
+    index = None
+    if options.get("enabled", True) and len(names) >= options.get("min_encodings", 20_000):
+        index = face_index.load_index(path, metadata, len(names))
+    full = FaceMatcher(encodings, names, tolerance, index=index, nprobe=options.get("nprobe", 8))
+    if prototypes is not None:
+        return PrototypeMatcher(FaceMatcher(*prototypes, tolerance), full, margin)
+    return full
@@ -0,0 +1,80 @@
+# Per-person prototype compaction of the encodings store.
+# Burst captures leave hundreds of near-identical encodings per person. Each person's
+# encodings are clustered with k-means and the real encoding closest to each cluster
+# centre is kept (plus, optionally, the mean encoding of a clustered person), giving a small
+# faces.prototypes.bin next to faces.bin. faces.bin itself is left alone, so incremental
+# enrollment keeps working and the full gallery stays available for fallback matching.
+import os
+from collections import defaultdict
+import numpy as np
+import face_store
+from face_index import kmeans, nearest_centroid
+
+
+def prototypes_path(path):
+    return os.path.splitext(face_store.store_path(path))[0] + ".prototypes.bin"
+
+
+def person_prototypes(encodings, max_prototypes, centroid=True, seed=0):
+    """Return (indices of the kept encodings, mean encoding or None) for one person.
+
+    A person with at most max_prototypes encodings keeps them all and gets no mean row,
+    so compaction never adds rows.
+    """
+    encodings = np.asarray(encodings, dtype=np.float32)
+    if len(encodings) <= max_prototypes:
+        return list(range(len(encodings))), None
+    mean = encodings.mean(axis=0) if centroid else None
+    centres = kmeans(encodings, max_prototypes, rng=np.random.default_rng(seed))
+    labels = nearest_centroid(encodings, centres)
+    kept = []
+    for k in range(max_prototypes):
+        members = np.flatnonzero(labels == k)
+        if len(members):
+            dist = np.linalg.norm(encodings[members] - centres[k], axis=1)
+            kept.append(int(members[dist.argmin()]))
+    return sorted(kept), mean
+
+
+def compact(encodings, names, sources, max_prototypes=10, centroid=True):
+    """Return (encodings, names, sources) holding at most max_prototypes (+ mean) per person."""
+    rows = defaultdict(list)
+    for i, name in enumerate(names):
+        rows[name].append(i)
+
+    out_encodings, out_names, out_sources = [], [], []
+    for name in sorted(rows):
+        idx = np.asarray(rows[name])
+        kept, mean = person_prototypes(encodings[idx], max_prototypes, centroid)
+        for k in kept:
+            out_encodings.append(encodings[idx[k]])
+            out_names.append(name)
+            out_sources.append(sources[idx[k]])
+        if mean is not None:
+            out_encodings.append(mean)
+            out_names.append(name)
+            out_sources.append(f"{name}/<mean>")
+    return np.asarray(out_encodings, dtype=np.float32).reshape(-1, face_store.ENCODING_DIM), out_names, out_sources
+
+
+def build_prototypes(path, max_prototypes=10, centroid=True):
+    """Write faces.prototypes.bin for the store at `path`; returns (rows before, rows after)."""
+    encodings, names, metadata = face_store.load_store(path)
+    sources = metadata.get("sources") or [None] * len(names)
+    proto_encodings, proto_names, proto_sources = compact(encodings, names, sources, max_prototypes, centroid)
+    face_store.write_store(prototypes_path(path), proto_encodings, proto_names,
+                           {"sources": proto_sources, "store_generation": metadata.get("generation"),
+                            "max_prototypes": max_prototypes, "centroid": centroid})
+    return len(names), len(proto_names)
+
+
+def load_prototypes(path, metadata):
+    """(encodings, names) of the prototypes for the store at `path`, or None if missing or stale."""
+    proto_path = prototypes_path(path)
+    if not os.path.exists(proto_path):
+        return None
+    encodings, names, proto_meta = face_store.read_store(proto_path)
+    if proto_meta.get("store_generation") != metadata.get("generation"):
+        print("⚠️ Face prototypes are out of date, matching the full gallery. Run manage_faces.py --compact.")
+        return None
+    return encodings, names
@@ -0,0 +1,120 @@
+# Binary encodings store replacing the faces.pkl pickle.
+#
+# File layout (little endian):
+#   header   magic, version, count, dim, labels offset, metadata offset, metadata length
+#   matrix   float32 (count, dim) at HEADER_SIZE, memory-mapped on load
+#   labels   uint32 (count,) index into metadata["identities"]
+#   metadata UTF-8 JSON: {"identities": [...], ...}
+#
+# Writes go to a temp file in the same directory and are renamed over the old store,
+# so readers never see a half-written DB.
+import os
+import json
+import pickle
+import struct
+import tempfile
+import uuid
+import numpy as np
+
+MAGIC = b"FACEDB\x00\x00"
+VERSION = 1
+HEADER = struct.Struct("<8sIIIQQQ")
+HEADER_SIZE = 64
+ENCODING_DIM = 128
+
+
+def store_path(path):
+    # Configs that still point at faces.pkl get the store next to it
+    return os.path.splitext(path)[0] + ".bin" if path.endswith(".pkl") else path
+
+
+def legacy_pickle_path(path):
+    return os.path.splitext(path)[0] + ".pkl"
+
+
+def read_store(path):
+    """Return (encodings, names, metadata); encodings is a read-only memmap."""
+    with open(path, "rb") as f:
+        magic, version, count, dim, labels_offset, meta_offset, meta_length = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a face encodings store")
+        if version > VERSION:
+            raise ValueError(f"{path} has unsupported store version {version}")
+        f.seek(meta_offset)
+        metadata = json.loads(f.read(meta_length).decode("utf-8"))
+
+    if count:
+        encodings = np.memmap(path, dtype="<f4", mode="r", offset=HEADER_SIZE, shape=(count, dim))
+        labels = np.memmap(path, dtype="<u4", mode="r", offset=labels_offset, shape=(count,))
+    else:
+        encodings = np.empty((0, dim), dtype=np.float32)
+        labels = np.empty(0, dtype=np.uint32)
+
+    identities = metadata["identities"]
+    names = [identities[i] for i in labels.tolist()]
+    return encodings, names, metadata
+
+
+def write_store(path, encodings, names, metadata=None):
+    encodings = np.asarray(encodings, dtype="<f4").reshape(len(names), ENCODING_DIM)
+    identities = sorted(set(names))
+    index = {name: i for i, name in enumerate(identities)}
+    labels = np.array([index[name] for name in names], dtype="<u4")
+
+    meta = dict(metadata or {})
+    meta["identities"] = identities
+    # Changes on every write, so files derived from the store (face_index) can tell they are stale
+    meta["generation"] = uuid.uuid4().hex
+    meta_bytes = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+
+    labels_offset = HEADER_SIZE + encodings.nbytes
+    meta_offset = labels_offset + labels.nbytes
+    header = HEADER.pack(MAGIC, VERSION, len(names), ENCODING_DIM, labels_offset, meta_offset, len(meta_bytes))
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".faces-", dir=directory)
+    umask = os.umask(0)
+    os.umask(umask)
+    try:
+        os.fchmod(fd, 0o666 & ~umask)
+        with os.fdopen(fd, "wb") as f:
+            f.write(header.ljust(HEADER_SIZE, b"\x00"))
+            f.write(encodings.tobytes())
+            f.write(labels.tobytes())
+            f.write(meta_bytes)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return meta
+
+
+def migrate_pickle(pickle_path, path):
+    with open(pickle_path, "rb") as f:
+        data = pickle.load(f)
+    write_store(path, data["encodings"], data["names"])
+    print(f"🔁 Migrated {len(data['names'])} encodings from {pickle_path} to {path}")
+
+
+def load_store(path):
+    """Load (encodings, names, metadata), migrating a faces.pkl next to `path` on first use."""
+    path = store_path(path)
+    if not os.path.exists(path):
+        legacy = legacy_pickle_path(path)
+        if not os.path.exists(legacy):
+            return np.empty((0, ENCODING_DIM), dtype=np.float32), [], {}
+        migrate_pickle(legacy, path)
+    return read_store(path)
+
+
+def load_encodings(path):
+    encodings, names, _ = load_store(path)
+    return encodings, names
+
+
+def save_encodings(path, encodings, names, metadata=None):
+    return write_store(store_path(path), encodings, names, metadata)
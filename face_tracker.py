@@ -0,0 +1,164 @@
+# Lightweight cross-frame face tracking.
+# Face boxes are associated across frames by IoU (falling back to centroid distance),
+# so each person becomes one track. Only a few of the sharpest, largest samples per
+# track are encoded and the identity is voted per track, instead of encoding every face
+# in every frame and clustering all encodings afterwards.
+import heapq
+import itertools
+from collections import Counter
+import numpy as np
+from face_core import lazy_import
+
+cv2 = lazy_import("cv2")
+
+
+def box_iou(a, b):
+    top, right, bottom, left = max(a[0], b[0]), min(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, bottom - top) * max(0, right - left)
+    if not inter:
+        return 0.0
+    area = lambda box: (box[2] - box[0]) * (box[1] - box[3])
+    return inter / float(area(a) + area(b) - inter)
+
+
+def face_quality(frame, box):
+    """Higher for larger, sharper faces (Laplacian variance of the grey crop)."""
+    top, right, bottom, left = box
+    crop = frame[top:bottom, left:right]
+    if not crop.size:
+        return 0.0
+    gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY) if crop.ndim == 3 else crop
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    return float(np.sqrt(crop.shape[0] * crop.shape[1]) * np.log1p(sharpness))
+
+
+class Track:
+    def __init__(self, track_id, frame_idx, box):
+        self.id = track_id
+        self.box = box
+        self.last_frame = frame_idx
+        self.frames = 1
+        self.candidates = []  # min-heap of (quality, frame_idx, box) not yet encoded
+        self.encodings = []
+        self.names = []
+
+    def center(self):
+        top, right, bottom, left = self.box
+        return (top + bottom) / 2.0, (left + right) / 2.0
+
+    def size(self):
+        top, right, bottom, left = self.box
+        return max(bottom - top, right - left)
+
+    def vote(self):
+        """Majority name over the track's matched samples, or None for unknown."""
+        counts = Counter(name for name in self.names if name)
+        if not counts:
+            return None
+        name, votes = counts.most_common(1)[0]
+        return name if votes * 2 > len(self.names) else None
+
+
+class FaceTracker:
+    def __init__(self, iou_threshold=0.3, max_gap=8, max_samples=3, min_frames=3):
+        self.iou_threshold = iou_threshold
+        self.max_gap = max_gap
+        self.max_samples = max_samples
+        self.min_frames = min_frames
+        self.tracks = []
+        self.ids = itertools.count(1)
+        self.last_updated = []
+
+    def _associate(self, frame_idx, locations):
+        active = [t for t in self.tracks if frame_idx - t.last_frame <= self.max_gap and t.last_frame < frame_idx]
+        pairs = []
+        for i, box in enumerate(locations):
+            for track in active:
+                score = box_iou(track.box, box)
+                if score < self.iou_threshold:
+                    # Fast movement between sampled frames: accept a nearby centroid
+                    cy, cx = track.center()
+                    by, bx = (box[0] + box[2]) / 2.0, (box[1] + box[3]) / 2.0
+                    dist = np.hypot(cy - by, cx - bx)
+                    score = 0.5 * self.iou_threshold * (1 - dist / track.size()) if dist < track.size() else 0.0
+                if score > 0:
+                    pairs.append((score, i, track))
+        assigned = {}
+        used = set()
+        for score, i, track in sorted(pairs, key=lambda p: -p[0]):
+            if i not in assigned and track.id not in used:
+                assigned[i] = track
+                used.add(track.id)
+        return assigned
+
+    def update(self, frame_idx, frame, locations, encodings=None, names=None):
+        """Add one frame's face boxes; encodings/names are attached when already known."""
+        assigned = self._associate(frame_idx, locations)
+        self.last_updated = []
+        for i, box in enumerate(locations):
+            track = assigned.get(i)
+            if track is None:
+                track = Track(next(self.ids), frame_idx, box)
+                self.tracks.append(track)
+            else:
+                track.box = box
+                track.last_frame = frame_idx
+                track.frames += 1
+            self.last_updated.append(track)
+
+            if encodings is not None:
+                track.encodings.append(encodings[i])
+                track.names.append(names[i] if names is not None else None)
+            elif len(track.encodings) < self.max_samples:
+                sample = (face_quality(frame, box), frame_idx, tuple(box))
+                if len(track.candidates) < self.max_samples:
+                    heapq.heappush(track.candidates, sample)
+                else:
+                    heapq.heappushpop(track.candidates, sample)
+
+    def carry(self, frame_idx):
+        """A frame skipped as unchanged still shows the faces of the last analyzed frame."""
+        for track in self.last_updated:
+            track.last_frame = frame_idx
+            track.frames += 1
+
+    def samples_to_encode(self):
+        """(track, frame_idx, box) for the best samples of tracks that still need encodings."""
+        samples = []
+        for track in self.tracks:
+            missing = self.max_samples - len(track.encodings)
+            if missing <= 0:
+                continue
+            for _, frame_idx, box in heapq.nlargest(missing, track.candidates):
+                samples.append((track, frame_idx, box))
+        return samples
+
+    def add_sample(self, track, encoding, name):
+        track.encodings.append(encoding)
+        track.names.append(name)
+
+    def confirmed(self):
+        """Tracks seen in at least min_frames frames, or the longest ones if none are."""
+        confirmed = [t for t in self.tracks if t.frames >= self.min_frames and t.encodings]
+        if confirmed or not self.tracks:
+            return confirmed
+        longest = max(t.frames for t in self.tracks)
+        return [t for t in self.tracks if t.frames == longest and t.encodings]
+
+    def people(self, merge_distance=0.6):
+        """Return (known names, number of unknown people) over confirmed tracks.
+
+        Unknown tracks whose mean encodings are within merge_distance are counted once,
+        e.g. a stranger who left the frame and came back.
+        """
+        known = set()
+        unknown = []
+        for track in self.confirmed():
+            name = track.vote()
+            if name:
+                known.add(name)
+                continue
+            mean = np.mean(track.encodings, axis=0)
+            if all(np.linalg.norm(mean - other) > merge_distance for other in unknown):
+                unknown.append(mean)
+        return known, len(unknown)
@@ -0,0 +1,281 @@
+# Per-frame face analysis shared by the detectors: a per-run cache of frame results,
+# a bounded process pool for scanning many frames and a small per-stage wall-clock timer.
+# Faces are located with the backend from face_detectors (detector.backend in config.json).
+import os
+import time
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import repeat
+import numpy as np
+from metrics import metrics
+from face_core import lazy_import
+from face_detectors import get_detector
+
+# Imported on first use (or preloaded by the script), not when this module is imported
+cv2 = lazy_import("cv2")
+face_recognition = lazy_import("face_recognition")
+dlib = lazy_import("dlib")
+
+# dlib's ResNet embeds 150x150 chips cut with 25% padding, as face_encodings does
+CHIP_SIZE = 150
+CHIP_PADDING = 0.25
+
+
+class StageTimer:
+    """Per-run stage totals; every sample also goes to the process-wide metrics."""
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    def add(self, name, seconds, count=1):
+        self.totals[name] += seconds
+        self.counts[name] += count
+        metrics.observe(name, seconds)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def report(self):
+        if not self.totals:
+            return
+        print("⏱️ Stage timings:")
+        for name, total in self.totals.items():
+            print(f"  - {name}: {total * 1000:.0f} ms ({self.counts[name]} call(s))")
+
+
+FrameResult = namedtuple("FrameResult", ["locations", "encodings", "names"])
+
+
+class FrameCache:
+    """Per-run analysis results keyed by frame index, so no frame is encoded twice."""
+
+    def __init__(self):
+        self.results = {}
+        self.hits = 0
+        self.faces_reused = 0
+
+    def __contains__(self, idx):
+        return idx in self.results
+
+    def __len__(self):
+        return len(self.results)
+
+    def put(self, idx, locations, encodings, names):
+        self.results[idx] = FrameResult(locations, encodings, names)
+        return self.results[idx]
+
+    def get(self, idx):
+        result = self.results.get(idx)
+        if result is not None:
+            self.hits += 1
+            self.faces_reused += len(result.encodings)
+        return result
+
+    def report(self):
+        print(f"🗃️ Frame cache: {len(self.results)} frame(s) analyzed, {self.hits} hit(s), "
+              f"{self.hits} encoding call(s) and {self.faces_reused} face encoding(s) saved")
+
+
+def locate_scaled(images, scale=1.0):
+    """Detector boxes for each image, found on a copy resized by `scale` and mapped back."""
+    if scale >= 1.0:
+        return get_detector().detect_batch(images)
+    small = [cv2.resize(image, (max(1, round(image.shape[1] * scale)), max(1, round(image.shape[0] * scale))),
+                        interpolation=cv2.INTER_AREA) for image in images]
+    results = []
+    for image, locations in zip(images, get_detector().detect_batch(small)):
+        height, width = image.shape[:2]
+        results.append([(max(0, round(top / scale)), min(width, round(right / scale)),
+                         min(height, round(bottom / scale)), max(0, round(left / scale)))
+                        for top, right, bottom, left in locations])
+    return results
+
+
+def locate_faces(frame, regions=None, scale=1.0):
+    """Face boxes in the whole frame, or only inside (top, right, bottom, left) regions.
+
+    All regions go to the detector as one batch, for backends that batch.
+    """
+    if regions is None:
+        return locate_scaled([frame], scale)[0]
+    regions = list(regions)
+    crops = [frame[top:bottom, left:right] for top, right, bottom, left in regions]
+    locations = []
+    for (top, _, _, left), found in zip(regions, locate_scaled(crops, scale)):
+        locations.extend((t + top, r + left, b + top, l + left) for t, r, b, l in found)
+    return locations
+
+
+def analyze_frame(frame, regions=None, scale=1.0, encode=True):
+    """Locate and encode the faces in one RGB frame, optionally only inside `regions`.
+
+    Faces are located on a copy downscaled by `scale`; encodings are always computed
+    from the full-resolution frame, and skipped entirely with encode=False.
+    Returns (locations, encodings, {"locate": seconds, "encode": seconds}).
+    """
+    start = time.perf_counter()
+    locations = locate_faces(frame, regions, scale)
+    located = time.perf_counter()
+    encodings = face_recognition.face_encodings(frame, known_face_locations=locations) if locations and encode else []
+    return locations, encodings, {"locate": located - start, "encode": time.perf_counter() - located}
+
+
+def encode_faces(frame, locations):
+    """Encode already located faces. Returns (locations, encodings, {"encode": seconds})."""
+    start = time.perf_counter()
+    encodings = face_recognition.face_encodings(frame, known_face_locations=list(locations))
+    return locations, encodings, {"encode": time.perf_counter() - start}
+
+
+class BatchEncoder:
+    """Encodes faces from many frames in batches of aligned chips.
+
+    Landmarks are predicted per frame (cheap), each face is cut into a 150x150 chip in a
+    reused (batch_size, 150, 150, 3) buffer, and the embedding network runs once per full
+    buffer instead of once per frame. Encodings match face_recognition.face_encodings.
+    """
+
+    def __init__(self, batch_size=32, num_jitters=1):
+        self.batch_size = batch_size
+        self.num_jitters = num_jitters
+        self.chips = np.empty((batch_size, CHIP_SIZE, CHIP_SIZE, 3), dtype=np.uint8)
+        self.slots = []  # (result entry, face position) of every chip in the buffer
+        self.faces = 0
+        self.batches = 0
+
+    def _compute(self):
+        api = face_recognition.api
+        descriptors = api.face_encoder.compute_face_descriptor([self.chips[i] for i in range(len(self.slots))],
+                                                               self.num_jitters)
+        for (entry, pos), descriptor in zip(self.slots, descriptors):
+            entry[1][pos] = np.array(descriptor)
+        self.faces += len(self.slots)
+        self.batches += 1
+        self.slots = []
+
+    def encode(self, items):
+        """Yield (key, encodings) for (key, rgb frame, locations) items, in input order."""
+        api = face_recognition.api
+        pending = deque()  # [key, encodings] still waiting for a batch
+        for key, frame, locations in items:
+            entry = [key, [None] * len(locations)]
+            pending.append(entry)
+            for pos, location in enumerate(locations):
+                shape = api.pose_predictor_5_point(frame, api._css_to_rect(location))
+                self.chips[len(self.slots)] = dlib.get_face_chip(frame, shape, size=CHIP_SIZE, padding=CHIP_PADDING)
+                self.slots.append((entry, pos))
+                if len(self.slots) == self.batch_size:
+                    self._compute()
+            while pending and all(e is not None for e in pending[0][1]):
+                yield tuple(pending.popleft())
+        if self.slots:
+            self._compute()
+        while pending:
+            yield tuple(pending.popleft())
+
+
+def encode_faces_batch(items, batch_size=32):
+    """Encode already located faces of several (frame, locations) items together.
+
+    Returns [(locations, encodings, {"encode": seconds})], the time split by face count.
+    """
+    start = time.perf_counter()
+    items = list(items)
+    encoded = [encodings for _, encodings in BatchEncoder(batch_size).encode(
+        (i, frame, list(locations)) for i, (frame, locations) in enumerate(items))]
+    seconds = time.perf_counter() - start
+    faces = max(1, sum(len(locations) for _, locations in items))
+    return [(locations, encodings, {"encode": seconds * len(locations) / faces})
+            for (_, locations), encodings in zip(items, encoded)]
+
+
+def pool_map(fn, args, workers=None, max_pending=None):
+    """Yield (index, result) of fn(*a) for every tuple in `args`, in order.
+
+    Calls run in a process pool with at most `max_pending` in flight, so a generator
+    of arguments is consumed only as fast as the workers keep up. A call that fails
+    yields its exception as the result.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 2
+    pending = deque()
+
+    def collect():
+        idx, future = pending.popleft()
+        try:
+            return idx, future.result()
+        except Exception as e:
+            return idx, e
+
+    with ProcessPoolExecutor(workers) as pool:
+        for idx, fn_args in enumerate(args):
+            if len(pending) >= max_pending:
+                yield collect()
+            pending.append((idx, pool.submit(fn, *fn_args)))
+        while pending:
+            yield collect()
+
+
+def analyze_frames(frames, workers=None, max_pending=None, regions=None, scale=1.0, encode=True):
+    """Yield (index, locations, encodings, timings) for every frame, in order, via pool_map.
+
+    A frame that fails is yielded with timings["error"] set and no faces.
+    `regions`, if given, yields the motion regions (or None) for each frame.
+    """
+    regions = regions if regions is not None else repeat(None)
+    args = ((frame, frame_regions, scale, encode) for frame, frame_regions in zip(frames, regions))
+    for idx, result in pool_map(analyze_frame, args, workers, max_pending):
+        if isinstance(result, Exception):
+            yield idx, [], [], {"error": str(result)}
+        else:
+            yield (idx,) + result
+
+
+def encode_frames(items, workers=None, max_pending=None, batch_size=1):
+    """Yield (index, locations, encodings, timings) for (frame, locations) items, in order.
+
+    With batch_size > 1 consecutive items are grouped into pool tasks of about that many
+    faces, each encoded through one BatchEncoder.
+    """
+    if batch_size <= 1:
+        for idx, result in pool_map(encode_faces, items, workers, max_pending):
+            if isinstance(result, Exception):
+                yield idx, [], [], {"error": str(result)}
+            else:
+                yield (idx,) + result
+        return
+
+    sizes = []  # items per group, for mapping results back to item indices
+
+    def groups():
+        group = []
+        faces = 0
+        for frame, locations in items:
+            group.append((frame, locations))
+            faces += len(locations)
+            if faces >= batch_size:
+                sizes.append(len(group))
+                yield group, batch_size
+                group = []
+                faces = 0
+        if group:
+            sizes.append(len(group))
+            yield group, batch_size
+
+    start = 0
+    for pos, result in pool_map(encode_faces_batch, groups(), workers, max_pending):
+        count = sizes[pos]
+        if isinstance(result, Exception):
+            for idx in range(start, start + count):
+                yield idx, [], [], {"error": str(result)}
+        else:
+            for idx, item_result in enumerate(result, start):
+                yield (idx,) + item_result
+        start += count
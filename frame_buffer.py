@@ -0,0 +1,55 @@
+# Bounded in-memory ring buffer of recent frames, filled by camera_manager.CameraManager.
+# Frames are stored in one preallocated array, so memory is capped at
+# seconds x fps x width x height x 3 bytes however long the stream runs, and an
+# unknown-face clip can be written from pre-roll + post-roll without reopening RTSP.
+import time
+import threading
+import numpy as np
+import cv2
+
+
+class FrameRingBuffer:
+    def __init__(self, seconds, fps, resolution=None):
+        self.capacity = max(1, int(seconds * fps))
+        self.size = tuple(int(v) for v in resolution.lower().split("x")) if resolution else None
+        self.frames = None  # allocated on the first frame once the shape is known
+        self.times = np.zeros(self.capacity)
+        self.head = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def push(self, frame, timestamp=None):
+        with self.lock:
+            if self.frames is None:
+                width, height = self.size or (frame.shape[1], frame.shape[0])
+                self.frames = np.empty((self.capacity, height, width) + frame.shape[2:], dtype=frame.dtype)
+            slot = self.frames[self.head]
+            if frame.shape == slot.shape:
+                np.copyto(slot, frame)
+            else:
+                cv2.resize(frame, (slot.shape[1], slot.shape[0]), dst=slot, interpolation=cv2.INTER_AREA)
+            self.times[self.head] = timestamp if timestamp is not None else time.time()
+            self.head = (self.head + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+
+    def _order(self):
+        return [(self.head - self.count + i) % self.capacity for i in range(self.count)]
+
+    def snapshot(self, since=None):
+        """Copies of the buffered frames, oldest first, optionally only those newer than `since`."""
+        with self.lock:
+            return [self.frames[i].copy() for i in self._order() if since is None or self.times[i] >= since]
+
+    def latest(self):
+        with self.lock:
+            if not self.count:
+                return None, None
+            i = (self.head - 1) % self.capacity
+            return self.frames[i].copy(), float(self.times[i])
+
+    @property
+    def nbytes(self):
+        return self.frames.nbytes if self.frames is not None else 0
+
+    def report(self):
+        print(f"🧺 Frame buffer: {self.count}/{self.capacity} frames, {self.nbytes / 1e6:.1f} MB allocated")
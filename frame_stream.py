@@ -0,0 +1,144 @@
+# Streams decoded frames from FFmpeg straight into memory.
+# FFmpeg writes raw frames (-f rawvideo) to a pipe; a reader thread copies them into
+# preallocated NumPy buffers so analysis can start on frame 1 while capture is still running.
+import os
+import json
+import time
+import queue
+import subprocess
+import threading
+import numpy as np
+
+CHANNELS = {"rgb24": 3, "bgr24": 3, "gray": 1}
+
+
+def ffmpeg_input_args(url):
+    args = []
+    if url.startswith("rtsp://") or url.startswith("rtsps://"):
+        args += ["-rtsp_transport", "tcp"]
+    return args + ["-i", url]
+
+
+def probe_resolution(url):
+    cmd = ["ffprobe", "-v", "error"]
+    if url.startswith("rtsp://") or url.startswith("rtsps://"):
+        cmd += ["-rtsp_transport", "tcp"]
+    cmd += ["-select_streams", "v:0", "-show_entries", "stream=width,height", "-of", "json", url]
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    stream = json.loads(out)["streams"][0]
+    return stream["width"], stream["height"]
+
+
+class FrameStream:
+    """Iterate over frames of `url` as (H, W, C) uint8 arrays.
+
+    Frames live in `buffers` preallocated slots that are reused round-robin. With a
+    `duration` every frame of the capture gets its own slot, so yielded frames stay
+    valid; without one, copy a frame if it must outlive the next `buffers` frames.
+
+    With `record_path` the same FFmpeg process also remuxes the original video packets
+    there (-c copy), which costs next to no CPU and is complete once iteration ends, or
+    once stop() has cut the capture short.
+    """
+
+    def __init__(self, url, fps, duration=None, resolution=None, pix_fmt="rgb24", buffers=None,
+                 record_path=None):
+        if resolution:
+            width, height = (int(v) for v in resolution.lower().split("x"))
+        else:
+            width, height = probe_resolution(url)
+        if buffers is None:
+            buffers = int((duration + 1) * fps) if duration else 16
+
+        self.shape = (height, width, CHANNELS[pix_fmt])
+        self.buffers = np.empty((buffers,) + self.shape, dtype=np.uint8)
+        self.returncode = None
+        self.count = 0
+
+        self.cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error"] + ffmpeg_input_args(url)
+        if duration:
+            self.cmd += ["-t", str(duration)]
+        self.cmd += ["-an", "-r", str(fps), "-s", f"{width}x{height}",
+                     "-f", "rawvideo", "-pix_fmt", pix_fmt, "pipe:1"]
+        self.record_path = record_path
+        if record_path:
+            self.cmd += ["-map", "0:v:0", "-c", "copy"]
+            if duration:
+                self.cmd += ["-t", str(duration)]
+            self.cmd += ["-y", record_path]
+
+        # Bounded so a slow consumer blocks the reader instead of having slots overwritten
+        self.ready = queue.Queue(maxsize=max(buffers - 1, 1))
+        # stdin is only used to send FFmpeg its "q" (quit) key, see stop()
+        self.proc = subprocess.Popen(self.cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.thread = threading.Thread(target=self._reader, daemon=True)
+        self.thread.start()
+
+    def _read_into(self, view):
+        filled = 0
+        while filled < len(view):
+            n = self.proc.stdout.readinto(view[filled:])
+            if not n:
+                return False
+            filled += n
+        return True
+
+    def _reader(self):
+        slot = 0
+        try:
+            while True:
+                view = memoryview(self.buffers[slot]).cast("B")
+                if not self._read_into(view):
+                    break
+                self.ready.put(slot)
+                slot = (slot + 1) % len(self.buffers)
+        finally:
+            self.proc.stdout.close()
+            self.returncode = self.proc.wait()
+            self.ready.put(None)
+
+    def __iter__(self):
+        while True:
+            slot = self.ready.get()
+            if slot is None:
+                return
+            self.count += 1
+            yield self.buffers[slot]
+
+    @property
+    def failed(self):
+        return self.returncode not in (None, 0) and self.count == 0
+
+    @property
+    def recorded(self):
+        """True once FFmpeg exited cleanly and left a non-empty stream-copy recording."""
+        return (self.record_path is not None and self.returncode == 0 and os.path.exists(self.record_path)
+                and os.path.getsize(self.record_path) > 0)
+
+    def _drain(self, deadline=None):
+        # Unblock the reader (and so FFmpeg) if it is waiting on a full queue
+        while self.thread.is_alive() and (deadline is None or time.time() < deadline):
+            try:
+                self.ready.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+    def stop(self, timeout=5):
+        """End the capture early but cleanly, so the recording is finalized and FFmpeg exits with 0."""
+        if self.proc.poll() is None:
+            try:
+                self.proc.stdin.write(b"q")
+                self.proc.stdin.flush()
+            except OSError:
+                pass  # it exited in the meantime
+        self._drain(time.time() + timeout)
+        self.close()
+
+    def close(self):
+        if self.proc.poll() is None:
+            self.proc.terminate()
+        self._drain()
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
@@ -1,48 +1,208 @@
-import requests
 import json
 import os
-from dotenv import load_dotenv
 import time
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from metrics import metrics
+from face_core import lazy_import
+
+# requests takes ~100 ms to import; scripts preload it while the camera connects
+requests = lazy_import("requests")
 
 load_dotenv()
 
 BASE_URL = os.getenv("HA_BASE_URL")
 TOKEN = os.getenv("HA_TOKEN")
 
-def post_to_ha(service, payload):
-    url = f"{BASE_URL}/api/services/{service}"
-    headers = {
-        "Authorization": f"Bearer {TOKEN}",
-        "Content-Type": "application/json",
-    }
-
-    for attempt in range(3):
-        try:
-            r = requests.post(url, headers=headers, json=payload, timeout=5)
-            if r.status_code == 200:
+
+class HAWebSocket:
+    """Calls HA services over one authenticated WebSocket (needs `pip install websocket-client`)."""
+
+    def __init__(self, base_url, token, timeout=5):
+        import websocket  # optional dependency, only needed for transport = "websocket"
+
+        self.websocket = websocket
+        self.url = base_url.replace("https://", "wss://").replace("http://", "ws://") + "/api/websocket"
+        self.token = token
+        self.timeout = timeout
+        self.ws = None
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        ws = self.websocket.create_connection(self.url, timeout=self.timeout)
+        json.loads(ws.recv())  # auth_required
+        ws.send(json.dumps({"type": "auth", "access_token": self.token}))
+        reply = json.loads(ws.recv())
+        if reply.get("type") != "auth_ok":
+            ws.close()
+            raise ConnectionError(f"HA WebSocket auth failed: {reply}")
+        self.ws = ws
+
+    def call_service(self, service, payload):
+        domain, name = service.split("/", 1)
+        with self.lock:
+            try:
+                if self.ws is None:
+                    self._connect()
+                msg_id = self.next_id
+                self.next_id += 1
+                self.ws.send(json.dumps({"id": msg_id, "type": "call_service", "domain": domain,
+                                         "service": name, "service_data": payload}))
+                while True:
+                    reply = json.loads(self.ws.recv())
+                    if reply.get("id") == msg_id:
+                        break
+            except Exception:
+                if self.ws is not None:
+                    self.ws.close()
+                self.ws = None
+                raise
+        if not reply.get("success"):
+            raise RuntimeError(f"HA rejected {service}: {reply.get('error')}")
+        return True
+
+
+class HAClient:
+    """Keep-alive HA client that delivers service calls on background threads.
+
+    Calls return futures immediately; retries back off on the worker thread, so the
+    detection code never sleeps waiting for HA. Calls passed together to send_chain()
+    run in order, separate chains run concurrently.
+    """
+
+    def __init__(self, base_url, token, retries=3, backoff=0.5, timeout=5, workers=4, transport="rest"):
+        self.base_url = base_url
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        })
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.ws = None
+        if transport == "websocket":
+            try:
+                self.ws = HAWebSocket(base_url, token, timeout)
+            except ImportError:
+                print("⚠️ websocket-client is not installed, falling back to the REST API.")
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ha")
+        self.pending = set()
+        self.lock = threading.Lock()
+
+    def _post_once(self, service, payload):
+        if self.ws is not None:
+            return self.ws.call_service(service, payload)
+        r = self.session.post(f"{self.base_url}/api/services/{service}", json=payload, timeout=self.timeout)
+        if r.status_code == 200:
+            return True
+        print(f"⚠️ HA responded with status {r.status_code}: {r.text}")
+        return False
+
+    def _post(self, service, payload):
+        start = time.perf_counter()
+        for attempt in range(self.retries):
+            try:
+                if self._post_once(service, payload):
+                    self._record(service, "ok", attempt + 1, start)
+                    return True
+            except Exception as e:
+                print(f"⚠️ Attempt {attempt+1} failed to reach HA: {e}")
+            if attempt + 1 < self.retries:
+                metrics.count("ha_retries", service=service)
+                time.sleep(self.backoff * 2 ** attempt)
+
+        print(f"❌ Failed to contact Home Assistant after {self.retries} attempts.")
+        self._record(service, "failed", self.retries, start)
+        return False
+
+    def _record(self, service, outcome, attempts, start):
+        seconds = time.perf_counter() - start
+        metrics.observe("notify", seconds)
+        metrics.count("ha_calls", service=service, outcome=outcome)
+        metrics.event("ha_call", service=service, outcome=outcome, attempts=attempts, ms=round(seconds * 1000, 1))
+
+    def _chain(self, calls):
+        return all([self._post(service, payload) for service, payload in calls])
+
+    def _submit(self, fn, *args):
+        future = self.executor.submit(fn, *args)
+        with self.lock:
+            self.pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self.lock:
+            self.pending.discard(future)
+
+    def post(self, service, payload):
+        return self._submit(self._post, service, payload)
+
+    def send_chain(self, calls):
+        """Deliver (service, payload) calls one after another; returns one future."""
+        return self._submit(self._chain, list(calls))
+
+    def flush(self, timeout=None):
+        """Wait for outstanding calls, e.g. before a one-shot script exits."""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self.lock:
+                pending = list(self.pending)
+            if not pending:
                 return True
-            else:
-                print(f"⚠️ HA responded with status {r.status_code}: {r.text}")
-        except Exception as e:
-            print(f"⚠️ Attempt {attempt+1} failed to reach HA: {e}")
-        time.sleep(2)
+            for future in pending:
+                remaining = None if deadline is None else max(0, deadline - time.time())
+                try:
+                    future.result(timeout=remaining)
+                except Exception:
+                    return False
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client(config=None):
+    global _client
+    with _client_lock:
+        if _client is None:
+            ha = (config or {}).get("home_assistant", {})
+            _client = HAClient(BASE_URL, TOKEN, retries=ha.get("retries", 3), backoff=ha.get("retry_backoff", 0.5),
+                               transport=ha.get("transport", "rest"))
+            atexit.register(_client.flush)
+        return _client
+
+
+def post_to_ha(service, payload):
+    """Blocking single call, kept for scripts that need the result."""
+    return get_client().post(service, payload).result()
 
-    print("❌ Failed to contact Home Assistant after 3 attempts.")
-    return False
 
 def send_to_home_assistant(config, result, video_path=None, name=None):
+    """Queue the HA updates for a detection result and return their futures without waiting."""
+    client = get_client(config)
+    futures = []
+    metrics.count("results", result=result)
+
     if result == "no_face":
         entity = config["home_assistant"].get("no_face_sensor")
         if entity:
             print(f"📩 Turning ON: {entity}")
-            post_to_ha("input_boolean/turn_on", {"entity_id": entity})
+            futures.append(client.post("input_boolean/turn_on", {"entity_id": entity}))
 
     elif result == "known":
         entity = config["home_assistant"].get("known_face_sensor")
 #        name_entity = config["home_assistant"].get("name_text_entity")
         if entity:
             print(f"📩 Turning ON: {entity}")
-            post_to_ha("input_boolean/turn_on", {"entity_id": entity})
+            futures.append(client.post("input_boolean/turn_on", {"entity_id": entity}))
 #        if name_entity and name:
 #            print(f"📩 Updating HA: {name_entity} = '{name}'")
 #            post_to_ha("input_text/set_value", {"entity_id": name_entity, "value": name})
@@ -51,16 +211,22 @@ def send_to_home_assistant(config, result, video_path=None, name=None):
         name_entity = config["home_assistant"].get("name_text_entity")
         if name_entity and name:
             print(f"📩 Updating HA: {name_entity} = '{name}'")
-            post_to_ha("input_text/set_value", {"entity_id": name_entity, "value": name})      
+            futures.append(client.post("input_text/set_value", {"entity_id": name_entity, "value": name}))
 
     elif result == "unknown":
+        # The unknown-face automation reads the video name, so it must be set before the boolean flips
+        calls = []
         video_name_entity = config["home_assistant"].get("latest_unknown_video_text")
         filename = os.path.basename(video_path) if video_path else None
         if video_name_entity and filename:
             print(f"📝 Updating {video_name_entity} = '{filename}'")
-            post_to_ha("input_text/set_value", {"entity_id": video_name_entity, "value": filename})
+            calls.append(("input_text/set_value", {"entity_id": video_name_entity, "value": filename}))
 
         entity = config["home_assistant"].get("unknown_face_sensor")
         if entity:
             print(f"📩 Turning ON: {entity}")
-            post_to_ha("input_boolean/turn_on", {"entity_id": entity})
+            calls.append(("input_boolean/turn_on", {"entity_id": entity}))
+        if calls:
+            futures.append(client.send_chain(calls))
+
+    return futures
@@ -1,10 +1,20 @@
 import os
 import cv2
-import pickle
+import time
+import hashlib
+import numpy as np
 import face_recognition
+import face_store
+import face_index
+import face_prototypes
+import face_detectors
+from frame_analysis import BatchEncoder, locate_faces
+import json
 from dotenv import load_dotenv
 import argparse
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 # === Load env ===
 load_dotenv()
@@ -17,95 +27,328 @@ if not USERNAME:
 # === Paths ===
 BASE_DIR = f"/home/{USERNAME}/face_project"
 KNOWN_FACES_DIR = os.path.join(BASE_DIR, "known_faces")
-ENCODINGS_PATH = os.path.join(BASE_DIR, "encodings", "faces.pkl")
+ENCODINGS_PATH = os.path.join(BASE_DIR, "encodings", "faces.bin")
 
-def encode_person(person_name):
-    person_dir = os.path.join(KNOWN_FACES_DIR, person_name)
-    if not os.path.isdir(person_dir):
-        print(f"❌ No such person folder: {person_name}")
-        return [], []
+# === ANN index and prototype options, shared with the detectors ===
+INDEX_OPTIONS = {}
+PROTOTYPE_OPTIONS = {}
+ENCODE_BATCH = 32
+if os.path.exists("config.json"):
+    with open("config.json") as f:
+        config = json.load(f)
+    # Known faces are located with the same backend as the camera frames
+    face_detectors.configure(config)
+    recognition = config.get("recognition", {})
+    INDEX_OPTIONS = recognition.get("index", {})
+    PROTOTYPE_OPTIONS = recognition.get("prototypes", {})
+    ENCODE_BATCH = recognition.get("encode_batch", ENCODE_BATCH)
 
-    encodings = []
-    names = []
-    print(f"👤 Adding person: {person_name}")
+def load_and_locate(img_path):
+    """(image, location of its first face or None)"""
+    image = face_recognition.load_image_file(img_path)
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    locations = locate_faces(rgb)
+    return rgb, locations[0] if locations else None
+
+def encode_image(img_path):
+    """Return the first face encoding found in an image, or None if it has no face."""
+    rgb, location = load_and_locate(img_path)
+    if location is None:
+        return None
+    return face_recognition.face_encodings(rgb, known_face_locations=[location])[0]
+
+def timed_encode(img_path):
+    """Worker entry point: (encoding or None, error message or None, seconds)."""
+    start = time.time()
+    try:
+        return encode_image(img_path), None, time.time() - start
+    except Exception as e:
+        return None, str(e), time.time() - start
+
+def timed_encode_batch(img_paths, batch_size=ENCODE_BATCH):
+    """Worker entry point for a chunk of images: [(encoding or None, error or None, seconds)].
 
-    for file_name in os.listdir(person_dir):
-        img_path = os.path.join(person_dir, file_name)
+    Images are loaded and located one at a time as the BatchEncoder asks for them, so only
+    the current image is held in memory, and their faces are embedded together. An image's
+    seconds are its own load and locate time plus its share of the embedding time. If the
+    batch fails, the images it had not encoded yet are retried one by one with timed_encode.
+    """
+    results = [None] * len(img_paths)
+    locate_seconds = [0.0] * len(img_paths)
+
+    def located():
+        for i, img_path in enumerate(img_paths):
+            image_start = time.time()
+            try:
+                rgb, location = load_and_locate(img_path)
+            except Exception as e:
+                rgb, location = None, None
+                results[i] = (None, str(e))
+            locate_seconds[i] = time.time() - image_start
+            if location is not None:
+                yield i, rgb, [location]
+            elif results[i] is None:
+                results[i] = (None, None)
+
+    start = time.time()
+    encoded = {}
+    try:
+        for i, encodings in BatchEncoder(batch_size).encode(located()):
+            encoded[i] = encodings[0]
+    except Exception as e:
+        print(f"⚠️ Batch encoding failed ({e}), encoding the rest of the chunk image by image.")
+    # Whatever was not loading or locating went into embedding the faces that came out
+    embed_share = max(0.0, time.time() - start - sum(locate_seconds)) / max(1, len(encoded))
+    out = []
+    for i, img_path in enumerate(img_paths):
+        if i in encoded:
+            out.append((encoded[i], None, locate_seconds[i] + embed_share))
+        elif results[i] is not None:
+            out.append(results[i] + (locate_seconds[i],))
+        else:
+            out.append(timed_encode(img_path))
+    return out
+
+def encode_isolated(img_path):
+    with ProcessPoolExecutor(1) as pool:
         try:
-            image = face_recognition.load_image_file(img_path)
-            rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            locations = face_recognition.face_locations(rgb)
+            return pool.submit(timed_encode, img_path).result()
+        except BrokenProcessPool:
+            return None, "worker crashed", 0.0
+
+def encode_images(items, workers=1, batch_size=ENCODE_BATCH):
+    """Yield (rel, encoding, error, seconds) for (rel, path) items, in input order.
 
-            if not locations:
-                print(f"❌ No face found in {file_name}, skipping.")
-                continue
+    Images are encoded in chunks of up to batch_size, so the embedding network runs once
+    per chunk. With workers > 1 the chunks are decoded, detected and encoded in a process
+    pool. If a worker dies (dlib can crash hard on corrupt files) every image of the chunk
+    being collected is retried on its own and everything after it is resubmitted to a
+    fresh pool.
+    """
+    items = list(items)
+    # Small jobs still get one chunk per worker
+    size = max(1, min(batch_size, -(-len(items) // max(1, workers))))
+    chunks = [items[i:i + size] for i in range(0, len(items), size)]
+    if workers <= 1:
+        for chunk in chunks:
+            for (rel, _), result in zip(chunk, timed_encode_batch([path for _, path in chunk], batch_size)):
+                yield (rel,) + result
+        return
+
+    start = 0
+    while start < len(chunks):
+        pool = ProcessPoolExecutor(workers)
+        futures = [pool.submit(timed_encode_batch, [path for _, path in chunk], batch_size)
+                   for chunk in chunks[start:]]
+        broken = False
+        for i, future in enumerate(futures):
+            chunk = chunks[start + i]
+            try:
+                results = future.result()
+            except BrokenProcessPool:
+                broken = True
+                results = [encode_isolated(img_path) for _, img_path in chunk]
+            for (rel, _), result in zip(chunk, results):
+                yield (rel,) + result
+            if broken:
+                start += i + 1
+                break
+        pool.shutdown(cancel_futures=True)
+        if not broken:
+            return
 
-            encoding = face_recognition.face_encodings(rgb, known_face_locations=locations)[0]
-            encodings.append(encoding)
-            names.append(person_name)
-            print(f"✅ Encoded face from {file_name}")
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-        except Exception as e:
-            print(f"❌ Error processing {file_name}: {e}")
+def is_unchanged(entry, path):
+    if entry is None:
+        return False
+    st = os.stat(path)
+    if entry["size"] != st.st_size:
+        return False
+    if entry["mtime"] == st.st_mtime:
+        return True
+    # Touched but maybe not modified (e.g. copied back from a backup)
+    if entry["sha256"] == file_hash(path):
+        entry["mtime"] = st.st_mtime
+        return True
+    return False
 
-    return encodings, names
+def scan_known_faces(persons=None):
+    """Return (person folders, {"person/file": path}) under KNOWN_FACES_DIR."""
+    folders = set()
+    images = {}
+    for person in sorted(os.listdir(KNOWN_FACES_DIR)):
+        person_dir = os.path.join(KNOWN_FACES_DIR, person)
+        if not os.path.isdir(person_dir) or (persons and person not in persons):
+            continue
+        folders.add(person)
+        for file_name in sorted(os.listdir(person_dir)):
+            img_path = os.path.join(person_dir, file_name)
+            if os.path.isfile(img_path):
+                images[f"{person}/{file_name}"] = img_path
+    return folders, images
 
 def load_encodings():
-    if not os.path.exists(ENCODINGS_PATH):
-        return [], []
-    with open(ENCODINGS_PATH, "rb") as f:
-        data = pickle.load(f)
-        return data["encodings"], data["names"]
-
-def save_encodings(encodings, names):
-    os.makedirs(os.path.dirname(ENCODINGS_PATH), exist_ok=True)
-    with open(ENCODINGS_PATH, "wb") as f:
-        pickle.dump({"encodings": encodings, "names": names}, f)
-    print(f"💾 Saved {len(encodings)} encodings to {ENCODINGS_PATH}")
+    return face_store.load_encodings(ENCODINGS_PATH)
+
+def save_encodings(encodings, names, metadata=None):
+    meta = face_store.save_encodings(ENCODINGS_PATH, encodings, names, metadata)
+    print(f"💾 Saved {len(names)} encodings to {ENCODINGS_PATH}")
+    return meta
+
+def refresh_index(encodings, keep, previous_generation, generation):
+    """Keep faces.index.npz in step with a store rewritten as old rows [keep] + new rows."""
+    if INDEX_OPTIONS.get("enabled", True):
+        face_index.update_index(ENCODINGS_PATH, encodings, keep, previous_generation, generation,
+                                INDEX_OPTIONS.get("min_encodings", 20_000))
+    # Prototypes are rebuilt only if they were compacted before; they would be stale otherwise
+    if os.path.exists(face_prototypes.prototypes_path(ENCODINGS_PATH)):
+        compact(report=False)
+
+def sync(persons=None, full=False, workers=1):
+    """Bring the DB in line with known_faces/, encoding only new or changed images.
+
+    Every encoding remembers its source image; the store metadata keeps each image's
+    sha256, size and mtime (and whether it had a face), so unchanged images are skipped,
+    rows of deleted images are dropped and re-running never appends duplicates.
+    """
+    start = time.time()
+    encodings, names, metadata = face_store.load_store(ENCODINGS_PATH)
+    sources = metadata.get("sources") or [None] * len(names)
+    files = metadata.get("files", {})
+    folders, images = scan_known_faces(persons)
+
+    def in_scope(person):
+        return persons is None or person in persons
+
+    unchanged = set() if full else {rel for rel, path in images.items() if is_unchanged(files.get(rel), path)}
+
+    keep = []
+    for i, (name, source) in enumerate(zip(names, sources)):
+        if source is None:
+            # Rows without a source (migrated faces.pkl) are rebuilt from the person's folder
+            if name not in folders:
+                keep.append(i)
+        elif not in_scope(source.split("/")[0]) or source in unchanged:
+            keep.append(i)
+
+    removed_files = [rel for rel in files if in_scope(rel.split("/")[0]) and rel not in images]
+    for rel in removed_files:
+        del files[rel]
 
-def remove_person(person_name):
-    encodings, names = load_encodings()
     new_encodings = []
     new_names = []
-    removed = 0
+    new_sources = []
+    todo = [rel for rel in images if rel not in unchanged]
+    encode_start = time.time()
+    for rel, encoding, error, seconds in encode_images(((rel, images[rel]) for rel in todo), workers):
+        img_path = images[rel]
+        person = rel.split("/")[0]
+        if error:
+            print(f"❌ Error processing {rel}: {error}")
+            continue
 
-    for i, name in enumerate(names):
-        if name != person_name:
-            new_encodings.append(encodings[i])
-            new_names.append(name)
-        else:
-            removed += 1
+        st = os.stat(img_path)
+        files[rel] = {"sha256": file_hash(img_path), "size": st.st_size, "mtime": st.st_mtime,
+                      "faces": int(encoding is not None)}
+        if encoding is None:
+            print(f"❌ No face found in {rel}, skipping.")
+            continue
+        new_encodings.append(encoding)
+        new_names.append(person)
+        new_sources.append(rel)
+        print(f"✅ Encoded face from {rel} ({seconds:.2f}s)")
+
+    if todo:
+        elapsed = time.time() - encode_start
+        print(f"⚡ {len(todo)} image(s) in {elapsed:.1f}s ({len(todo) / max(elapsed, 1e-9):.1f} images/sec, "
+              f"{workers} worker(s))")
+
+    dropped = len(names) - len(keep)
+    encodings = np.concatenate([encodings[keep], np.asarray(new_encodings, dtype=np.float32).reshape(-1, 128)])
+    names = [names[i] for i in keep] + new_names
+    sources = [sources[i] for i in keep] + new_sources
+    meta = save_encodings(encodings, names, {"sources": sources, "files": files})
+    refresh_index(encodings, keep, metadata.get("generation"), meta["generation"])
+
+    print(f"🧮 {len(unchanged)} unchanged, {len(todo)} processed, {len(removed_files)} deleted image(s), "
+          f"{dropped} stale encoding(s) dropped in {time.time() - start:.1f}s")
+
+def remove_person(person_name):
+    encodings, names, metadata = face_store.load_store(ENCODINGS_PATH)
+    sources = metadata.get("sources") or [None] * len(names)
+    files = {rel: entry for rel, entry in metadata.get("files", {}).items() if rel.split("/")[0] != person_name}
+    keep = [i for i, name in enumerate(names) if name != person_name]
+    removed = len(names) - len(keep)
 
     if removed == 0:
         print(f"❗ No encodings found for '{person_name}'.")
     else:
         print(f"🗑️ Removed {removed} encodings for '{person_name}'.")
 
-    save_encodings(new_encodings, new_names)
-
-def add_all():
-    all_encodings = []
-    all_names = []
-    for person in os.listdir(KNOWN_FACES_DIR):
-        encs, nms = encode_person(person)
-        all_encodings.extend(encs)
-        all_names.extend(nms)
-    save_encodings(all_encodings, all_names)
-
-def add_person(person_name):
-    encs, nms = encode_person(person_name)
-    if not encs:
-        print(f"❌ No encodings for {person_name}. Skipping.")
+    meta = save_encodings(encodings[keep], [names[i] for i in keep],
+                          {"sources": [sources[i] for i in keep], "files": files})
+    refresh_index(encodings[keep], keep, metadata.get("generation"), meta["generation"])
+
+def add_all(full=False, workers=1):
+    sync(full=full, workers=workers)
+
+def add_person(person_name, full=False, workers=1):
+    if not os.path.isdir(os.path.join(KNOWN_FACES_DIR, person_name)):
+        print(f"❌ No such person folder: {person_name}")
+        return
+    print(f"👤 Adding person: {person_name}")
+    sync([person_name], full=full, workers=workers)
+
+def has_encodings():
+    return os.path.exists(ENCODINGS_PATH) or os.path.exists(face_store.legacy_pickle_path(ENCODINGS_PATH))
+
+def migrate():
+    legacy = face_store.legacy_pickle_path(ENCODINGS_PATH)
+    if not os.path.exists(legacy):
+        print(f"❌ {legacy} does not exist.")
         return
+    face_store.migrate_pickle(legacy, ENCODINGS_PATH)
+
+def reindex():
+    """Retrain the ANN index from scratch, e.g. after changing recognition.index options."""
+    encodings, names, metadata = face_store.load_store(ENCODINGS_PATH)
+    index = face_index.FaceIndex.train(encodings, generation=metadata.get("generation"))
+    index.save(ENCODINGS_PATH)
+    print(f"🗂️ Built face index: {len(index.centroids)} lists over {len(index)} encodings")
 
-    existing_encodings, existing_names = load_encodings()
-    existing_encodings.extend(encs)
-    existing_names.extend(nms)
-    save_encodings(existing_encodings, existing_names)
+def compact(report=True):
+    """Write faces.prototypes.bin: at most recognition.prototypes.max_per_person rows per person."""
+    max_prototypes = PROTOTYPE_OPTIONS.get("max_per_person", 10)
+    before, after = face_prototypes.build_prototypes(ENCODINGS_PATH, max_prototypes,
+                                                     PROTOTYPE_OPTIONS.get("centroid", True))
+    proto_path = face_prototypes.prototypes_path(ENCODINGS_PATH)
+    print(f"🧩 Compacted {before} encodings to {after} prototypes (max {max_prototypes} per person)")
+    if not report:
+        return
+    full_size = os.path.getsize(face_store.store_path(ENCODINGS_PATH))
+    proto_size = os.path.getsize(proto_path)
+    if after < before and proto_size < full_size:
+        print(f"📦 {full_size / 1024:.1f} KB -> {proto_size / 1024:.1f} KB "
+              f"({1 - proto_size / full_size:.0%} smaller) in {proto_path}")
+    else:
+        print(f"📦 Nothing to compact: no person has more than {max_prototypes} encodings ({proto_path})")
+    _, names = load_encodings()
+    _, proto_names, _ = face_store.read_store(proto_path)
+    kept = Counter(proto_names)
+    for name, qty in sorted(Counter(names).items()):
+        print(f"  - {name}: {qty} -> {kept[name]}")
+    if not PROTOTYPE_OPTIONS.get("enabled", False):
+        print("ℹ️ Set recognition.prototypes.enabled in config.json to match against the prototypes.")
 
 def show_stats():
-    if not os.path.exists(ENCODINGS_PATH):
-        print("❌ faces.pkl does not exist.")
+    if not has_encodings():
+        print("❌ faces.bin does not exist.")
         return
 
     _, names = load_encodings()
@@ -118,34 +361,46 @@ def show_stats():
     print(f"🧠 Total encodings: {len(names)}")
 
 def list_names():
-    if not os.path.exists(ENCODINGS_PATH):
-        print("❌ faces.pkl does not exist.")
+    if not has_encodings():
+        print("❌ faces.bin does not exist.")
         return
 
     _, names = load_encodings()
     persons = sorted(set(names))
-    print("📇 Persons in faces.pkl:")
+    print("📇 Persons in faces.bin:")
     for person in persons:
         print(f"  - {person}")
 
 # === CLI ===
-parser = argparse.ArgumentParser(description="Manage known face encodings")
-group = parser.add_mutually_exclusive_group(required=True)
-group.add_argument("--add-all", action="store_true", help="Bulk add all persons")
-group.add_argument("--add", metavar="PERSON", help="Add one person")
-group.add_argument("--remove", metavar="PERSON", help="Remove one person")
-group.add_argument("--stats", action="store_true", help="Show stats from faces.pkl")
-group.add_argument("--list", action="store_true", help="List all persons in faces.pkl")
-
-args = parser.parse_args()
-
-if args.add_all:
-    add_all()
-elif args.add:
-    add_person(args.add)
-elif args.remove:
-    remove_person(args.remove)
-elif args.stats:
-    show_stats()
-elif args.list:
-    list_names()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage known face encodings")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--add-all", action="store_true", help="Bulk add all persons")
+    group.add_argument("--add", metavar="PERSON", help="Add one person")
+    group.add_argument("--remove", metavar="PERSON", help="Remove one person")
+    group.add_argument("--stats", action="store_true", help="Show stats from faces.bin")
+    group.add_argument("--list", action="store_true", help="List all persons in faces.bin")
+    group.add_argument("--migrate", action="store_true", help="Convert an existing faces.pkl to faces.bin")
+    group.add_argument("--reindex", action="store_true", help="Rebuild the ANN index for large galleries")
+    group.add_argument("--compact", action="store_true", help="Keep a few representative prototypes per person")
+    parser.add_argument("--full", action="store_true", help="Re-encode every image instead of only new or changed ones")
+    parser.add_argument("--workers", type=int, default=1, help="Encode images in N parallel processes")
+
+    args = parser.parse_args()
+
+    if args.add_all:
+        add_all(args.full, args.workers)
+    elif args.add:
+        add_person(args.add, args.full, args.workers)
+    elif args.remove:
+        remove_person(args.remove)
+    elif args.stats:
+        show_stats()
+    elif args.list:
+        list_names()
+    elif args.migrate:
+        migrate()
+    elif args.reindex:
+        reindex()
+    elif args.compact:
+        compact()
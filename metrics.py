@@ -0,0 +1,280 @@
+# In-process metrics for the detection pipeline.
+# Stage timings (histograms), counters and gauges are kept in memory and rendered as
+# Prometheus text or JSON on demand (face_daemon.py serves them at /metrics); events such
+# as a finished detection or an HA call are appended as JSON lines to paths.log_file.
+# A single run can also be profiled with cProfile or a low-overhead stack sampler.
+import os
+import sys
+import json
+import time
+import atexit
+import cProfile
+import pstats
+import resource
+import threading
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack, contextmanager
+from face_core import config_path
+
+# Histogram buckets in seconds, from a single match up to a whole capture
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Recent samples per stage kept for the percentiles in the JSON view
+RECENT = 1024
+
+
+def rss_bytes():
+    """Current resident set size, or the peak where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else None
+
+
+def label_text(labels):
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}" if labels else ""
+
+
+class EventLog:
+    """Appends one JSON object per line; safe to share between threads."""
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = source
+        self.lock = threading.Lock()
+        self.file = None
+
+    def write(self, event, **fields):
+        record = {"ts": round(time.time(), 3), "source": self.source, "pid": os.getpid(), "event": event, **fields}
+        line = json.dumps(record, default=str) + "\n"
+        with self.lock:
+            try:
+                if self.file is None:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    self.file = open(self.path, "a", buffering=1)
+                self.file.write(line)
+            except OSError as e:
+                print(f"⚠️ Could not write to {self.path}: {e}")
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.recent = defaultdict(lambda: deque(maxlen=RECENT))
+        self.gauge_sources = []
+        self.events = None
+
+    def count(self, name, value=1, **labels):
+        with self.lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            hist = self.histograms.get(stage)
+            if hist is None:
+                hist = self.histograms[stage] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    hist["buckets"][i] += 1
+            hist["sum"] += seconds
+            hist["count"] += 1
+            self.recent[stage].append(seconds)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def add_gauges(self, fn):
+        """Register fn() -> [(name, {labels}, value)], read whenever metrics are exported."""
+        self.gauge_sources.append(fn)
+
+    def gauges(self):
+        out = [("resident_memory_bytes", {}, rss_bytes()), ("uptime_seconds", {}, time.time() - self.started)]
+        for fn in self.gauge_sources:
+            try:
+                out.extend(fn())
+            except Exception as e:
+                print(f"⚠️ Gauge source failed: {e}")
+        return out
+
+    def event(self, event, **fields):
+        if self.events is not None:
+            self.events.write(event, **fields)
+
+    def snapshot(self):
+        """JSON-friendly view, e.g. for a Home Assistant REST sensor."""
+        with self.lock:
+            counters = {name + label_text(labels): value for (name, labels), value in self.counters.items()}
+            stages = {}
+            for stage, hist in self.histograms.items():
+                recent = list(self.recent[stage])
+                stages[stage] = {"count": hist["count"], "total_ms": round(hist["sum"] * 1000, 1),
+                                 **{f"p{int(q * 100)}_ms": round(percentile(recent, q) * 1000, 2)
+                                    for q in (0.5, 0.9, 0.99)}}
+        gauges = {name + label_text(tuple(sorted(labels.items()))): value for name, labels, value in self.gauges()}
+        return {"counters": counters, "stages": stages, "gauges": gauges}
+
+    def prometheus(self, prefix="face_"):
+        lines = []
+        with self.lock:
+            by_name = defaultdict(list)
+            for (name, labels), value in sorted(self.counters.items()):
+                by_name[name].append((labels, value))
+            for name, series in by_name.items():
+                lines.append(f"# TYPE {prefix}{name}_total counter")
+                lines += [f"{prefix}{name}_total{label_text(labels)} {value:g}" for labels, value in series]
+
+            lines.append(f"# TYPE {prefix}stage_seconds histogram")
+            for stage, hist in sorted(self.histograms.items()):
+                for bound, count in zip(BUCKETS, hist["buckets"]):
+                    lines.append(f'{prefix}stage_seconds_bucket{{stage="{stage}",le="{bound:g}"}} {count}')
+                lines.append(f'{prefix}stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist["count"]}')
+                lines.append(f'{prefix}stage_seconds_sum{{stage="{stage}"}} {hist["sum"]:.6f}')
+                lines.append(f'{prefix}stage_seconds_count{{stage="{stage}"}} {hist["count"]}')
+
+        by_name = defaultdict(list)
+        for name, labels, value in self.gauges():
+            by_name[name].append((tuple(sorted(labels.items())), value))
+        for name, series in by_name.items():
+            lines.append(f"# TYPE {prefix}{name} gauge")
+            lines += [f"{prefix}{name}{label_text(labels)} {float(value):g}" for labels, value in series]
+        return "\n".join(lines) + "\n"
+
+    def run_summary(self):
+        """Counters and per-stage totals of this process, for a one-shot script's final event."""
+        with self.lock:
+            counters = {name + label_text(labels): value for (name, labels), value in self.counters.items()}
+            stages = {stage: {"count": hist["count"], "total_ms": round(hist["sum"] * 1000, 1)}
+                      for stage, hist in self.histograms.items()}
+        return {"counters": counters, "stages": stages, "elapsed_s": round(time.time() - self.started, 3),
+                "peak_rss_mb": round(peak_rss_bytes() / 1e6, 1)}
+
+
+metrics = Metrics()
+
+
+def configure(config, username, source=None, summary=True):
+    """Point the event log at paths.log_file; with `summary` a "run" event is logged at exit."""
+    options = config.get("metrics", {})
+    if options.get("event_log", True) and config.get("paths", {}).get("log_file"):
+        path = config_path(config, "log_file", username)
+        metrics.events = EventLog(path, source or os.path.basename(sys.argv[0]))
+        if summary:
+            atexit.register(lambda: metrics.event("run", **metrics.run_summary()))
+    return options
+
+
+class StackSampler:
+    """Counts the Python stacks of every other thread every `interval` seconds."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def save(self, path):
+        # Collapsed stacks, the input format of flamegraph.pl and speedscope
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top(self, limit=10):
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [(name, count / total) for name, count in leaves.most_common(limit)]
+
+
+def profile_mode(options):
+    """cprofile, sample or None; FACE_PROFILE overrides metrics.profile for a single run."""
+    return os.getenv("FACE_PROFILE") or options.get("profile")
+
+
+@contextmanager
+def profiled(mode, out_dir="/tmp", name="run", interval_ms=5):
+    """Profile the enclosed block with cProfile or the stack sampler; no-op if mode is falsy."""
+    if not mode:
+        yield None
+        return
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    os.makedirs(out_dir, exist_ok=True)
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+            path = os.path.join(out_dir, f"{name}_{stamp}.prof")
+            profiler.dump_stats(path)
+            print(f"🔬 cProfile written to {path}; top functions by cumulative time:")
+            pstats.Stats(profiler, stream=sys.stdout).sort_stats("cumulative").print_stats(15)
+            metrics.event("profile", mode=mode, path=path)
+    elif mode == "sample":
+        sampler = StackSampler(interval_ms / 1000).start()
+        try:
+            yield sampler
+        finally:
+            sampler.stop()
+            path = os.path.join(out_dir, f"{name}_{stamp}.stacks")
+            sampler.save(path)
+            print(f"🔬 {sampler.samples} stack samples written to {path}; hottest functions:")
+            for func, share in sampler.top():
+                print(f"  - {share:6.1%} {func}")
+            metrics.event("profile", mode=mode, path=path, samples=sampler.samples)
+    else:
+        print(f"⚠️ Unknown profile mode {mode!r}, expected cprofile or sample.")
+        yield None
+
+
+def profile_until_exit(options, name):
+    """For one-shot scripts: profile from here until the interpreter exits."""
+    mode = profile_mode(options)
+    if mode:
+        stack = ExitStack()
+        stack.enter_context(profiled(mode, options.get("profile_dir", "/tmp"), name,
+                                     options.get("sample_interval_ms", 5)))
+        atexit.register(stack.close)
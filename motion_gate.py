@@ -0,0 +1,95 @@
+# Cheap change detection in front of face detection.
+# Each frame is compared, downscaled and blurred, against the last frame that was let
+# through. Unchanged frames are skipped; changed ones are analyzed only inside the
+# regions that moved (padded, since a face sits above a moving body).
+import numpy as np
+from face_core import lazy_import
+
+cv2 = lazy_import("cv2")
+
+
+class MotionGate:
+    def __init__(self, enabled=True, scale_width=160, pixel_threshold=25, min_changed_ratio=0.002,
+                 roi_padding=0.5, max_roi_ratio=0.5):
+        self.enabled = enabled
+        self.scale_width = scale_width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_ratio = min_changed_ratio
+        self.roi_padding = roi_padding
+        self.max_roi_ratio = max_roi_ratio
+        self.reference = None
+        self.analyzed = 0
+        self.skipped = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(**config.get("motion", {}))
+
+    def _small(self, frame):
+        height, width = frame.shape[:2]
+        scale = self.scale_width / width
+        small = cv2.resize(frame, (self.scale_width, max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            # Channel order does not matter for differencing
+            small = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0), scale
+
+    def _regions(self, mask, scale, height, width):
+        mask = cv2.dilate(mask, None, iterations=2)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        boxes = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            pad = self.roi_padding * max(w, h)
+            boxes.append([max(0, int((y - pad) / scale)), min(width, int((x + w + pad) / scale)),
+                          min(height, int((y + h + pad) / scale)), max(0, int((x - pad) / scale))])
+
+        # Merge overlapping boxes so no face is detected twice
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(boxes)):
+                for j in range(i + 1, len(boxes)):
+                    a, b = boxes[i], boxes[j]
+                    if a[0] < b[2] and b[0] < a[2] and a[3] < b[1] and b[3] < a[1]:
+                        boxes[i] = [min(a[0], b[0]), max(a[1], b[1]), max(a[2], b[2]), min(a[3], b[3])]
+                        del boxes[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+
+        area = sum((bottom - top) * (right - left) for top, right, bottom, left in boxes)
+        if area > self.max_roi_ratio * height * width:
+            return None
+        return [tuple(box) for box in boxes] or None
+
+    def check(self, frame):
+        """Return (analyze, regions).
+
+        analyze is False for frames that did not change since the last analyzed one.
+        regions is a list of (top, right, bottom, left) boxes to search for faces, or
+        None to search the whole frame.
+        """
+        if not self.enabled:
+            self.analyzed += 1
+            return True, None
+
+        small, scale = self._small(frame)
+        if self.reference is None or self.reference.shape != small.shape:
+            self.reference = small
+            self.analyzed += 1
+            return True, None
+
+        mask = (cv2.absdiff(small, self.reference) > self.pixel_threshold).astype(np.uint8)
+        if mask.mean() < self.min_changed_ratio:
+            self.skipped += 1
+            return False, None
+
+        self.reference = small
+        self.analyzed += 1
+        height, width = frame.shape[:2]
+        return True, self._regions(mask, scale, height, width)
+
+    def report(self):
+        print(f"🎞️ Motion gate: {self.analyzed} frame(s) analyzed, {self.skipped} skipped as unchanged")
@@ -0,0 +1,101 @@
+# One fixed-size recognition process pool shared by every camera.
+# Each camera submits into its own queue; a dispatcher thread hands the pool one job at a
+# time, taking cameras round-robin, so a camera with a burst of frames waits its turn
+# instead of filling the pool ahead of the others.
+import os
+import time
+import threading
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+
+class RecognitionPool:
+    def __init__(self, workers=None, max_pending=None):
+        self.workers = workers or os.cpu_count() or 1
+        # Jobs handed to the pool at once; the rest wait in the per-camera queues
+        self.max_pending = max_pending or self.workers
+        self.executor = ProcessPoolExecutor(self.workers)
+        # Fork the workers now, before capture threads exist that a fork could catch holding a lock
+        for future in [self.executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+        self.queues = OrderedDict()
+        self.cond = threading.Condition()
+        self.in_flight = 0
+        self.running = True
+        self.jobs = defaultdict(int)
+        self.wait = defaultdict(float)
+        self.busy = defaultdict(float)
+        self.thread = threading.Thread(target=self._dispatch, daemon=True)
+        self.thread.start()
+
+    def submit(self, camera, fn, *args):
+        """Queue fn(*args) for `camera`; returns a Future."""
+        future = Future()
+        with self.cond:
+            self.queues.setdefault(camera, deque()).append((future, fn, args, time.perf_counter()))
+            self.cond.notify_all()
+        return future
+
+    def _next(self):
+        # Rotate so the camera served last goes to the back of the line
+        for _ in range(len(self.queues)):
+            camera, queue = next(iter(self.queues.items()))
+            self.queues.move_to_end(camera)
+            if queue:
+                return camera, queue.popleft()
+        return None
+
+    def _dispatch(self):
+        while True:
+            with self.cond:
+                while self.running and (self.in_flight >= self.max_pending or not any(self.queues.values())):
+                    self.cond.wait()
+                if not self.running:
+                    return
+                camera, (future, fn, args, queued) = self._next()
+                self.in_flight += 1
+            if not future.set_running_or_notify_cancel():
+                self._finished(camera, queued, None, None, None)
+                continue
+            started = time.perf_counter()
+            try:
+                inner = self.executor.submit(fn, *args)
+            except RuntimeError as e:  # shut down meanwhile
+                future.set_exception(e)
+                self._finished(camera, queued, None, None, None)
+                continue
+            inner.add_done_callback(lambda done, c=camera, f=future, q=queued, s=started: self._finished(c, q, s, f, done))
+
+    def _finished(self, camera, queued, started, future, done):
+        with self.cond:
+            self.in_flight -= 1
+            if started is not None:
+                self.jobs[camera] += 1
+                self.wait[camera] += started - queued
+                self.busy[camera] += time.perf_counter() - started
+            self.cond.notify_all()
+        if done is None:
+            return
+        if done.exception() is not None:
+            future.set_exception(done.exception())
+        else:
+            future.set_result(done.result())
+
+    def stats(self):
+        with self.cond:
+            return {camera: {"jobs": self.jobs[camera],
+                             "queued": len(self.queues.get(camera, ())),
+                             "avg_wait_ms": round(self.wait[camera] / max(self.jobs[camera], 1) * 1000, 1),
+                             "avg_run_ms": round(self.busy[camera] / max(self.jobs[camera], 1) * 1000, 1)}
+                    for camera in self.queues}
+
+    def shutdown(self):
+        with self.cond:
+            self.running = False
+            for queue in self.queues.values():
+                for future, _, _, _ in queue:
+                    future.cancel()
+                queue.clear()
+            self.cond.notify_all()
+        self.thread.join()
+        self.executor.shutdown(cancel_futures=True)
@@ -0,0 +1,20 @@
+from decision_engine import DecisionEngine
+
+
+def test_budget_starts_at_first_frame():
+    engine = DecisionEngine(max_seconds=5.0)
+    engine.start(now=0.0)
+    # The camera took longer to connect than the whole budget
+    assert engine.update([], now=5.5) is None
+    assert engine.skip(now=6.0) is None
+    decision = engine.skip(now=10.5)
+    assert decision.reason == "budget"
+    assert decision.result == "no_face"
+    assert decision.seconds == 10.5
+
+
+def test_budget_counts_from_first_frame_without_connect_delay():
+    engine = DecisionEngine(max_seconds=1.0)
+    engine.start(now=0.0)
+    assert engine.update([], now=0.0) is None
+    assert engine.update([], now=1.0).reason == "budget"
@@ -0,0 +1,26 @@
+import numpy as np
+from face_prototypes import compact, person_prototypes
+
+
+def test_small_person_keeps_every_row_without_mean():
+    encodings = np.random.default_rng(0).normal(size=(6, 128)).astype(np.float32)
+    kept, mean = person_prototypes(encodings, max_prototypes=10)
+    assert kept == list(range(6))
+    assert mean is None
+
+
+def test_clustered_person_gets_mean():
+    encodings = np.random.default_rng(0).normal(size=(30, 128)).astype(np.float32)
+    kept, mean = person_prototypes(encodings, max_prototypes=5)
+    assert 0 < len(kept) <= 5
+    assert mean is not None
+
+
+def test_compact_never_grows():
+    rng = np.random.default_rng(1)
+    encodings = rng.normal(size=(36, 128)).astype(np.float32)
+    names = ["ann"] * 6 + ["bob"] * 30
+    out, out_names, _ = compact(encodings, names, [None] * len(names), max_prototypes=10)
+    assert len(out) <= len(encodings)
+    assert out_names.count("ann") == 6
+    assert out_names.count("bob") <= 11
@@ -0,0 +1,41 @@
+import shutil
+import subprocess
+import pytest
+from frame_stream import FrameStream
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None,
+                                reason="needs ffmpeg and ffprobe")
+
+
+@pytest.fixture
+def clip(tmp_path):
+    path = str(tmp_path / "source.mp4")
+    subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-f", "lavfi", "-i",
+                    "testsrc=duration=30:size=160x120:rate=10", "-c:v", "libx264", "-g", "10", "-y", path],
+                   check=True)
+    return path
+
+
+def test_recording_after_early_stop(clip, tmp_path):
+    record_path = str(tmp_path / "recorded.mp4")
+    # Few buffers, so FFmpeg is held back by the reader and is still running at stop()
+    stream = FrameStream(clip, 10, resolution="160x120", buffers=4, record_path=record_path)
+    for count, _ in enumerate(stream, 1):
+        if count == 3:  # e.g. an early unknown decision
+            break
+    stream.stop()
+    assert stream.returncode == 0
+    assert stream.recorded
+    # The recording was finalized, so it is readable and shorter than the source
+    out = subprocess.run(["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0",
+                          record_path], check=True, capture_output=True, text=True).stdout
+    assert 0 < float(out) < 30
+
+
+def test_recording_after_full_capture(clip, tmp_path):
+    record_path = str(tmp_path / "recorded.mp4")
+    stream = FrameStream(clip, 10, duration=2, resolution="160x120", record_path=record_path)
+    frames = sum(1 for _ in stream)
+    stream.stop()
+    assert frames == 20
+    assert stream.recorded